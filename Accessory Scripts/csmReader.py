@@ -0,0 +1,124 @@
+## Streaming reader for ProteomeDiscoverer table exports (XlinkX Crosslinks / CSMs tables and PSMs tables), for PeakPredictor.py and IsoPeak.py.
+
+## NOTE Exports are read one row at a time and handed out in chunks of `chunk_size` rows, so memory does not grow with the size of the file. A chunk is a
+## Dictionary of columns (field -> List, one value per row), which is the shape the nitrogenShift.py engine takes.
+## NOTE Accepted files: tab- or comma-delimited (taken from the header line), quoted or not, optionally gzipped (`.gz`). Columns are looked up by their
+## header name, never by position; the fields below are read when their column is present (the first matching header name is used):
+##   seqA, seqB          "Sequence A", "Sequence B"                          crosslinked peptides (Crosslinks / CSMs tables)
+##   sequence            "Annotated Sequence", "Sequence"                    peptide (PSMs table)
+##   mz, charge, rt      "m/z [Da]", "Charge", "RT [min]"                    (CSMs and PSMs tables; the Crosslinks table has none of them)
+##   accession(s)        "Accession A", "Accession B", "Master Protein Accessions"
+##   positionA/B, score  "Position A", "Position B", "Max. XlinkX Score" / "XlinkX Score" / "XCorr"
+##   csms, crosslinker   "# CSMs", "Crosslinker"
+## Numbers are converted (int or float); an empty or unreadable number is None. Every other column of the export is ignored.
+
+## USAGE: >>> import csmReader
+##        >>> for chunk in csmReader.readChunks("191031_DSSO_TryChymo_F-(1)_Crosslinks.txt"):
+##        ...     chunk["seqA"], chunk["seqB"]                                     # Lists of up to chunk_size values
+##        $ python csmReader.py <export> [chunk=10000]                             # summary of the fields found and the number of rows
+
+import csv                # methods for parsing delimited, quoted rows
+import gzip               # methods for reading gzipped exports
+import sys                # methods for taking command line arguments
+
+# field -> (accepted header names, type)
+fields = {"seqA": (("Sequence A",), str),
+          "seqB": (("Sequence B",), str),
+          "sequence": (("Annotated Sequence", "Sequence"), str),
+          "mz": (("m/z [Da]", "m/z"), float),
+          "charge": (("Charge",), int),
+          "rt": (("RT [min]",), float),
+          "accessionA": (("Accession A",), str),
+          "accessionB": (("Accession B",), str),
+          "accession": (("Master Protein Accessions", "Protein Accessions"), str),
+          "positionA": (("Position A",), int),
+          "positionB": (("Position B",), int),
+          "score": (("Max. XlinkX Score", "XlinkX Score", "XCorr"), float),
+          "csms": (("# CSMs",), int),
+          "crosslinker": (("Crosslinker",), str)}
+
+chunk_size = 10000
+
+def toNumber(value, kind):
+    try:
+        return kind(value) if kind is float else int(float(value))
+    except ValueError:
+        return None
+
+def openExport(filename):
+    # "utf-8-sig" drops the byte order mark some exports start with
+    opener = gzip.open if filename.lower().endswith(".gz") else open
+    return opener(filename, "rt", newline = '', encoding = "utf-8-sig", errors = "replace")
+
+#########################################################################################################################
+## Helper Method: the column index of every field found in a header row; returns a Dictionary (field -> column index)  ##
+#########################################################################################################################
+def findColumns(header):
+
+    header = [name.strip() for name in header]
+    columns = {}
+    for field, (names, kind) in fields.items():
+        for name in names:
+            if name in header:
+                columns[field] = header.index(name)
+                break
+    return columns
+
+def readHeader(filename):
+    # (delimiter, header row) of an export; the delimiter is tab when the header line has one, comma otherwise
+    with openExport(filename) as file:
+        line = file.readline()
+    delimiter = "\t" if "\t" in line else ","
+    return delimiter, next(csv.reader([line], delimiter = delimiter))
+
+#####################################################################################################################################
+## READ METHOD: yield the rows of an export in chunks of `chunk_size`; each chunk is a Dictionary of typed columns (see NOTE above) ##
+#####################################################################################################################################
+def readChunks(filename, chunk_size=chunk_size, require=()):
+
+    delimiter, header = readHeader(filename)
+    columns = findColumns(header)
+    missing = [field for field in require if field not in columns]
+    if missing:
+        raise ValueError(filename + " has no column for " + ", ".join(fields[field][0][0] for field in missing) + " (header: " + ", ".join(header) + ")")
+
+    with openExport(filename) as file:
+        reader = csv.reader(file, delimiter = delimiter)
+        next(reader)
+
+        chunk, count = {field: [] for field in columns}, 0
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue    # blank lines (ex. at the end of an export)
+            for field, index in columns.items():
+                value = row[index] if index < len(row) else ""
+                kind = fields[field][1]
+                chunk[field].append(value if kind is str else toNumber(value, kind))
+
+            count += 1
+            if count == chunk_size:
+                yield chunk
+                chunk, count = {field: [] for field in columns}, 0
+
+        if count:
+            yield chunk
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python csmReader.py <ProteomeDiscoverer export (.txt, .csv, optionally .gz)> [chunk=10000]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    delimiter, header = readHeader(sys.argv[1])
+    columns = findColumns(header)
+    print("Delimiter:", "tab" if delimiter == "\t" else "comma")
+    for field, index in columns.items():
+        print("  %-12s <- %s" % (field, header[index]))
+
+    rows, chunks = 0, 0
+    for chunk in readChunks(sys.argv[1], int(options.get("chunk", chunk_size))):
+        rows += len(next(iter(chunk.values()), []))
+        chunks += 1
+    print(rows, "rows in", chunks, "chunks")
@@ -0,0 +1,247 @@
+## Estimates the 15N incorporation (enrichment) of every labeled form (LH, HL, HH) of every CSM, by fitting predicted isotope envelopes at candidate
+## enrichment levels to the isotope cluster observed in the MS1 spectra. nitrogenShift.py and PeakPredictor.py assume full incorporation; a labeled form whose
+## cluster fits only at low enrichment (or fits nothing) points at a mixed LH/HL peak that is an artifact of partial labeling rather than a real mixed dipeptide.
+
+## NOTE Candidate envelopes come from isotopeEnvelope.py, on a grid of enrichment levels (default 0.80 to 1.00 in steps of 0.005; memoized per composition).
+## Each form is fit over the nominal peaks from `below` the fully labeled monoisotopic peak (where partially labeled molecules fall) to `above` it.
+## NOTE Peak positions are taken relative to the CSM's LL monoisotopic m/z (the composition sets the spacing, the spectra set the anchor). The export's precursor
+## m/z is often not the monoisotopic peak, so the LL monoisotopic peak is located first: the LL cluster observed around the precursor is fit with the natural
+## LL envelope placed with the precursor on each of its first isotope peaks (`anchors`, -1 to 4 peaks above the monoisotopic one), and the best fit wins.
+## Every cluster is read from a single scan: the scan (within `rt` minutes of the CSM, see peakMatcher.py) holding the most intense peak of the form or cluster;
+## peaks not found there are 0.
+## NOTE The fit is least squares with one free scale per form and grid level, solved in closed form for every form and level at once:
+##   scale = (predicted . observed) / (predicted . predicted),   residual = |observed - scale x predicted|^2
+## The enrichment is the grid level with the smallest residual; goodness of fit is R^2 = 1 - residual / (total sum of squares of the observed cluster).
+## NOTE A form's window reaches into the clusters of the other forms of its CSM (ex. HL's partially labeled peaks fall on LH's cluster), so a form that is not
+## there would be fit to another form's peaks. Every peak within `ppm` of another form's envelope is left out of the fit, in two rounds: first the peaks of the
+## LL envelope; then, after a fit of every form, also the peaks of the envelopes (at their fitted enrichment) of the forms that fit better, with R^2 of at least
+## `good_fit`. Forms with as many labeled nitrogens (ex. LH and HL of a symmetric dipeptide) have the same cluster and keep it.
+## NOTE Output (one row per CSM and labeled form; empty fit columns when no peak of the form was found):
+##   "#", "Sequence A", "Sequence B", "Charge", "RT [min]", "Label", "Precursor offset", "Enrichment", "R squared", "Peaks observed", "Peaks shared", "Apex RT [min]"
+## where "Precursor offset" is the number of isotope peaks the export's precursor m/z is above the located LL monoisotopic peak, "Peaks observed" counts the
+## peaks the fit used and "Peaks shared" the observed peaks left out in the second round, as peaks of a form that fits better.
+
+## USAGE: $ python enrichmentFit.py <spectra.mzML or .mgf> [export=mixedPeaks_CSMs.txt] [ppm=10] [rt=1.0] [grid=0.80:1.00:0.005] [out=Enrichment_fit.csv]
+
+import csv                # methods for writing the fits
+import os                 # methods for replacing the output file atomically
+import sys                # methods for taking command line arguments
+
+import numpy              # methods for the batched least squares fits
+
+import csmReader          # streaming reader for ProteomeDiscoverer exports
+import isotopeEnvelope    # isotope envelopes at a given enrichment
+import peakMatcher        # MS1 spectra as sorted arrays, and the ppm / RT search
+
+labels = ("LH", "HL", "HH")
+grid = numpy.round(numpy.arange(0.80, 1.0 + 1e-9, 0.005), 4)
+above = 6                 # nominal peaks fit above the fully labeled monoisotopic peak
+anchors = numpy.arange(-1, 5)   # isotope peaks the precursor m/z may be above the LL monoisotopic peak
+anchor_above = 4          # LL peaks above the precursor that take part in locating the monoisotopic peak
+good_fit = 0.9            # R^2 of a form whose envelope is taken out of the other forms' windows (and of a good fit in the summary)
+
+#############################################################################################################################################
+## Helper Method: the candidate envelopes of every composition of a List, on the nominal peaks from `below` to `above` of its fully labeled  ##
+## monoisotopic peak. Returns (nominal offsets (forms, peaks), probabilities (forms, grid levels, peaks), peak masses (forms, peaks)).     ##
+#############################################################################################################################################
+def candidateEnvelopes(compositions, levels, below):
+
+    labeled = numpy.array([composition[5] for composition in compositions], dtype = int)
+    offsets = labeled[:, None] + numpy.arange(-below, above + 1)[None, :]
+    probabilities = numpy.zeros((len(compositions), len(levels), below + above + 1))
+    weighted = numpy.zeros((len(compositions), below + above + 1))
+
+    for level, enrichment in enumerate(levels):
+        # every envelope of the level laid end to end, and scattered into its form's peaks at once
+        envelopes = isotopeEnvelope.envelopes(compositions, enrichment)
+        form = numpy.repeat(numpy.arange(len(compositions)), [len(envelope[0]) for envelope in envelopes])
+        peaks, masses, peakProbabilities = (numpy.concatenate([envelope[part] for envelope in envelopes]) for part in range(3))
+        index = peaks - offsets[form, 0]
+        inside = (index >= 0) & (index < offsets.shape[1])
+        probabilities[form[inside], level, index[inside]] = peakProbabilities[inside]
+        numpy.add.at(weighted, (form[inside], index[inside]), peakProbabilities[inside] * masses[inside])
+
+    # a peak's mass is its probability-weighted mean over the grid; peaks no grid level reaches (or below the lightest isotopes) are left out of the fit
+    total = probabilities.sum(axis = 1)
+    masses = numpy.where(total > 0, weighted / numpy.where(total > 0, total, 1), numpy.nan)
+    return offsets, probabilities, masses
+
+##########################################################################################################################################
+## FIT METHOD: the enrichment level of `levels` whose envelope best fits every observed cluster; `observed` is (forms, peaks), `valid`   ##
+## marks the peaks of each form that take part. Returns (enrichment, R^2, number of observed peaks) 1D arrays, NaN for an empty cluster. ##
+##########################################################################################################################################
+def fitEnrichment(probabilities, observed, valid, levels):
+
+    predicted = probabilities * valid[:, None, :]
+    observed = numpy.where(valid, observed, 0.0)
+
+    # the least squares scale of every form at every grid level, and its residual (see NOTE above)
+    norm = (predicted * predicted).sum(axis = 2)
+    scale = numpy.where(norm > 0, (predicted * observed[:, None, :]).sum(axis = 2) / numpy.where(norm > 0, norm, 1), 0.0)
+    residual = ((observed[:, None, :] - scale[:, :, None] * predicted) ** 2 * valid[:, None, :]).sum(axis = 2)
+    best = residual.argmin(axis = 1)
+
+    count = valid.sum(axis = 1)
+    mean = observed.sum(axis = 1) / numpy.maximum(count, 1)
+    totalSquares = ((observed - mean[:, None]) ** 2 * valid).sum(axis = 1)
+    found = (observed > 0).sum(axis = 1)
+
+    enrichment = numpy.where(found > 0, numpy.asarray(levels)[best], numpy.nan)
+    rSquared = numpy.where((found > 0) & (totalSquares > 0), 1 - residual[numpy.arange(len(best)), best] / numpy.where(totalSquares > 0, totalSquares, 1), numpy.nan)
+    return enrichment, rSquared, found
+
+#########################################################################################################################################
+## CLUSTER METHOD: the observed isotope cluster of every form of a List: intensities at each target m/z (forms, peaks) in the scan that ##
+## holds the form's most intense peak, within `window` minutes of its RT. Returns (intensities, apex RT per form).                       ##
+#########################################################################################################################################
+def observeClusters(spectra, targets, rts, ppm, window):
+
+    forms, peaks = targets.shape
+    valid = ~numpy.isnan(targets)
+    flatTargets = numpy.where(valid, targets, 0.0).ravel()
+
+    # pass 1: every peak in its whole RT window; the apex scan of a form is the scan of its most intense peak
+    observed, error, intensity, scanTimes = peakMatcher.matchPeaks(spectra, flatTargets, numpy.repeat(rts, peaks), ppm, window)
+    intensity = numpy.where(valid.ravel() & ~numpy.isnan(intensity), intensity, -1.0).reshape(forms, peaks)
+    apex = scanTimes.reshape(forms, peaks)[numpy.arange(forms), intensity.argmax(axis = 1)]
+    apex = numpy.where(intensity.max(axis = 1) > 0, apex, numpy.nan)
+
+    # pass 2: every peak in the apex scan alone (forms without any peak, at RT -inf, search no scan)
+    observed, error, intensity, scanTimes = peakMatcher.matchPeaks(spectra, flatTargets, numpy.repeat(numpy.where(numpy.isnan(apex), -numpy.inf, apex), peaks), ppm, 0.0)
+    return numpy.nan_to_num(intensity).reshape(forms, peaks), apex
+
+#####################################################################################################################################
+## ANCHOR METHOD: how many isotope peaks each precursor m/z is above its LL monoisotopic peak, by fitting the observed LL cluster   ##
+## with the LL envelope placed on every candidate of `anchors` (see NOTE above); 0 when no LL peak is found. Returns a 1D int array.  ##
+#####################################################################################################################################
+def locateMonoisotopic(spectra, compositions, precursor, charge, rts, ppm, window):
+
+    # the LL cluster is read on the nominal peaks from `anchors.max()` below the precursor to `anchor_above` above it
+    positions = numpy.arange(-anchors.max(), anchor_above + 1)
+    targets = precursor[:, None] + positions[None, :] * peakMatcher.carbon13 / charge[:, None]
+    observed, apex = observeClusters(spectra, targets, rts, ppm, window)
+
+    # with the precursor `anchor` peaks above the monoisotopic one, the LL peak at nominal offset (position + anchor) falls on each position
+    probabilities = numpy.zeros((len(compositions), len(anchors), len(positions)))
+    for row, (offsets, masses, peakProbabilities) in enumerate(isotopeEnvelope.envelopes(compositions)):
+        index = offsets[:, None] - anchors[None, :] - positions[0]
+        peak, candidate = numpy.nonzero((index >= 0) & (index < len(positions)))
+        probabilities[row, candidate, index[peak, candidate]] = peakProbabilities[peak]
+    anchor = fitEnrichment(probabilities, observed, numpy.ones(observed.shape, dtype = bool), anchors)[0]
+
+    return numpy.where(numpy.isnan(anchor), 0, anchor).astype(int)
+
+#################################################################################################################################
+## Helper Method: the m/z of every peak of each composition's envelope at its own enrichment, anchored like the fit targets; ##
+## returns a List of 1D arrays                                                                                                 ##
+#################################################################################################################################
+def envelopeMZ(compositions, enrichment, monoisotopicMZ, monoisotopic, charge):
+
+    peaks = [None] * len(compositions)
+    for level in set(enrichment):
+        members = [row for row, value in enumerate(enrichment) if value == level]
+        for row, (offsets, masses, peakProbabilities) in zip(members, isotopeEnvelope.envelopes([compositions[row] for row in members], level)):
+            peaks[row] = monoisotopicMZ[row] + (masses - monoisotopic[row]) / charge[row]
+
+    return peaks
+
+def maskPeaks(targets, explained, ppm):
+    # the target m/z of every row, NaN where they fall within `ppm` of a peak of that row's List of explained envelopes
+    targets = targets.copy()
+    for row, envelopes in enumerate(explained):
+        peaks = numpy.concatenate(envelopes)
+        targets[row, (numpy.abs(targets[row][:, None] - peaks[None, :]) <= ppm * 1e-6 * peaks[None, :]).any(axis = 1)] = numpy.nan
+    return targets
+
+#######################################################################################################################################
+## PREDICT METHOD: fit every labeled form of every CSM of a chunk (see csmReader.py). Returns a List of (CSM row, label, precursor    ##
+## offset, enrichment, R^2, peaks observed, peaks shared, apex RT); CSMs without an m/z or charge are not fit.                        ##
+#######################################################################################################################################
+def fitChunk(spectra, chunk, levels=grid, ppm=10.0, window=1.0):
+
+    rows = [index for index, (mZ, charge) in enumerate(zip(chunk["mz"], chunk["charge"])) if mZ is not None and charge]
+    if not rows:
+        return []
+    species = [isotopeEnvelope.speciesCompositions(chunk["seqA"][row], chunk["seqB"][row]) for row in rows]
+    forms = len(peakMatcher.labels)
+    compositions = [composition[label] for composition in species for label in peakMatcher.labels]
+    charge = numpy.array([float(chunk["charge"][row]) for row in rows])
+    precursor = numpy.array([chunk["mz"][row] for row in rows])
+    rts = numpy.array([chunk["rt"][row] if "rt" in chunk and chunk["rt"][row] is not None else numpy.nan for row in rows])
+    monoisotopic = numpy.repeat([isotopeEnvelope.monoisotopicMass(composition["LL"]) for composition in species], forms)
+
+    # the LL monoisotopic m/z of every CSM, one row per form (LL, LH, HL, HH) from here on
+    anchor = locateMonoisotopic(spectra, [composition["LL"] for composition in species], precursor, charge, rts, ppm, window)
+    monoisotopicMZ = numpy.repeat(precursor - anchor * peakMatcher.carbon13 / charge, forms)
+    charge, rts, anchor = (numpy.repeat(column, forms) for column in (charge, rts, anchor))
+
+    # enough peaks below the fully labeled one for the lowest grid level to be resolved
+    below = int(numpy.ceil(max(composition[5] for composition in compositions) * (1 - min(levels)))) + 4
+    offsets, probabilities, masses = candidateEnvelopes(compositions, levels, below)
+
+    # each peak's m/z, anchored to the CSM's LL monoisotopic m/z
+    targets = monoisotopicMZ[:, None] + (masses - monoisotopic[:, None]) / charge[:, None]
+
+    # every labeled form is fit twice (see NOTE above): first with the LL envelope taken out of its window, then also without the envelopes of the other
+    # forms of its CSM that fit better the first time (forms with as many labeled nitrogens cannot be told apart, and are never taken out of each other)
+    natural = numpy.arange(len(compositions)) % forms == 0
+    fit = numpy.flatnonzero(~natural)
+    labeled = numpy.array([composition[5] for composition in compositions])
+    explained = dict(zip(numpy.flatnonzero(natural), envelopeMZ([composition["LL"] for composition in species], [1.0] * len(species), monoisotopicMZ[natural],
+                                                                 monoisotopic[natural], charge[natural])))
+    first = maskPeaks(targets[fit], [[explained[row - row % forms]] for row in fit], ppm)
+    seen, apex = observeClusters(spectra, first, rts[fit], ppm, window)
+    enrichment, rSquared, found = fitEnrichment(probabilities[fit], seen, ~numpy.isnan(first), levels)
+
+    well = numpy.flatnonzero(rSquared >= good_fit)
+    explained.update(zip(fit[well], envelopeMZ([compositions[row] for row in fit[well]], enrichment[well], monoisotopicMZ[fit[well]], monoisotopic[fit[well]], charge[fit[well]])))
+    score = dict(zip(fit, numpy.where(numpy.isnan(rSquared), -numpy.inf, rSquared)))
+    better = [[explained[row - row % forms]] + [explained[other] for other in range(row - row % forms + 1, row - row % forms + forms)
+                                                 if other in explained and labeled[other] != labeled[row] and score[other] > score[row]] for row in fit]
+    windows = maskPeaks(targets[fit], better, ppm)
+    observed, apex = observeClusters(spectra, windows, rts[fit], ppm, window)
+    enrichment, rSquared, found = fitEnrichment(probabilities[fit], observed, ~numpy.isnan(windows), levels)
+    shared = ((seen > 0) & numpy.isnan(windows) & ~numpy.isnan(first)).sum(axis = 1)
+
+    return [(rows[row // forms], peakMatcher.labels[row % forms], anchor[row], enrichment[index], rSquared[index], found[index], shared[index], apex[index])
+            for index, row in enumerate(fit)]
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    arguments = [arg for arg in sys.argv[1:] if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    if not arguments:
+        print("Usage: python enrichmentFit.py <spectra.mzML or .mgf> [export=mixedPeaks_CSMs.txt] [ppm=10] [rt=1.0] [grid=0.80:1.00:0.005] [out=Enrichment_fit.csv]")
+        sys.exit(1)
+
+    ppm, window = float(options.get("ppm", 10)), float(options.get("rt", 1.0))
+    if "grid" in options:
+        lowest, highest, step = (float(value) for value in options["grid"].split(":"))
+        grid = numpy.round(numpy.arange(lowest, highest + step / 2, step), 4)
+    output = options.get("out", "Enrichment_fit.csv")
+
+    spectra = peakMatcher.loadSpectra(arguments[0])
+    print(len(spectra["rt"]), "scans,", len(spectra["mz"]), "peaks read from", arguments[0])
+
+    count, fits = 0, {label: [] for label in labels}
+    with open(output + ".part", "w", newline = '') as file:
+        writer = csv.writer(file, delimiter = ',', lineterminator = '\n')
+        writer.writerow(["#", "Sequence A", "Sequence B", "Charge", "RT [min]", "Label", "Precursor offset", "Enrichment", "R squared", "Peaks observed", "Peaks shared", "Apex RT [min]"])
+
+        for chunk in csmReader.readChunks(options.get("export", "mixedPeaks_CSMs.txt"), require = ("seqA", "seqB", "mz", "charge")):
+            for row, label, anchor, enrichment, rSquared, found, shared, apex in fitChunk(spectra, chunk, grid, ppm, window):
+                fit = [round(enrichment, 4), round(rSquared, 4) if rSquared == rSquared else "", found, shared, round(apex, 4)] if enrichment == enrichment else ["", "", 0, shared, ""]
+                writer.writerow([count + row + 1, chunk["seqA"][row], chunk["seqB"][row], chunk["charge"][row], chunk["rt"][row] if "rt" in chunk else "", label, anchor] + fit)
+                if enrichment == enrichment and rSquared >= good_fit:
+                    fits[label].append(enrichment)
+            count += len(chunk["seqA"])
+
+    os.replace(output + ".part", output)
+    print(count, "CSMs fit on", len(grid), "enrichment levels from", grid[0], "to", grid[-1])
+    for label in labels:
+        if fits[label]:
+            print("  ", label, len(fits[label]), "good fits (R^2 >= 0.9), median enrichment", round(float(numpy.median(fits[label])), 4))
+        else:
+            print("  ", label, "no good fits (R^2 >= 0.9)")
+    print("Fits written to", output)
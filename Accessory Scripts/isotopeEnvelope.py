@@ -0,0 +1,177 @@
+## Isotope envelopes of 14N/15N labeled crosslinked dipeptides (LL, LH, HL, HH), from their elemental composition, for PeakPredictor.py.
+
+## NOTE A dipeptide's composition is peptide A + peptide B + the crosslinker remnant (DSSO by default, C6H6O3S). Each peptide is its residues plus one water:
+##   fixed_modifications   applied to every residue of that letter (default: carbamidomethyl C, which PD does not mark in Crosslinks tables)
+##   lowercase residues    PD's modified residues: `c` carbamidomethyl, `m` oxidation; any other lowercase letter counts as the plain residue
+## Sequences are read as in nitrogenShift.py (crosslink-site brackets and "[K].PEPTIDE.[R]" flanking residues are not residues).
+## NOTE Only a peptide's own nitrogens are labeled (the number nitrogenShift.py counts); nitrogens added after labeling (ex. carbamidomethyl) stay 14N.
+## A labeled peptide's nitrogens are 15N with probability `enrichment` (default 1.0, full incorporation, as the shift constants of nitrogenShift.py assume).
+## NOTE Envelopes are calculated by FFT: every element's isotope distribution (probability, and probability x mass, at each nominal mass offset) is
+## transformed once, raised to the element's count and multiplied, for a whole batch of compositions at once. The peak masses are the probability-weighted
+## mean masses of each nominal offset. Envelopes are memoized per (composition, enrichment), since the same dipeptides repeat many times in a CSM list;
+## charge is applied afterwards, so one envelope serves every charge state. The memo keeps the `cache_size` most recently used envelopes (LRU), and the
+## memo of peptide compositions the `cache_size` most recently used peptides, so memory stays flat however many distinct dipeptides and enrichment levels
+## a long export (or enrichmentFit.py's grid) runs through.
+
+## USAGE: >>> import isotopeEnvelope
+##        >>> envelopes = isotopeEnvelope.labeledEnvelopes(pepA_column, pepB_column, charge_column, top=5)
+##        >>> mz, intensity = envelopes["LH"]            # 2D arrays, one row per dipeptide: the `top` most intense peaks, by m/z; relative intensity (%)
+
+import collections        # methods for the least-recently-used envelope memo
+import functools          # methods for memoizing peptide compositions
+import numpy              # methods for the vectorized envelope calculation
+
+import nitrogenShift      # nitrogens per residue (the labeled ones)
+
+proton = 1.00727646688
+
+# isotopes of every element: (mass, natural abundance), lightest first, one entry per nominal mass offset; "15N" is a labeled nitrogen (see `elementTable()`)
+isotopes = {"C": ((12.0, 0.9893), (13.0033548378, 0.0107)),
+            "H": ((1.00782503207, 0.999885), (2.0141017778, 0.000115)),
+            "N": ((14.0030740048, 0.99636), (15.0001088982, 0.00364)),
+            "O": ((15.99491461956, 0.99757), (16.99913170, 0.00038), (17.9991610, 0.00205)),
+            "S": ((31.97207100, 0.9499), (32.97145876, 0.0075), (33.96786690, 0.0425), (0.0, 0.0), (35.96708076, 0.0001))}   # no 35S
+elements = ("C", "H", "N", "O", "S", "15N")
+
+# compositions as (C, H, N, O, S) counts
+water = (0, 2, 0, 1, 0)
+residues = {"G": (2, 3, 1, 1, 0), "A": (3, 5, 1, 1, 0), "S": (3, 5, 1, 2, 0), "P": (5, 7, 1, 1, 0), "V": (5, 9, 1, 1, 0),
+            "T": (4, 7, 1, 2, 0), "C": (3, 5, 1, 1, 1), "L": (6, 11, 1, 1, 0), "I": (6, 11, 1, 1, 0), "N": (4, 6, 2, 2, 0),
+            "D": (4, 5, 1, 3, 0), "Q": (5, 8, 2, 2, 0), "K": (6, 12, 2, 1, 0), "E": (5, 7, 1, 3, 0), "M": (5, 9, 1, 1, 1),
+            "H": (6, 7, 3, 1, 0), "F": (9, 9, 1, 1, 0), "R": (6, 12, 4, 1, 0), "Y": (9, 9, 1, 2, 0), "W": (11, 10, 2, 1, 0)}
+carbamidomethyl = (2, 3, 1, 1, 0)
+oxidation = (0, 0, 0, 1, 0)
+dsso_remnant = (6, 6, 0, 3, 1)
+
+fixed_modifications = {"C": carbamidomethyl}
+lowercase_modifications = {"c": carbamidomethyl, "m": oxidation}
+
+# (composition, enrichment) -> (peak nominal offsets, peak masses, peak probabilities), least recently used first; at most `cache_size` entries
+envelope_cache = collections.OrderedDict()
+cache_size = 50000
+
+# compositions transformed at a time; bounds the (compositions x elements x offsets) arrays of a batch
+batch_size = 1000
+
+#########################################################################################################################
+## Helper Method: the residues of a sequence, without brackets, flanking residues or anything else that is not a residue ##
+#########################################################################################################################
+def sequenceResidues(seq):
+    if seq.count(".") >= 2:
+        seq = seq[seq.index(".") + 1:seq.rindex(".")]   # "[K].PEPTIDE.[R]" Annotated Sequence
+    return [residue for residue in seq if residue.isalpha()]
+
+##############################################################################################################################
+## COMPOSITION METHOD: (C, H, N, O, S, labeled N) of a peptide; labeled N are the nitrogens of its own residues, which are ##
+## also counted in N                                                                                                        ##
+##############################################################################################################################
+@functools.lru_cache(maxsize = cache_size)
+def peptideComposition(seq):
+
+    composition, labeled = numpy.array(water), 0
+    for residue in sequenceResidues(seq):
+        if residue.upper() not in residues:
+            raise ValueError("Unknown residue '" + residue + "' in " + seq)
+        composition = composition + residues[residue.upper()]
+        if residue.islower() and residue in lowercase_modifications:
+            composition = composition + lowercase_modifications[residue]
+        elif residue.isupper() and residue in fixed_modifications:
+            composition = composition + fixed_modifications[residue]
+        labeled += nitrogenShift.nitrogens.get(residue.upper(), 1)
+
+    return tuple(int(count) for count in composition) + (labeled,)
+
+def speciesCompositions(pepA, pepB, crosslinker=dsso_remnant):
+    # {label: (C, H, 14N, O, S, 15N)} of the LL, LH, HL and HH forms of one dipeptide
+    A, B = peptideComposition(pepA), peptideComposition(pepB)
+    base = tuple(a + b + linker for a, b, linker in zip(A[:5], B[:5], crosslinker))
+    species = {}
+    for label, heavy in (("LL", 0), ("LH", B[5]), ("HL", A[5]), ("HH", A[5] + B[5])):
+        species[label] = base[:2] + (base[2] - heavy,) + base[3:] + (heavy,)
+    return species
+
+##########################################################################################################################
+## Helper Method: (probabilities, probability x mass) of every element at each nominal mass offset, as 2D arrays       ##
+##########################################################################################################################
+def elementTable(enrichment):
+
+    table = dict(isotopes)
+    table["15N"] = ((isotopes["N"][0][0], 1.0 - enrichment), (isotopes["N"][1][0], enrichment))
+    width = max(len(table[element]) for element in elements)
+    probabilities, masses = numpy.zeros((len(elements), width)), numpy.zeros((len(elements), width))
+    for row, element in enumerate(elements):
+        for offset, (mass, abundance) in enumerate(table[element]):
+            probabilities[row, offset] = abundance
+            masses[row, offset] = abundance * mass
+    return probabilities, masses
+
+#####################################################################################################################################
+## ENVELOPE METHOD: the isotope envelope of every composition of a List, calculated by FFT in one batch (see NOTE above) and       ##
+## memoized; returns a List of (nominal offsets from the lightest isotopes, peak masses, peak probabilities) 1D arrays, peaks     ##
+## below `threshold` x the largest one dropped                                                                                     ##
+#####################################################################################################################################
+def envelopes(compositions, enrichment=1.0, threshold=1e-6):
+
+    # this call's envelopes are collected on their own, so the memo can drop old entries while a long List is calculated
+    found = {}
+    for composition in set(compositions):
+        if (composition, enrichment) in envelope_cache:
+            envelope_cache.move_to_end((composition, enrichment))
+            found[composition] = envelope_cache[(composition, enrichment)]
+
+    missing = sorted(set(compositions) - set(found))
+    probabilities, masses = elementTable(enrichment)
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        counts = numpy.array(batch, dtype = float)
+
+        # enough nominal offsets for every 15N plus the natural spread of the largest composition, so the circular FFT never wraps onto the peaks
+        span = int(counts[:, 5].max() + 32 + counts[:, 0].max() // 10)
+        size = 1 << (span - 1).bit_length()
+        P = numpy.fft.fft(probabilities, size)
+        M = numpy.fft.fft(masses, size)
+
+        # (compositions, elements, offsets): each element's transform raised to its count, and to its count - 1 for the mass-weighted sum
+        powers = P[None, :, :] ** counts[:, :, None]
+        lower = P[None, :, :] ** numpy.maximum(counts - 1, 0)[:, :, None]
+        total = powers.prod(axis = 1)
+        weighted = numpy.zeros_like(total)
+        for element in range(len(elements)):
+            others = numpy.delete(powers, element, axis = 1).prod(axis = 1)
+            weighted += counts[:, element, None] * M[element] * lower[:, element] * others
+
+        probability = numpy.fft.ifft(total).real
+        mass = numpy.fft.ifft(weighted).real
+        for row, composition in enumerate(batch):
+            keep = probability[row] > threshold * probability[row].max()
+            found[composition] = envelope_cache[(composition, enrichment)] = (numpy.nonzero(keep)[0], mass[row, keep] / probability[row, keep], probability[row, keep])
+            if len(envelope_cache) > cache_size:
+                envelope_cache.popitem(last = False)
+
+    return [found[composition] for composition in compositions]
+
+def topPeaks(masses, probabilities, charge, top):
+    # the `top` most intense peaks of an envelope, by m/z (neutral mass without a charge), with intensities relative to the largest peak (%)
+    order = numpy.sort(numpy.argsort(probabilities)[::-1][:top])
+    mz = (masses[order] + charge * proton) / charge if charge else masses[order]
+    return mz, 100 * probabilities[order] / probabilities.max()
+
+###########################################################################################################################################
+## LABEL METHOD: the top-N isotope peaks of the LL, LH, HL and HH forms of every dipeptide of a column. Returns a Dictionary              ##
+## (label -> (m/z, relative intensity)) of 2D arrays, one row per dipeptide and `top` columns (NaN where an envelope has fewer peaks).  ##
+###########################################################################################################################################
+def labeledEnvelopes(pepA, pepB, charge, top=5, enrichment=1.0, crosslinker=dsso_remnant):
+
+    species = [speciesCompositions(seqA, seqB, crosslinker) for seqA, seqB in zip(pepA, pepB)]
+    labeled = {}
+    for label in ("LL", "LH", "HL", "HH"):
+        mz, intensity = numpy.full((len(species), top), numpy.nan), numpy.full((len(species), top), numpy.nan)
+        for row, ((offsets, masses, probabilities), z) in enumerate(zip(envelopes([compositions[label] for compositions in species], enrichment), charge)):
+            peaksMZ, peaksIntensity = topPeaks(masses, probabilities, z, top)
+            mz[row, :len(peaksMZ)], intensity[row, :len(peaksMZ)] = peaksMZ, peaksIntensity
+        labeled[label] = (mz, intensity)
+    return labeled
+
+def monoisotopicMass(composition):
+    # the mass of a composition's lightest isotopes (its 15N counted as 15N)
+    return sum(count * isotopes[element][0][0] for count, element in zip(composition[:5], elements)) + composition[5] * isotopes["N"][1][0]
@@ -0,0 +1,81 @@
+## Shared 15N-labeling engine for PeakPredictor.py and IsoPeak.py: the m/z shift of heavy-nitrogen labeled peptides, for whole columns of sequences at once.
+
+## NOTE A peptide's shift is (neutron mass x number of nitrogens) / charge. Every residue has one backbone nitrogen, plus its side chain nitrogens:
+##   R 4, H 3, K N Q W 2, every other residue 1
+## The residue -> shift lookup table is applied to the sequences encoded as a 2D array of bytes (one row per peptide), so no peptide is ever looped over.
+## NOTE Accepted sequence notations (both ProteomeDiscoverer exports):
+##   ELSEIAEQA[K]R                 crosslink site in brackets (Crosslinks.txt); brackets are not residues
+##   [K].LGANAILGVSmAAAR.[A]       Annotated Sequence (PSMs.txt); only the residues between the dots count, the flanking residues do not
+## Lowercase letters are modified residues (ex. `m` oxidized methionine, `c` carbamidomethyl cysteine) and count as the residue they modify.
+## NOTE The m/z columns are returned unrounded. numpy.round scales by 10**decimals before rounding, so it can round a halfway value differently than Python's
+## round(); the scripts round each value with round(value, 3) as they write it, which keeps their output files unchanged.
+
+## USAGE: >>> import nitrogenShift
+##        >>> LL, LH, HL, HH = nitrogenShift.labeledMZ(pepA_column, pepB_column, mZ_column, charge_column)   # dipeptides (PeakPredictor.py)
+##        >>> light, heavy = nitrogenShift.lightHeavyMZ(seq_column, mZ_column, charge_column)                 # single peptides (IsoPeak.py)
+
+import numpy              # methods for the vectorized shift calculation
+
+""" ProteomeDiscoverer's reported mass of a neutron; needed for calculating mass shifts in heavy-nitrogen labeled peptides """
+neutron = 0.997035
+
+# nitrogens per residue (backbone and side chain); every other residue has the single backbone nitrogen
+nitrogens = {"R": 4, "H": 3, "K": 2, "N": 2, "Q": 2, "W": 2}
+
+# the mass shift of every byte of an encoded sequence: residues (upper or lowercase) shift by their nitrogens, anything else (brackets, dots, dashes) by 0
+shift_table = numpy.zeros(256)
+for residue in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+    shift_table[ord(residue)] = shift_table[ord(residue.lower())] = neutron * nitrogens.get(residue, 1)
+
+# rows encoded at a time, so a column of millions of sequences never becomes one (millions x longest sequence) array
+chunk_size = 100000
+
+#############################################################################################################################
+## Helper Method: the sequences of a column as a 2D array of bytes, one row per sequence, padded with 0 to the longest one ##
+#############################################################################################################################
+def encodeSequences(sequences):
+    sequences = numpy.asarray(sequences, dtype = bytes)
+    return sequences.view(numpy.uint8).reshape(len(sequences), sequences.itemsize)
+
+##############################################################################################################################
+## SHIFT METHOD: the mass shift (Da) of 15N labeling for every sequence of a column; returns a 1D numpy array                ##
+##############################################################################################################################
+def massShift(sequences):
+
+    sequences = list(sequences) if not isinstance(sequences, numpy.ndarray) else sequences
+    shifts = numpy.empty(len(sequences))
+    for start in range(0, len(sequences), chunk_size):
+        codes = encodeSequences(sequences[start:start + chunk_size])
+        residues = shift_table[codes]
+
+        # Annotated Sequences ("[K].PEPTIDE.[R]"): keep only the bytes after the first dot and before the last one
+        dots = numpy.cumsum(codes == ord("."), axis = 1)
+        flanked = dots[:, -1] >= 2
+        residues[flanked] *= (dots[flanked] >= 1) & (dots[flanked] < dots[flanked, -1:])
+
+        shifts[start:start + chunk_size] = residues.sum(axis = 1)
+
+    return shifts
+
+def mzShift(sequences, charges):
+    # the m/z shift of 15N labeling for every sequence of a column, at its charge
+    return massShift(sequences) / numpy.asarray(charges, dtype = float)
+
+###########################################################################################################################################
+## LABEL METHOD: predicted m/z of the light-light (LL), light-heavy (LH), heavy-light (HL) and heavy-heavy (HH) forms of every dipeptide ##
+## of a column; `mZ` and `charge` are those of the unlabeled (LL) dipeptide. Returns four 1D numpy arrays (not rounded; see NOTE at the top). ##
+###########################################################################################################################################
+def labeledMZ(pepA, pepB, mZ, charge):
+
+    mZ = numpy.asarray(mZ, dtype = float)
+    shiftA = mzShift(pepA, charge)
+    shiftB = mzShift(pepB, charge)
+    return mZ, mZ + shiftB, mZ + shiftA, mZ + shiftA + shiftB
+
+###############################################################################################################################
+## LABEL METHOD: predicted m/z of the light (14N) and heavy (15N) forms of every peptide of a column; returns two 1D arrays  ##
+###############################################################################################################################
+def lightHeavyMZ(seq, mZ, charge):
+
+    mZ = numpy.asarray(mZ, dtype = float)
+    return mZ, mZ + mzShift(seq, charge)
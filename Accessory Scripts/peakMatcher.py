@@ -0,0 +1,243 @@
+## Matches the predicted m/z of 14N/15N labeled dipeptides (LL, LH, HL, HH and their isotope peaks) against the centroided MS1 spectra of a run, instead of
+## checking Predicted_mixedPeaks.csv against the spectra by hand.
+
+## NOTE Spectra are read from a local mzML (plain or zlib-compressed 32/64-bit binary arrays; MS1 scans only) or MGF file (every spectrum, RT from
+## RTINSECONDS). Each scan's peaks are kept as sorted numpy arrays, laid end to end in one array keyed by (scan, m/z), so a predicted peak is found in every
+## scan of its RT window by binary search (numpy.searchsorted), for whole columns of predictions at once.
+## NOTE For each predicted peak the most intense centroid within `ppm` of it, in any scan within `rt` minutes of the CSM's retention time, is the match. A CSM
+## export without a "RT [min]" column (ex. mixedPeaks_CSMs.txt) is searched over the whole run.
+## NOTE Predicted peaks are the LL/LH/HL/HH m/z of nitrogenShift.py (the LL m/z is the CSM's precursor m/z) plus `offset` x 13C spacing / charge, for every
+## isotope offset of `offsets` (default -1:3; offset -1 catches a precursor m/z that was not the monoisotopic peak, like #50 of mixedPeaks_CSMs.txt).
+## NOTE Output (one row per CSM, label and isotope offset; the observed columns are empty when nothing matched):
+##   "#", "Sequence A", "Sequence B", "Charge", "RT [min]", "Label", "Isotope offset", "Predicted m/z", "Observed m/z", "ppm error", "Intensity", "Scan RT [min]"
+
+## USAGE: $ python peakMatcher.py <spectra.mzML or .mgf> [export=mixedPeaks_CSMs.txt] [ppm=10] [rt=1.0] [offsets=-1:3] [out=Matched_peaks.csv]
+
+import base64             # methods for decoding mzML binary arrays
+import csv                # methods for writing the matches
+import os                 # methods for replacing the output file atomically
+import sys                # methods for taking command line arguments
+import xml.etree.ElementTree as ElementTree   # methods for streaming mzML files
+import zlib               # methods for decompressing mzML binary arrays
+
+import numpy              # methods for the sorted peak arrays and the vectorized search
+
+import csmReader          # streaming reader for ProteomeDiscoverer exports
+import nitrogenShift      # LL/LH/HL/HH m/z of the dipeptides
+
+carbon13 = 1.0033548378   # spacing of isotope peaks (13C - 12C), times the charge
+labels = ("LL", "LH", "HL", "HH")
+
+# (query, scan) pairs searched at a time; bounds memory when RT windows are wide (or missing)
+max_pairs = 2000000
+
+# mzML controlled vocabulary accessions
+ms_level, scan_time, profile = "MS:1000511", "MS:1000016", "MS:1000128"
+mz_array, intensity_array = "MS:1000514", "MS:1000515"
+float64, zlib_compression = "MS:1000523", "MS:1000574"
+numpress = ("MS:1002312", "MS:1002313", "MS:1002314")
+
+def localName(tag):
+    return tag.rsplit("}", 1)[-1]
+
+###########################################################################################################################
+## Helper Method: the m/z and intensity arrays of one mzML <spectrum> element; returns (m/z, intensity) numpy arrays      ##
+###########################################################################################################################
+def decodeArrays(spectrum):
+
+    arrays = {}
+    for element in spectrum.iter():
+        if localName(element.tag) != "binaryDataArray":
+            continue
+        accessions = set(param.get("accession") for param in element.iter() if localName(param.tag) == "cvParam")
+        if accessions.intersection(numpress):
+            raise ValueError("MS-Numpress compressed mzML arrays are not supported; convert with `msconvert --mzML --zlib`")
+        binary = next(child for child in element.iter() if localName(child.tag) == "binary")
+        data = base64.b64decode(binary.text or "")
+        if zlib_compression in accessions:
+            data = zlib.decompress(data)
+        values = numpy.frombuffer(data, dtype = "<f8" if float64 in accessions else "<f4").astype(float)
+        for kind in (mz_array, intensity_array):
+            if kind in accessions:
+                arrays[kind] = values
+
+    return arrays.get(mz_array, numpy.empty(0)), arrays.get(intensity_array, numpy.empty(0))
+
+##############################################################################################################################
+## READ METHOD: yield (RT in minutes, m/z, intensity) for every MS1 scan of an mzML file; the file is streamed, one scan  ##
+## at a time                                                                                                                ##
+##############################################################################################################################
+def readMzML(filename):
+
+    warned = False
+    for event, element in ElementTree.iterparse(filename, events = ("end",)):
+        if localName(element.tag) != "spectrum":
+            continue
+
+        level, rt = None, None
+        for param in element.iter():
+            if localName(param.tag) != "cvParam":
+                continue
+            accession = param.get("accession")
+            if accession == ms_level:
+                level = int(param.get("value"))
+            elif accession == scan_time:
+                rt = float(param.get("value")) / (60.0 if param.get("unitName") == "second" or param.get("unitAccession") == "UO:0000010" else 1.0)
+            elif accession == profile and not warned:
+                print("NOTE:", filename, "holds profile spectra; peaks are matched as if they were centroids (centroid the run first for better matches)")
+                warned = True
+
+        if level in (None, 1):
+            mz, intensity = decodeArrays(element)
+            yield rt if rt is not None else numpy.nan, mz, intensity
+        element.clear()
+
+def readMGF(filename):
+    # yield (RT in minutes, m/z, intensity) for every spectrum of an MGF file, one at a time
+    with open(filename, errors = "replace") as file:
+        rt, peaks = numpy.nan, []
+        for line in file:
+            line = line.strip()
+            if line == "BEGIN IONS":
+                rt, peaks = numpy.nan, []
+            elif line == "END IONS":
+                peaks = numpy.array(peaks, dtype = float).reshape(-1, 2)
+                yield rt, peaks[:, 0], peaks[:, 1]
+            elif line.startswith("RTINSECONDS="):
+                rt = float(line.split("=", 1)[1].split(",")[0]) / 60.0
+            elif line and line[0].isdigit():
+                fields = line.split()
+                peaks.append((float(fields[0]), float(fields[1]) if len(fields) > 1 else 0.0))
+
+#####################################################################################################################################
+## LOAD METHOD: every scan of a run as one Dictionary of numpy arrays: "rt" (per scan, ascending), "offsets" (where each scan's    ##
+## peaks start), "mz" and "intensity" (every peak, sorted by m/z within a scan) and "key" (scan index x width + m/z, ascending)    ##
+#####################################################################################################################################
+def loadSpectra(filename):
+
+    reader = readMGF if filename.lower().endswith(".mgf") else readMzML
+    scans = [(rt, mz, intensity) for rt, mz, intensity in reader(filename)]
+    scans.sort(key = lambda scan: (numpy.isnan(scan[0]), scan[0]))   # scans without a RT last; they are only searched by CSMs without one
+
+    rt = numpy.array([scan[0] for scan in scans], dtype = float)
+    sizes = numpy.array([len(scan[1]) for scan in scans], dtype = int)
+    offsets = numpy.concatenate(([0], numpy.cumsum(sizes)))
+    mz, intensity = numpy.empty(offsets[-1]), numpy.empty(offsets[-1])
+    for index, (scanRT, scanMZ, scanIntensity) in enumerate(scans):
+        order = numpy.argsort(scanMZ, kind = "stable")
+        mz[offsets[index]:offsets[index + 1]] = scanMZ[order]
+        intensity[offsets[index]:offsets[index + 1]] = scanIntensity[order]
+
+    # one sorted array for every scan: the m/z of scan i lie in [i x width, (i + 1) x width)
+    width = numpy.ceil(mz.max()) + 1.0 if len(mz) else 1.0
+    key = numpy.repeat(numpy.arange(len(scans)), sizes) * width + mz
+    return {"rt": rt, "offsets": offsets, "mz": mz, "intensity": intensity, "key": key, "width": width}
+
+def expandRanges(starts, counts):
+    # the indices start, start + 1, ..., start + count - 1 of every range, concatenated
+    return numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(starts, counts)
+
+#############################################################################################################################################
+## MATCH METHOD: the most intense peak within `ppm` of every target m/z, in the scans within `window` minutes of its RT (every scan when the ##
+## RT is NaN). Returns (observed m/z, ppm error, intensity, scan RT) 1D arrays, NaN where nothing matched.                                   ##
+#############################################################################################################################################
+def matchPeaks(spectra, targets, rts, ppm=10.0, window=1.0):
+
+    targets, rts = numpy.asarray(targets, dtype = float), numpy.asarray(rts, dtype = float)
+    scanRT, key, width = spectra["rt"], spectra["key"], spectra["width"]
+    observed, intensity, scanTimes = numpy.full(len(targets), numpy.nan), numpy.full(len(targets), numpy.nan), numpy.full(len(targets), numpy.nan)
+
+    # the scans of every target's RT window
+    first = numpy.where(numpy.isnan(rts), 0, numpy.searchsorted(scanRT, rts - window, "left"))
+    last = numpy.where(numpy.isnan(rts), len(scanRT), numpy.searchsorted(scanRT, rts + window, "right"))
+    counts = last - first
+
+    # targets are searched in blocks of at most `max_pairs` (target, scan) pairs (or a single target with more scans than that)
+    cumulative = numpy.cumsum(counts)
+    start = 0
+    while start < len(targets):
+        end = max(start + 1, int(numpy.searchsorted(cumulative, (cumulative[start - 1] if start else 0) + max_pairs, "right")))
+        block = numpy.arange(start, end)
+        query = numpy.repeat(block, counts[block])
+        scan = expandRanges(first[block], counts[block])
+
+        # binary search of the ppm window of each target in each scan of its RT window
+        low = numpy.searchsorted(key, scan * width + targets[query] * (1 - ppm * 1e-6), "left")
+        high = numpy.searchsorted(key, scan * width + targets[query] * (1 + ppm * 1e-6), "right")
+        found = high > low
+        candidates = expandRanges(low[found], (high - low)[found])
+        candidateQuery = numpy.repeat(query[found], (high - low)[found])
+        candidateScan = numpy.repeat(scan[found], (high - low)[found])
+
+        # the most intense candidate of every target
+        order = numpy.lexsort((-spectra["intensity"][candidates], candidateQuery))
+        matched, best = numpy.unique(candidateQuery[order], return_index = True)
+        best = order[best]
+        observed[matched] = spectra["mz"][candidates[best]]
+        intensity[matched] = spectra["intensity"][candidates[best]]
+        scanTimes[matched] = scanRT[candidateScan[best]]
+        start = end
+
+    return observed, (observed - targets) / targets * 1e6, intensity, scanTimes
+
+#########################################################################################################################################
+## PREDICT METHOD: the target m/z of every CSM of a chunk (see csmReader.py), label and isotope offset; returns (CSM row, label, offset, ##
+## target m/z, RT) 1D arrays, rows ordered CSM by CSM. CSMs without an m/z or charge have no targets.                                   ##
+#########################################################################################################################################
+def predictTargets(chunk, offsets):
+
+    rows = numpy.array([index for index, (mZ, charge) in enumerate(zip(chunk["mz"], chunk["charge"])) if mZ is not None and charge], dtype = int)
+    seqA, seqB = [chunk["seqA"][row] for row in rows], [chunk["seqB"][row] for row in rows]
+    charge = numpy.array([chunk["charge"][row] for row in rows], dtype = float)
+    rt = numpy.array([chunk["rt"][row] if "rt" in chunk and chunk["rt"][row] is not None else numpy.nan for row in rows], dtype = float)
+    labeled = numpy.stack(nitrogenShift.labeledMZ(seqA, seqB, [chunk["mz"][row] for row in rows], charge), axis = 1)     # (CSMs, labels)
+
+    offsets = numpy.asarray(offsets, dtype = float)
+    targets = labeled[:, :, None] + offsets[None, None, :] * carbon13 / charge[:, None, None]                              # (CSMs, labels, offsets)
+    shape = targets.shape
+    return (numpy.broadcast_to(rows[:, None, None], shape).ravel(), numpy.broadcast_to(numpy.arange(len(labels))[None, :, None], shape).ravel(),
+            numpy.broadcast_to(offsets[None, None, :], shape).ravel().astype(int), targets.ravel(), numpy.broadcast_to(rt[:, None, None], shape).ravel())
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    arguments = [arg for arg in sys.argv[1:] if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    if not arguments:
+        print("Usage: python peakMatcher.py <spectra.mzML or .mgf> [export=mixedPeaks_CSMs.txt] [ppm=10] [rt=1.0] [offsets=-1:3] [out=Matched_peaks.csv]")
+        sys.exit(1)
+
+    ppm, window = float(options.get("ppm", 10)), float(options.get("rt", 1.0))
+    lowest, highest = (int(value) for value in options.get("offsets", "-1:3").split(":"))
+    offsets = list(range(lowest, highest + 1))
+    output = options.get("out", "Matched_peaks.csv")
+
+    spectra = loadSpectra(arguments[0])
+    print(len(spectra["rt"]), "scans,", len(spectra["mz"]), "peaks read from", arguments[0])
+
+    count, matchedCSMs = 0, {label: 0 for label in labels}
+    with open(output + ".part", "w", newline = '') as file:
+        writer = csv.writer(file, delimiter = ',', lineterminator = '\n')
+        writer.writerow(["#", "Sequence A", "Sequence B", "Charge", "RT [min]", "Label", "Isotope offset", "Predicted m/z", "Observed m/z", "ppm error", "Intensity", "Scan RT [min]"])
+
+        for chunk in csmReader.readChunks(options.get("export", "mixedPeaks_CSMs.txt"), require = ("seqA", "seqB", "mz", "charge")):
+            rows, label, offset, targets, rts = predictTargets(chunk, offsets)
+            observed, error, intensity, scanTimes = matchPeaks(spectra, targets, rts, ppm, window)
+
+            for index in range(len(targets)):
+                row = rows[index]
+                evidence = [round(observed[index], 4), round(error[index], 2), round(intensity[index], 1), round(scanTimes[index], 4)] if observed[index] == observed[index] else ["", "", "", ""]
+                writer.writerow([count + row + 1, chunk["seqA"][row], chunk["seqB"][row], chunk["charge"][row], chunk["rt"][row] if "rt" in chunk else "",
+                                 labels[label[index]], offset[index], round(targets[index], 4)] + evidence)
+
+            # CSMs with a match at their predicted monoisotopic peak, per label
+            monoisotopic = (offset == 0) & ~numpy.isnan(observed)
+            for index, name in enumerate(labels):
+                matchedCSMs[name] += len(numpy.unique(rows[monoisotopic & (label == index)]))
+            count += len(chunk["seqA"])
+
+    os.replace(output + ".part", output)
+    print(count, "CSMs searched at", ppm, "ppm,", "+/-", window, "min")
+    for name in labels:
+        print("  ", name, "monoisotopic peak found for", matchedCSMs[name], "CSMs")
+    print("Matches written to", output)
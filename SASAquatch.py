@@ -33,52 +33,55 @@ PyMOL> run script.py
 ## NOTE: "Bad" residue selections are detected if cmd.count_atom("sele") == 0. The moment a residue is detected like this,
 ## that entire protein is logged in an error file as failed due to bad selection algebra, and the loop skips to the next query. 
 
-from pymol import cmd     # PyMOL's methods and commands; this is required for the script to use PyMOL's functions.
-import pymol              # this one might be unnecessary since we specifically need pymol.cmd()
+try:
+    from pymol import cmd     # PyMOL's methods and commands; this is required for the script to use PyMOL's functions.
+    import pymol              # this one might be unnecessary since we specifically need pymol.cmd()
+except ImportError:
+    cmd = None                # PyMOL is not installed; only the NumPy engine (`engine=numpy`, see shrakeRupley.py) can run
 import re                 # methods for string editing
 import decimal            # methods for correct rounding
+import hashlib            # methods for the content hash of a structure in a job's checkpoint
+import gzip               # methods for reading gzipped structure files one chain window at a time (`memory=low`)
+import io                 # methods for reading an archive member one chain window at a time (`memory=low`)
 import csv                # methods for handling csv file i/o
 import time               # methods for tracking efficiency of the code (CPU time)
 import os                 # methods for directory handling
+import json               # methods for reading and writing job checkpoints
 import sys                # methods for taking command line arguments. Script's name is sys.arg[0] by default when -c flag is used
-
-print("Number of arguments entered when running this instance of `SASAquatch.py`:", len(sys.argv)-1) # check number of arguments entered
-print("WARNING 10/20/2022: cmd.load is now supported but on Condor those files need to be available, explicitly listed in the batch list file and then sent to the cluster.\n This means `BulkSubmit.sh needs to be updated to check for the load condition and to then copy the listed files over to the cluster with everything else.")
-
-# NOTE This script must take arguments at [3] and [4] because the intrepreter argument "pymol", the "-c" flag, and the script name are being interpred by this script as initial arguments [0], [1], and [2].
-# QUERY: assign PDB ID to the first argument in the list of possible arguments, uppercase it (arg is case insensitive), and typecast to string
-#query = str(sys.argv[3].upper())           # TODO is the upper() method call necessary? Forces all queries to be case insensitive BUT if a file is being identified for cmd.load,
-                                            # TODO that is likely to be case-sensitive and may be causing the pdb file failures on the CHTC even though it works locally
-
-query = str(sys.argv[3])                    # TODO testing query without uppercasing                                        
-
-# DEPTH: assign query type ('ALL' as default, unless a 4th argument is explicitly entered: an amino acid single letter code or 3-letter code).
-# checking first for another argument must be done before attempting to assign it; else a nonexistent argument will make the script close instead.
-if len(sys.argv)-1 == 4:
-    depth = str(sys.argv[4].upper())        # TODO is the upper() method call necessary? Forces all queries to be case insensitive BUT if a file is being identified for cmd.load,
-                                            # TODO that is likely to be case-sensitive and may be causing the pdb file failures on the CHTC even though it works locally
-
-else:
-    depth = "ALL"
-
-# check whether user is fetching a protein by its PDB ID or if the user wants to load an existing molecule file instead.
-if "." in query:   #NOTE greedy for all file extensions - refine later
-    mode = "load"
-else:
-    mode = "fetch"
-    query = query.upper()
+import urllib.request     # methods for downloading structure files when PyMOL's `cmd.fetch()` is not available
+try:
+    import shrakeRupley   # PyMOL-independent SASA engine (`engine=numpy`); needs NumPy
+except ImportError:
+    shrakeRupley = None
+try:
+    import structureCache # local cache (and offline mirror) of downloaded structure files; see structureCache.py
+except ImportError:
+    structureCache = None
+try:
+    import resultCache    # persistent cache of finished output tables; see resultCache.py
+except ImportError:
+    resultCache = None
+try:
+    import resultStore    # SQLite store for the results of a whole list (`store=`); see resultStore.py
+except ImportError:
+    resultStore = None    # not transferred with the job (ex. the root BulkSubmit.sh sends SASAquatch.py alone); only `store=` needs it
+try:
+    import structureArchive # streaming reader for tar/tar.gz archives and directories of (gzipped) structure files; see structureArchive.py
+except ImportError:
+    structureArchive = None # not transferred with the job; only archive sources and `context=ensemble` need it
+try:
+    import resource       # methods for the peak memory (RSS) of the job's process; not available on Windows
+except ImportError:
+    resource = None
 
 # finally, check whether user wants to include -het- chains in the structure (matters if SASA modeling is expected to be affected by presence of a biological ligand)
-# TODO build another conditional - if het == someLigandCSVstring, import string into a list by default and call a remove-het helper method.
-# TODO also requires converting the cmd.remove(het) codeline into a call to a new helper method for parsing a user-requested list of hets worth keeping.
-# TODO example hets worth keeping: AMPPNP or AMPPCP in AHA2 or SERCA
+# NOTE `context=ligand ligands=ANP,ACP` keeps the listed hets (ex. AMPPNP = ANP or AMPPCP = ACP in AHA2 or SERCA) and writes each residue's SASA with and without them;
+# every other job still removes all het atoms. See `runQuery()`.
 
 #_____________________________________________________________________________________________________________________________________________________________________________________________________________
-# FIXME FIXME FIXME Include a new method for calculating each chain in the context of the entire crystal unit (covers true oligomeric structures and also artifactual ones)
-# FIXME FIXME FIXME This is a memory-intensive process because to get "relative" SASA values it would need to calculate each chain's per-res SASA in the absence of the other chains,
-# FIXME FIXME FIXME ...AND to then re-do the calculation on each chain in the presence of the other chains. To minimize memory, the second step has to happen first; then, each chain would need to 
-# FIXME FIXME FIXME be calculated on its own. Those values are then used as the "reference" for calculating the relative SASA of each chain.
-# FIXME FIXME FIXME Also, using a "threshold" for relative SASA is sketchy. It may be better to use the actual value of water's SASA as the hard cutoff for solvent-accessibility.
+# NOTE each chain in the context of the entire crystal unit AND on its own is `context=interface` (see `buildIsolatedTable()` and `find_Interface_resi()`):
+# the complex is calculated first, then one isolated chain copy at a time, so only the complex plus one chain are ever held in memory.
+# FIXME FIXME FIXME Using a "threshold" for relative SASA is sketchy. It may be better to use the actual value of water's SASA as the hard cutoff for solvent-accessibility.
 #______________________________________________________________________________________________________________________________________________________________________________________________________________
 
 ## Dictionary of residue attributes needed for SASA calculations. 1 entry per amino acid; the single-letter AA code is the key,
@@ -108,7 +111,7 @@ AA_attributes = {'ARG' : ('R', 249.4673309, 380.2754517, 'arginine'),
                  'TYR' : ('Y', 231.1389923, 357.9006042, 'tyrosine'),   
                  'TRP' : ('W', 262.1514587, 387.6826172, 'tryptophan')}
 
-# NOTE this Dictionary is used only by non-default queries
+# NOTE this Dictionary is used only by non-default queries (each code of a comma-separated `depth` list is looked up here; see `parseQuery()`)
 AA_letterCode = {'R' : ('ARG'), 'H' : ('HIS'), 'K' : ('LYS'), 'D' : ('ASP'), 'E' : ('GLU'), 'S' : ('SER'), 'T' : ('THR'), 'N' : ('ASN'), 'Q' : ('GLN'), 'C' : ('CYS'),   
                  'G' : ('GLY'), 'P' : ('PRO'), 'A' : ('ALA'), 'V' : ('VAL'), 'I' : ('ILE'), 'L' : ('LEU'), 'M' : ('MET'), 'F' : ('PHE'), 'Y' : ('TYR'), 'W' : ('TRP'),
                  'ARG' : ('ARG'), 'HIS' : ('HIS'), 'LYS' : ('LYS'), 'ASP' : ('ASP'), 'GLU' : ('GLU'), 'SER' : ('SER'), 'THR' : ('THR'), 'ASN' : ('ASN'), 'GLN' : ('GLN'), 'CYS' : ('CYS'),   
@@ -118,91 +121,418 @@ AA_letterCode = {'R' : ('ARG'), 'H' : ('HIS'), 'K' : ('LYS'), 'D' : ('ASP'), 'E'
 # FIXME/NOTE Note that this is an *arbitrary* cutoff, generally accepted. There are arguments to be made against this value.
 threshold = 0.25
 
-## Initialize empty variables and data stuctures for handling pymol's iterator stream
-stored_residues = set() # for capturing iterate's `resi` list
-atmNum = 0
-resname = set()         # for capturing iterate's `resn` list, called by the current `resi`, and clear duplicates; and a string variable to capture the `resn`
-
-#############################################################################################################################################################
-## Helper Method: evaluate if electron density exists at the current residue position is actually present in the structure model, and annotate accordingly ##
-#############################################################################################################################################################
-def occupancy(position, chain):
-
-    #NOTE Currently, pymol treats invalid selections are treated as real objects, and default to 0 when calculations are performed. This leads to falsely labeling residues
-    # as buried and their SASA as 0, when that may not reflect reality. May need to extend this method to check for bad selections.
-
-    # By default, pymol reports occupancy as '1' when it can't find electron density. Check for absent density so it can be flagged in the output file.
-    atmNum = cmd.count_atoms("resi " + position + " and chain " + chain)
+# PyMOL surface settings used by every job (see `loadPymolStructure()`); they are also part of each result's key in resultCache.py
+dot_solvent = 1  ## 1 is for solvent surface area. 0 is for total molecular surface area [default]
+dot_density = 4  ## 1-4; defines quality (accuracy) of the calculation, better=more CPU
+
+# LOG LEVEL: how much a job prints to the console (`log=quiet|info|debug`, or the SASA_LOG environment variable). "info" (default) prints the job's progress;
+# "debug" also prints every residue row and residue table, as older versions of this script did; "quiet" prints only errors and the job's metrics line.
+log_levels = {"quiet": 0, "info": 1, "debug": 2}
+default_log_level = os.environ.get("SASA_LOG", "info")
+log_level = default_log_level
+
+# METRICS: the phases each job's time is divided into (see `GO()`); every job ends with one `METRICS {...}` JSON line, read by condor/aggregateMetrics.py
+metric_phases = ("load", "het_removal", "chains", "indexing", "surface", "write")
+jobMetrics = {}
+
+# WINDOWS: the current session's window cutoff (see `getWindowCutoff()`) and, in `memory=low` jobs, the index of the structure's chains (see `readChainWindows()`)
+windowState = {}
+
+##########################################################################################################
+## Helper Methods: console output at a log level, and the per-phase timings of the current job's metrics ##
+##########################################################################################################
+def logPrint(level, *args):
+    if log_levels[level] <= log_levels[log_level]:
+        print(*args)
+
+def addPhase(phase, start_time):
+    # adds the time since `start_time` to a phase, and returns the current time so the next phase can start from it
+    now = time.time()
+    if jobMetrics:
+        jobMetrics["phases"][phase] += now - start_time
+    return now
+
+####################################################################################################################################################
+## Helper Method: build the residue table for a selection with a single `cmd.iterate` pass; every later step reads residue attributes from here ##
+####################################################################################################################################################
+def buildResidueTable(selexpression):
+
+    # NOTE Per-residue selections (`cmd.count_atoms`, `cmd.iterate` for each `resi`) each parse a new selection string, which dominates runtime for small structures.
+    # NOTE PyMOL keeps atoms in residue order, so the table is filled in true residue order (including insertion codes and negative positions) without any sorting.
+    logPrint("debug", "Building residue table with the selection expression ", selexpression)
+    start_time = time.time()
 
-    if atmNum == 1:   
-        return False
+    # (object, index) pairs of all sidechain atoms in the selection; `cmd.index()` returns these without evaluating a python expression per atom
+    sideIndex = set(cmd.index(selexpression + " and sidechain"))
+
+    atoms = []     # (resi, resv, resn, occupancy, b-factor, (object, index)) for every atom in the selection
+    cmd.iterate(selexpression, 'atoms.append((resi, resv, resn, q, b, (model, index)))', space={'atoms': atoms})
+
+    # Dictionary of residues; key = `resi` (position + insertion code, as a string), value = Dictionary of that residue's attributes.
+    # "area" and "sideArea" are sums of the b-factor column, which holds per-atom SASA only after `cmd.get_area(..., load_b=1)` has been run.
+    residues = {}
+    for resi, resv, resn, q, b, atom in atoms:
+        if resi not in residues:
+            residues[resi] = {"resv": resv, "ins": resi[len(str(resv)):], "resn": resn, "atoms": 0, "sideAtoms": 0, "occupancy": q, "area": 0.0, "sideArea": 0.0}
+
+        residue = residues[resi]
+        residue["atoms"] += 1
+        residue["occupancy"] = min(residue["occupancy"], q)
+        residue["area"] += b
+
+        if atom in sideIndex:
+            residue["sideAtoms"] += 1
+            residue["sideArea"] += b
+
+    addPhase("indexing", start_time)
+    logPrint("debug", "Residue table contains", len(residues), "residues:", list(residues))
+
+    return residues
+
+##################################################################################################################################################
+## Helper Method: the result-cache key of a job, or (None, None, None) when the structure file cannot be hashed without downloading it first  ##
+##################################################################################################################################################
+def getResultKey(query, mode, depth, sasa_pass, engine, use_cache=True, context="complex", adaptive=None, ligands=None, content=None, skip=()):
+
+    # a fetched ID is only hashed when it is in (or can be put in) the structure cache; otherwise there is no local file to hash before the job runs.
+    # An archive member (`content`) is hashed in memory.
+    filename = None
+    if content is None:
+        filename = fetchStructure(query, use_cache) if mode == "fetch" else query
+        if filename is None:
+            return None, None, None
+
+    # every setting that can change the numbers in the output table
+    if engine == "numpy":
+        settings = {"engine": shrakeRupley.engine_version, "dot_density": shrakeRupley.dot_density, "probe_radius": shrakeRupley.probe_radius}
     else:
-        return True
-
-#################################################################################################
-## Helper Method: get and sort all values of `resi` so that SASA calculations can be performed ##
-#################################################################################################
-def extractResCode(selexpression, stored_residues):
-
-    resPositions = []     # For storing the typecasted instance of the set `stored_residues` during each chain's calculations
-
-    print("Gathering `resi` values with the selection expression ", selexpression)
+        settings = {"engine": "pymol-" + cmd.get_version()[0], "dot_density": dot_density}
+    settings.update({"dot_solvent": dot_solvent, "het": "keep " + ",".join(ligands) if ligands else "remove all", "depth": depth, "threshold": threshold, "context": context, "pass": sasa_pass})
+    if adaptive is not None:
+        settings["adaptive"] = [adaptive["coarse"], adaptive["band"], sorted(adaptive["refine"])]
+    if skip:
+        settings["skip"] = sorted(skip)
+
+    structure_hash = resultCache.fileHash(filename) if content is None else resultCache.contentHash(content)
+    return resultCache.resultKey(structure_hash, settings), structure_hash, settings
+
+#############################################################################################################################
+## Helper Method: write a cached output table under this job's output name, relabeling the subheaders with this job's query ##
+#############################################################################################################################
+def writeCachedResult(cached, query, outname):
+
+    with open(cached, newline = '') as source, open(outname + '.part', 'w', newline = '') as file:
+        writer = csv.writer(file, delimiter = ',')
+        for row in csv.reader(source):
+            writer.writerow(["PDB ID: " + query if cell.startswith("PDB ID: ") else cell for cell in row])
+
+    os.replace(outname + '.part', outname)
+
+#########################################################################################################################################
+## Helper Method: the content hash of the query's structure (the hash resultCache.py keys results by), or None for a fetched ID that is ##
+## not in the structure cache                                                                                                          ##
+#########################################################################################################################################
+def structureHash(query, mode, use_cache=True, content=None):
+
+    if content is not None:
+        return hashlib.sha256(content).hexdigest()
+    filename = fetchStructure(query, use_cache) if mode == "fetch" else query
+    if filename is None or not os.path.exists(filename):
+        return None
+
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+#################################################################################################################################################
+## Helper Method: the path of a local copy of a PDB ID's structure file from the structure cache, or None when it should be downloaded instead ##
+#################################################################################################################################################
+def fetchStructure(query, use_cache=True):
+
+    # NOTE the cache directory, mirror directory and offline mode are set with the SASA_CACHE, SASA_MIRROR and SASA_OFFLINE environment variables (see structureCache.py).
+    # In offline mode an ID that is neither cached nor mirrored raises `structureCache.StructureNotFound` instead of being downloaded.
+    if not use_cache or structureCache is None:
+        return None
+
+    return structureCache.resolve(query)
+
+######################################################################################################################################################
+## Helper Method: (PyMOL engine) start a fresh session, load the query, remove het atoms, and return each unique chain with its fasta sequence     ##
+######################################################################################################################################################
+def loadPymolStructure(query, mode, sasa_pass, use_cache=True, low_memory=False, density=None, ligands=None, content=None, finished=()):
+
+    # start with a fresh pymol session
+    start_time = time.time()
+    cmd.reinitialize()
+    windowState.clear()
+
+    # SASA settings
+    cmd.set('dot_solvent', dot_solvent)
+    cmd.set('dot_density', density if density is not None else dot_density)   # `density=adaptive` starts from its coarse density; see `refineResidueTable()`
+
+    # low-memory mode never loads the whole entry; each chain's window is loaded on its own later (see `buildWindowTable()`), and a resumed job simply skips its finished chains
+    if low_memory:
+        return readChainWindows(query, mode, use_cache, ligands, content)
+
+    # Import structure, then remove unwanted (non-amino acid, or "het") objects. #FIXME this may remove biochemically important groups from proteins (ex, the `CHO` fluorophore in GFP; see 2B3P, resi #65-67 for details)
+    if mode == "fetch":
+        filename = fetchStructure(query, use_cache)
+        if filename is not None:
+            cmd.load(filename, query)     # cached copy; loaded under the same object name `cmd.fetch()` would have used
+            logPrint("info", "Loaded query ID from the structure cache: " + query)
+        else:
+            cmd.fetch(query)
+            logPrint("info", "Downloaded query ID: " + query)
+    elif content is not None:
+        cmd.load_raw(content.decode(), structureArchive.memberFormat(query), os.path.splitext(query)[0])   # archive member, straight from memory; same object name as `cmd.load()`
+        logPrint("info", "Loaded query from archive: " + query)
+    else:
+        cmd.load(query)
+        logPrint("info", "Loaded query file: " + query)
+    if cmd.count_states() > 1:
+        logPrint("info", "NOTE " + query + " holds " + str(cmd.count_states()) + " models; only the first is calculated (`context=ensemble` calculates all of them)")
+    start_time = addPhase("load", start_time)
+
+    # hets listed in `ligands=` (3-letter het codes, ex. ANP) stay in the structure and occlude the surface; see `buildApoTable()`
+    removeHets(ligands)
+    if ligands:
+        logPrint("info", "Ligand atoms kept in the structure:", cmd.count_atoms("het"))
+    jobMetrics["atoms"] = cmd.count_atoms("all")
+    start_time = addPhase("het_removal", start_time)
+
+    # the chains are read before a resumed job trims the chains it has already finished (below), which would change their sequences
+    chainPlusFasta = getPymolChains()
+    start_time = addPhase("chains", start_time)
+
+    # RESUME: chains finished before a restart (see `readCheckpoint()`) are cut down to the atoms close enough to touch the surface of the other chains,
+    # so the surface below is only calculated for what is still missing; the remaining chains' values are the same as in a full calculation
+    if finished:
+        done = "chain " + "+".join(finished)
+        cmd.remove("(" + done + ") and not ((" + done + ") within " + getWindowCutoff() + " of (not (" + done + ")))")
+        logPrint("info", "Finished chains trimmed; atoms left in the structure:", cmd.count_atoms("all"))
+
+    # single-pass mode: calculate the SASA of every atom in the structure once, and store each atom's value in its b-factor column
+    if sasa_pass == "structure":
+        cmd.get_area("all", load_b=1)
+    addPhase("surface", start_time)
+
+    return chainPlusFasta
+
+def removeHets(ligands=None):
+    # remove het atoms from everything loaded, except the hets listed in `ligands=`
+    if ligands:
+        cmd.remove("het and not resn " + "+".join(ligands))
+        cmd.flag("ignore", "het", "clear")   # PyMOL flags ligands as "ignore" on load, and `cmd.get_area()` skips ignored atoms
+    else:
+        cmd.remove("het")
 
-    # For each unique chain, iterate the residue positions into a Set named `stored_residues`
-    cmd.iterate(selexpression, 'stored_residues.add(resi)')
-    resPositions = list(stored_residues)                 # re-casting the set to a list, then back to a set erases duplicates, because sets do not keep duplicate elements
-    resPositions.sort()                                  # sort() first to apply numerical character sorting
-    resPositions.sort(key=len)                           # sort(key=len) uses the string element's length as the key to sort against, so now both sort rules apply
-    
-    # Resets `stored_residues` list object to an empty set
-    stored_residues.clear()
-    print("\nContents of set `stored_residues` should be empty and are now:", stored_residues,"\nContents of `resPositions` are now:", resPositions)
+##########################################################################################################################
+## Helper Method: (PyMOL engine) each unique chain of the loaded structure with its fasta sequence                      ##
+##########################################################################################################################
+def getPymolChains():
+
+    # detect all chains present in the file and get the full fasta string sequence for each unique chain; remove the first line (unwanted header), then the whitespace,
+    # leaving only the AA single-letter characters in the string.
+    chainID_list = []     # List for recording chain ID's
+    chainPlusFasta = {}   # Dictionary for matching the current retrieved chain ID with its associated fasta
+
+    # Build a list of all chains in the structure file
+    for chain in cmd.get_chains("not het"):                # (only retained ligands can still be het atoms; a chain holding nothing but ligands is skipped)
+        fasta = cmd.get_fastastr("Chain " + str(chain) + " and not het") # gets the associated fasta with each chain ID     
+        fasta = fasta.split("\n",1)[1]   # removes the first line from the /n delimited fasta string
+        fasta = re.sub("\n", "", fasta)  # removes remaining /n
+        chainID_list.append(chain)       # Records chain IDs. TODO Important to have this in addition to `chainPlusFasta{}` for when all chains present are called. 
+
+        # Build a dictionary containing the chain ID and its associated (unique) fasta sequence. When the current value of 'fasta' is unique,
+        # it is added as the value and its associated chain ID (value of 'chain') is its key.
+        # NOTE that this is not always the correct way to look at surface area - a biological unit may actually be multimeric vs. just being a crystallization artifact.
+        # TODO need to implement more code to deal with this? Should keep all the chains by default, leave user to specify that unique chains are desired.
+
+        # NOTE FIXME NOTE FIXME a simple implementation would be to 1) add another parameter that this method accepts, with a default value if not specified
+        # and 2) to have this value passed here, and checked in an if-then branch that builds in the `if fasta not in ...` statement. This branch is taken if unique chains
+        # are desired. 3) Finally, the alternative branch is all chains that are present. 4) Yet another branch may specify that chains are done either in isolation,
+        # or in complex. The value in this type of calculation would be in comparing protein components in a complex before and after they adopt a multimeric or complex configuration.
+        # NOTE FIXME NOTE FIXME if additional conditions are in consideration, switch statements may be preferable to/faster than multiple if-then-else branches.
+
+        if fasta not in chainPlusFasta.values():
+            chainPlusFasta.update({chain:fasta})
+
+    return chainPlusFasta
+
+##############################################################################################################################
+## Helper Method: (NumPy engine, context=ensemble) the local file of the query's structure, downloading it if needed; None   ##
+## for an archive member (`content`), which is read from memory                                                             ##
+##############################################################################################################################
+def getStructureFile(query, mode, use_cache=True, content=None):
+
+    # fetching without PyMOL downloads the same mmCIF file that `cmd.fetch()` would have saved in the working directory (unless it is in the structure cache)
+    if mode == "fetch":
+        filename = fetchStructure(query, use_cache)
+        if filename is not None:
+            logPrint("info", "Loaded query ID from the structure cache: " + query)
+        else:
+            filename = query.lower() + ".cif"
+            if not os.path.exists(filename):
+                urllib.request.urlretrieve("https://files.rcsb.org/download/" + query + ".cif", filename)
+            logPrint("info", "Downloaded query ID: " + query)
+    elif content is not None:
+        filename = None
+        logPrint("info", "Loaded query from archive: " + query)
+    else:
+        filename = query
+        logPrint("info", "Loaded query file: " + query)
 
-    return resPositions
+    return filename
 
-#######################################################################################################################
-## Helper Method: call the current value of `resn` so that SASA calculations can reference the amino acid Dictionary ##
-#######################################################################################################################
-def getRESN(resi, chain):    # `resi` is the current position (from `currposition`)
+##############################################################################################################################
+## Helper Method: (NumPy engine) read the query's structure without PyMOL, remove het atoms, and calculate per-atom SASA     ##
+##############################################################################################################################
+def loadNumpyStructure(query, mode, use_cache=True, density=None, ligands=None, content=None, finished=()):
 
-    # use the current `resi` to get the corresponding three-letter code, `resn`      
-    cmd.iterate("resi " + resi + " and chain " + chain, 'resname.add(resn)')
-    print("`resname` contents:",resname)
+    start_time = time.time()
+    filename = getStructureFile(query, mode, use_cache, content)
+    structure = shrakeRupley.readStructure(filename) if content is None else shrakeRupley.readStructure(content.decode(), structureArchive.memberFormat(query))
+    start_time = addPhase("load", start_time)
+    structure = shrakeRupley.subset(structure, ~structure["het"] | shrakeRupley.ligandMask(structure, ligands))   # hets listed in `ligands=` are kept
+    jobMetrics["atoms"] = len(structure["coords"])
+    start_time = addPhase("het_removal", start_time)
+
+    radii = shrakeRupley.getRadii(structure)
+    grid = shrakeRupley.getGrid(structure["coords"], radii, shrakeRupley.probe_radius)   # neighbor index; kept for the isolated-chain pass in `context=interface` and the apo pass in `context=ligand`
+    # a resumed job only calculates the atoms of the chains it has not finished (the finished chains still occlude, and their own areas are left at 0)
+    targets = ~shrakeRupley.chainMask(structure, finished) if finished else None
+    areas = shrakeRupley.atomSASA(structure["coords"], radii, shrakeRupley.probe_radius, density if density is not None else shrakeRupley.dot_density, targets, grid)
+    addPhase("surface", start_time)
+
+    return structure, areas, radii, grid
+
+######################################################################################################################
+## Helper Method: (NumPy engine) single-letter sequence of a chain, in the same format `cmd.get_fastastr()` gives  ##
+######################################################################################################################
+def getNumpyFasta(structure, chain):
+
+    fasta = ""
+    seen = set()
+    for resi, resn in zip(structure["resi"][structure["chain"] == chain], structure["resn"][structure["chain"] == chain]):
+        if resi not in seen:
+            seen.add(resi)
+            fasta += AA_attributes[resn][0] if resn in AA_attributes else "X"
+
+    return fasta
+
+##########################################################################################################################################
+## Helper Method: (context=ensemble) per-residue SASA statistics over every model of the query (NMR models, MD frames). Models are read ##
+## one at a time (see `structureArchive.iterModels()`); the first model sets the topology and residue index, and each later model only ##
+## replaces the coordinates. Returns each unique chain with its fasta sequence, and the running statistics (see `shrakeRupley.addModel()`) ##
+##########################################################################################################################################
+def ensembleSASA(query, mode, engine, use_cache=True, content=None):
 
-    # pop the current `resn` from the set into `currRes`; this also empties the set, making it ready for the next pass in this loop.
-    currRes = resname.pop()
+    start_time = time.time()
+    filename = getStructureFile(query, mode, use_cache, content)   # (fetched IDs are read from the mmCIF file, by either engine)
+    source = filename if content is None else query
+    fmt = structureArchive.memberFormat(source)
+    stats = None
+
+    # NOTE only the current model is ever in memory: the PyMOL object keeps a single state, whose coordinates are replaced by each new model
+    for model, text in structureArchive.iterModels(source, content):
+
+        if engine == "numpy":
+            structure = shrakeRupley.readStructure(text, fmt, model)
+            start_time = addPhase("load", start_time)
+            structure = shrakeRupley.subset(structure, ~structure["het"])
+            if stats is None:
+                radii = shrakeRupley.getRadii(structure)
+                stats = shrakeRupley.ensembleIndex(structure["chain"], structure["resi"], structure["resn"], [name not in shrakeRupley.backbone_names for name in structure["name"]])
+                chainPlusFasta = {}
+                for chain in shrakeRupley.getChains(structure):
+                    fasta = getNumpyFasta(structure, chain)
+                    if fasta not in chainPlusFasta.values():
+                        chainPlusFasta.update({chain:fasta})
+            elif len(structure["coords"]) != len(stats["index"]):
+                raise ValueError("model " + str(model) + " of " + query + " has " + str(len(structure["coords"])) + " atoms; the first model has " + str(len(stats["index"])))
+            start_time = addPhase("het_removal", start_time)
+            areas = shrakeRupley.atomSASA(structure["coords"], radii, shrakeRupley.probe_radius, shrakeRupley.dot_density)
 
-    return currRes
+        else:
+            if stats is None:
+                cmd.reinitialize()
+                cmd.set('dot_solvent', dot_solvent)
+                cmd.set('dot_density', dot_density)
+                cmd.load_raw(text, fmt, "ensemble")
+                start_time = addPhase("load", start_time)
+                cmd.remove("het")
+                start_time = addPhase("het_removal", start_time)
+
+                # the residue index is built from one iterate pass over the first model; every later model reuses it (PyMOL keeps atoms in the same order)
+                sideIndex = set(cmd.index("sidechain"))
+                atoms = []
+                cmd.iterate("all", 'atoms.append((chain, resi, resn, (model, index)))', space={'atoms': atoms})
+                stats = shrakeRupley.ensembleIndex([atom[0] for atom in atoms], [atom[1] for atom in atoms], [atom[2] for atom in atoms], [atom[3] in sideIndex for atom in atoms])
+                chainPlusFasta = getPymolChains()
+                start_time = addPhase("chains", start_time)
+            else:
+                # later models are loaded as a separate object only long enough to copy their coordinates into the first model's object
+                cmd.load_raw(text, fmt, "ensemble_frame")
+                start_time = addPhase("load", start_time)
+                cmd.remove("ensemble_frame and het")
+                if cmd.count_atoms("ensemble_frame") != len(stats["index"]):
+                    raise ValueError("model " + str(model) + " of " + query + " has " + str(cmd.count_atoms("ensemble_frame")) + " atoms; the first model has " + str(len(stats["index"])))
+                cmd.load_coords(cmd.get_coords("ensemble_frame"), "ensemble")
+                cmd.delete("ensemble_frame")
+                start_time = addPhase("het_removal", start_time)
+
+            areas = []
+            cmd.get_area("ensemble", load_b=1)
+            cmd.iterate("ensemble", 'areas.append(b)', space={'areas': areas})
+
+        if stats["models"] == 0:
+            maxima = [[AA_attributes[resn][2] if resn in AA_attributes else float("nan") for resn in stats["resn"]],
+                      [AA_attributes[resn][1] if resn in AA_attributes else float("nan") for resn in stats["resn"]]]
+        shrakeRupley.addModel(stats, areas, maxima, threshold)
+        start_time = addPhase("surface", start_time)
+        logPrint("debug", "Model", model, "calculated")
+
+    if stats is None:
+        raise ValueError(query + " holds no atom records")
+    logPrint("info", "Models calculated:", stats["models"])
+    jobMetrics["atoms"] = len(stats["index"])
+    jobMetrics["models"] = stats["models"]
+
+    return chainPlusFasta, stats
 
 ##################################################################################################################################################################
-#|  SASA METHOD: Uses a List `stored_residues` populated with `resi` values for all selection-expressions; `resi` retrieves the PSE residue position as shown.  |#
+#|  SASA METHOD: Uses the residue table from `buildResidueTable()`, keyed by `resi` values for the selection-expression; `resi` is the PSE residue position as shown. |#
 ##################################################################################################################################################################
-def find_Allchain_resi(seq, chain, resi, writer):   # seq is a string type, chain is a character type, resi is a List-type
-
-    print("Start of chain is position " + resi[0] + " and this sequence of length " + str(len(seq)) + " is:\n" + seq + "\n\n")
-
-    currRes = ""
-    currposition = ""  
-    residue = ""
+def find_Allchain_resi(seq, chain, residues, writer, sasa_pass="structure"):   # seq is a string type, chain is a character type, residues is the Dictionary from `buildResidueTable()`
 
-    for i in range(len(resi)):
-        # store the current `resi` and get its corresponding residue code, then call `occupancy()`: Confirm that this selection is actually present in the structure model
-        currposition = resi[i]        
-
-        # Method calls to check for the presence of electron density in the current selection, and then to collect the `resn` attached to each position.
-        presence = occupancy(currposition, chain)
-        currRes = getRESN(currposition, chain)
+    logPrint("debug", "Start of chain is position " + next(iter(residues), "N/A") + " and this sequence of length " + str(len(seq)) + " is:\n" + seq + "\n\n")
+    start_time = time.time()
 
+    for currposition, attributes in residues.items():
+        currRes = attributes["resn"]
         residue = "" + AA_attributes[currRes][0] + currposition
+
+        # By default, pymol reports occupancy as '1' when it can't find electron density; a residue modeled by a single atom is flagged as absent in the output file.
+        presence = attributes["atoms"] != 1
         
         ## Calculations are performed if the density of the current residue can be explicity selected within the Pymol session.
         if presence == True:           
             
-            # first, select the whole amino acid (current residue) and record its SASA
-            tot_sasa = cmd.get_area("resi " + currposition + " and chain " + chain)
+            # when the per-atom SASA was already calculated for the whole structure, the residue table holds this residue's totals
+            if sasa_pass == "structure":
+                tot_sasa = attributes["area"]
+                side_sasa = attributes["sideArea"]
 
-            # next, clear the current selector, re-select the current residue, and record the SASA of its sidechain
-            side_sasa = cmd.get_area("resi " + currposition + " and chain " + chain + " and sidechain")
+            else:
+                # first, select the whole amino acid (current residue) and record its SASA (timed as the job's surface phase; the rest of this method is its write phase)
+                start_time = addPhase("write", start_time)
+                tot_sasa = cmd.get_area("resi " + currposition + " and chain " + chain)
+
+                # next, clear the current selector, re-select the current residue, and record the SASA of its sidechain
+                side_sasa = cmd.get_area("resi " + currposition + " and chain " + chain + " and sidechain")
+                start_time = addPhase("surface", start_time)
 
             # now, calculate the relative SASA of the sidechain and the whole residue separately, and assess "burial" status based on the current threshold.
             # Burial status defaults to "exposed" UNLESS the value falls below the threshold. Relative SASA values are calculated using the maximum SASA
@@ -231,127 +561,901 @@ def find_Allchain_resi(seq, chain, resi, writer):   # seq is a string type, chai
             sideburial = totburial = "N/A"
         
         ## Each SASA printed to console and then to output
-        print(residue + " | " + tot_sasa + " | " + totrel_sasa + " | " + totburial + " | " + side_sasa + " | " + siderel_sasa + " | " + sideburial)
+        logPrint("debug", residue + " | " + tot_sasa + " | " + totrel_sasa + " | " + totburial + " | " + side_sasa + " | " + siderel_sasa + " | " + sideburial)
         current_row = [residue, tot_sasa, totrel_sasa, totburial, side_sasa, siderel_sasa, sideburial]
+        if "density" in attributes:
+            current_row.append(str(attributes["density"]))   # density=adaptive: the dot density these values were calculated at
         writer.writerow(current_row)
+    addPhase("write", start_time)
 
     return    # DONE
 
+###########################################################################################################################################
+## Helper Method: (PyMOL engine) distance (as a selection string) beyond which an atom cannot change another atom's surface              ##
+###########################################################################################################################################
+def getWindowCutoff():
+
+    # an atom can only bury a dot of another atom when the two atoms' (vdW + probe) spheres overlap, so anything farther than twice the largest
+    # (vdW + probe) radius in the structure cannot change the other atom's surface. The atoms are read once per session, and every later window reuses the cutoff.
+    if "cutoff" not in windowState:
+        radii = []
+        cmd.iterate("all", 'radii.append(vdw)', space={'radii': radii})
+        cutoff = 2 * (max(radii, default=0.0) + cmd.get_setting_float("solvent_radius"))
+        windowState["cutoff"] = str(round(cutoff + 0.5, 1))
+
+    return windowState["cutoff"]
+
+def parseAtomRecord(line, columns=None):
+    # (chain, het?, resn, atom name, element, coordinates, model) of one PDB atom record, or of one mmCIF `_atom_site` row with the loop's `columns`;
+    # the element also holds the atom name's first two characters, which PyMOL reads the element from when a PDB record leaves it blank
+    if columns is None:
+        return (line[21].strip(), line[:6] == "HETATM", line[17:20].strip(), line[12:16].strip(), line[76:78].strip() + line[12:14],
+                (float(line[30:38]), float(line[38:46]), float(line[46:54])), None)
+    fields = dict(zip(columns, line.split()))
+    return (fields.get("auth_asym_id", fields.get("label_asym_id")), fields["group_PDB"] == "HETATM", fields.get("auth_comp_id", fields.get("label_comp_id")),
+            fields.get("auth_atom_id", fields.get("label_atom_id")).strip('"'), fields["type_symbol"],
+            (float(fields["Cartn_x"]), float(fields["Cartn_y"]), float(fields["Cartn_z"])), fields.get("pdbx_PDB_model_num"))
+
+def keptRecord(line):
+    # the parsed record of a line of the current `memory=low` job, or None for anything that is not an atom record, and for hets that are not kept (`ligands=`)
+    if windowState["format"] == "pdb" and not line.startswith(("ATOM  ", "HETATM")):
+        return None
+    if windowState["format"] == "cif" and (not line or line.startswith(("#", "_", "loop_", "data_"))):
+        return None
+    atom = parseAtomRecord(line, windowState["columns"])
+    return None if atom[1] and atom[2] not in (windowState["ligands"] or []) else atom
+
+def openStructure():
+    # the current `memory=low` job's structure as a binary stream that can seek (offsets of a gzipped file count its decompressed bytes)
+    if windowState["content"] is not None:
+        return io.BytesIO(windowState["content"])
+    return (gzip.open if windowState["source"].lower().endswith(".gz") else open)(windowState["source"], "rb")
+
+########################################################################################################################################################
+## Helper Method: (PyMOL engine, memory=low) index the first model of the query without holding its atoms, and return each unique chain with its     ##
+## fasta sequence. The index (in `windowState`) holds every chain's bounding box and the file offsets of its records, for `buildWindowTable()`        ##
+########################################################################################################################################################
+def readChainWindows(query, mode, use_cache=True, ligands=None, content=None):
+
+    # NOTE `cmd.get_area()` calculates every atom of an object, so PyMOL only ever holds one chain window at a time, and python only ever holds one window's
+    # atom records: the file is read once to index the chains, and then once more per window (only the byte ranges of the chains near it).
+    # The chains' order comes from one atom of each chain, each chain's sequence from its guide atoms (CA, and P and C4' for nucleic acids; the atoms
+    # `cmd.get_fastastr()` reads), and the window cutoff from one atom of each element; all three are small objects that are dropped again right away.
+    start_time = time.time()
+    filename = getStructureFile(query, mode, use_cache, content)
+    windowState.update({"source": filename, "content": content, "format": structureArchive.memberFormat(filename if content is None else query),
+                        "ligands": ligands, "columns": None, "chains": {}})
+
+    atoms, offset, previous, model, rows, firsts, samples = 0, 0, None, None, False, {}, {}
+    with openStructure() as file:
+        for raw in file:
+            start, offset = offset, offset + len(raw)
+            line = raw.decode().rstrip("\r\n")
+
+            # first model only: PDB records up to the first ENDMDL, or the rows of the mmCIF `_atom_site` loop with the first model number
+            if windowState["format"] == "pdb" and line.startswith("ENDMDL"):
+                break
+            if windowState["format"] == "cif":
+                if line.startswith("_atom_site."):
+                    windowState["columns"] = (windowState["columns"] or []) + [line[len("_atom_site."):].strip()]
+                    continue
+                if windowState["columns"] is None:
+                    continue
+                if not line or line.startswith(("#", "_", "loop_", "data_")):
+                    if rows:
+                        break
+                    continue
+                rows = True
+
+            atom = keptRecord(line)
+            if atom is None:
+                continue
+            chain, het, resn, name, element, xyz, number = atom
+            if model is not None and number != model:
+                break
+            model = number
+
+            # a chain's records are indexed as runs of the file (a run continues over lines that are skipped, ex. ANISOU records or removed waters)
+            entry = windowState["chains"].setdefault(chain, {"low": list(xyz), "high": list(xyz), "segments": []})
+            entry["low"] = [min(a, b) for a, b in zip(entry["low"], xyz)]
+            entry["high"] = [max(a, b) for a, b in zip(entry["high"], xyz)]
+            if previous == chain:
+                entry["segments"][-1][1] = offset
+            else:
+                entry["segments"].append([start, offset])
+            previous = chain
+
+            if not het:
+                firsts.setdefault(chain, line)
+            samples.setdefault((element, het, resn if het else ""), line)
+            atoms += 1
+    windowState["header"] = ["data_model", "loop_"] + ["_atom_site." + column for column in windowState["columns"]] if windowState["format"] == "cif" else []
+    jobMetrics["atoms"] = atoms
+    start_time = addPhase("load", start_time)
+
+    loadRecords(list(firsts.values()), "chain_order")
+    order = cmd.get_chains("not het")
+    cmd.delete("chain_order")
+    chainPlusFasta = {}
+    for chain in order:
+        loadRecords([firsts[chain]] + [line for line, atom in readRecords([chain]) if not atom[1] and atom[3] in ("CA", "P", "C4'", "C4*")], "chain_guides")
+        fasta = getPymolChains().get(chain, "")
+        cmd.delete("chain_guides")
+        if fasta not in chainPlusFasta.values():
+            chainPlusFasta.update({chain:fasta})
+    start_time = addPhase("chains", start_time)
+
+    loadRecords(list(samples.values()), "element_samples")
+    removeHets(ligands)
+    getWindowCutoff()
+    cmd.delete("element_samples")
+    addPhase("indexing", start_time)
+
+    return chainPlusFasta
+
+def readRecords(chains):
+    # yield (line, parsed record) of every kept atom of some chains of the current `memory=low` job, in file order, reading only those chains' byte ranges
+    segments = sorted(segment for chain in chains for segment in windowState["chains"][chain]["segments"])
+    with openStructure() as file:
+        for start, end in segments:
+            file.seek(start)
+            for line in file.read(end - start).decode().splitlines():
+                atom = keptRecord(line)
+                if atom is not None and atom[0] in chains:
+                    yield line, atom
+
+def loadRecords(records, name):
+    # load atom records of the current `memory=low` job into a new object, as a file of the job's own format
+    footer = "\n#\n" if windowState["format"] == "cif" else "\nEND\n"
+    cmd.load_raw("\n".join(windowState["header"] + records) + footer, windowState["format"], name)
+
+################################################################################################################################################
+## Helper Method: (PyMOL engine, memory=low) residue table of one chain, calculated on a window holding only that chain and the atoms of other ##
+## chains that can touch its surface; peak memory follows the largest chain neighborhood instead of the whole entry                          ##
+################################################################################################################################################
+def buildWindowTable(chain, requested):
+
+    # only the chains whose bounding boxes come within the cutoff of this chain's box are read, and of them only the atoms inside that reach; the exact
+    # window is then cut from those with the cell grid. The window replaces the previous chain's window, and stays loaded as the session's only object,
+    # so `buildIsolatedTable()` and `buildApoTable()` work on it.
+    start_time = time.time()
+    cmd.delete("chain_window")
+    cutoff = float(getWindowCutoff())
+    low = [value - cutoff for value in windowState["chains"][chain]["low"]]
+    high = [value + cutoff for value in windowState["chains"][chain]["high"]]
+    nearby = [other for other, entry in windowState["chains"].items() if all(a <= d and b >= c for a, b, c, d in zip(entry["low"], entry["high"], low, high))]
+
+    lines, coords, inChain = [], [], []
+    for line, atom in readRecords(nearby):
+        if atom[0] == chain or all(a <= x <= b for a, x, b in zip(low, atom[5], high)):
+            lines.append(line)
+            coords.append(atom[5])
+            inChain.append(atom[0] == chain)
+    window = shrakeRupley.windowMask(shrakeRupley.np.array(coords, dtype=float).reshape(-1, 3), shrakeRupley.np.array(inChain, dtype=bool), cutoff)
+    loadRecords([lines[index] for index in shrakeRupley.np.flatnonzero(window)], "chain_window")
+    removeHets(windowState["ligands"])
+    start_time = addPhase("load", start_time)
+    cmd.get_area("chain_window", load_b=1)
+    addPhase("surface", start_time)
+    residues = buildResidueTable("chain_window and chain " + str(chain) + requested)
+
+    return residues
+
+##################################################################################################################################################
+## Helper Method: (density=adaptive) whether a residue's coarse SASA is too close to the burial threshold to trust, or its type is always refined ##
+##################################################################################################################################################
+def needsRefinement(attributes, adaptive):
+
+    # residues flagged as absent (a single modeled atom) are never written with values, so there is nothing to refine
+    if attributes["atoms"] == 1 or attributes["resn"] not in AA_attributes:
+        return False
+    if attributes["resn"] in adaptive["refine"]:
+        return True
+
+    # within `band` of the threshold, the coarse dot sphere's error could flip an Exposed/Buried call
+    totrel_sasa = attributes["area"] / AA_attributes[attributes["resn"]][2]
+    siderel_sasa = attributes["sideArea"] / AA_attributes[attributes["resn"]][1]
+    return abs(totrel_sasa - threshold) <= adaptive["band"] or abs(siderel_sasa - threshold) <= adaptive["band"]
+
+################################################################################################################################################
+## Helper Method: (PyMOL engine, density=adaptive) recalculate the residues of a coarse residue table that need it at the full dot density,   ##
+## and record the density behind every residue's values                                                                                      ##
+################################################################################################################################################
+def refineResidueTable(chain, residues, requested, adaptive):
+
+    for attributes in residues.values():
+        attributes["density"] = adaptive["coarse"]
+
+    # `resi` values go into one `+`-separated selection; negative positions need their "-" escaped, or PyMOL reads it as a range
+    marked = [resi.replace("-", "\\-") for resi, attributes in residues.items() if needsRefinement(attributes, adaptive)]
+    logPrint("info", "Adaptive density: refining", len(marked), "of", len(residues), "residues in chain " + str(chain) + " at dot_density", dot_density)
+    if not marked:
+        return residues
+
+    # `cmd.get_area()` calculates the dots of every atom in an object, even for a smaller selection. The marked residues are therefore copied, with every atom
+    # close enough to occlude them, into a window object; only the window is recalculated, and the marked residues' values match a full dot_density 4 calculation.
+    selexpression = "chain " + str(chain) + " and resi " + "+".join(marked) + requested
+    start_time = time.time()
+    cmd.create("refine_window", "(" + selexpression + ") or (all within " + getWindowCutoff() + " of (" + selexpression + "))")
+    cmd.set('dot_density', dot_density)
+    cmd.get_area("refine_window", load_b=1)
+    cmd.set('dot_density', adaptive["coarse"])
+    addPhase("surface", start_time)
+
+    for resi, attributes in buildResidueTable("refine_window and " + selexpression).items():
+        attributes["density"] = dot_density
+        residues[resi] = attributes
+    cmd.delete("refine_window")
+
+    return residues
+
+################################################################################################################################################
+## Helper Method: (PyMOL engine) residue table of one chain with the chain taken out of its complex; only the complex plus one chain copy     ##
+## are ever held in the session                                                                                                               ##
+################################################################################################################################################
+def buildIsolatedTable(chain, requested):
+
+    # copy the chain into its own object, so its surface is calculated without the rest of the assembly, then drop the copy again
+    start_time = time.time()
+    cmd.create("isolated_chain", "chain " + str(chain))
+    cmd.get_area("isolated_chain", load_b=1)
+    addPhase("surface", start_time)
+    residues = buildResidueTable("isolated_chain and chain " + str(chain) + requested)
+    cmd.delete("isolated_chain")
+
+    return residues
+
+################################################################################################################################################
+## Helper Method: (PyMOL engine, context=ligand) residue table of one chain without the retained ligands (apo), from its table with them      ##
+## (holo); only residues within reach of a ligand can differ, and only they are recalculated, on a window without the ligand atoms            ##
+################################################################################################################################################
+def buildApoTable(chain, residues, requested):
+
+    apo = {resi: dict(attributes) for resi, attributes in residues.items()}
+    cutoff = getWindowCutoff()
+    contact = "byres (chain " + str(chain) + requested + " and (all within " + cutoff + " of het))"
+    if cmd.count_atoms(contact) == 0:
+        return apo
+
+    # same window rule as `refineResidueTable()`: every atom that can occlude the contact residues is copied along, except the ligands themselves
+    start_time = time.time()
+    cmd.create("apo_window", "(" + contact + ") or ((not het) within " + cutoff + " of (" + contact + "))")
+    cmd.get_area("apo_window", load_b=1)
+    addPhase("surface", start_time)
+
+    for resi, attributes in buildResidueTable("apo_window and (" + contact + ")").items():
+        apo[resi] = attributes
+    cmd.delete("apo_window")
+
+    return apo
+
+##################################################################################################################################################################
+#|  SASA METHOD: (context=interface) writes each residue's SASA in the complex and with its chain isolated, and the area buried by the interface (isolated - complex) |#
+##################################################################################################################################################################
+def find_Interface_resi(seq, chain, residues, isolated, writer, flags=("Interface", "Not interface")):   # residues and isolated are residue tables of the same chain, from the complex and from the chain alone
+
+    logPrint("debug", "Start of chain is position " + next(iter(residues), "N/A") + " and this sequence of length " + str(len(seq)) + " is:\n" + seq + "\n\n")
+    start_time = time.time()
+
+    for currposition, attributes in residues.items():
+        currRes = attributes["resn"]
+        residue = "" + AA_attributes[currRes][0] + currposition
+
+        # same presence rule as `find_Allchain_resi()`
+        if attributes["atoms"] != 1:
+            tot_sasa = attributes["area"]
+            iso_sasa = isolated[currposition]["area"]
+            side_sasa = attributes["sideArea"]
+            isoside_sasa = isolated[currposition]["sideArea"]
+
+            # a residue at an interface loses surface when its chain joins the complex; "Interface" marks residues that lose any of it
+            # (context=ligand writes the same columns with the ligand-bound (holo) table as `residues` and the ligand-free (apo) table as `isolated`)
+            values = [tot_sasa, iso_sasa, iso_sasa - tot_sasa, tot_sasa / AA_attributes[currRes][2], iso_sasa / AA_attributes[currRes][2],
+                      side_sasa, isoside_sasa, isoside_sasa - side_sasa]
+            values = [str(value) for value in values] + [flags[0] if iso_sasa - tot_sasa > 0 else flags[1]]
+
+        else:
+            values = ["Not present in structure model"] * 2 + ["N/A"] * 3 + ["Not present in structure model"] * 2 + ["N/A"] * 2
+
+        logPrint("debug", residue + " | " + " | ".join(values))
+        writer.writerow([residue] + values)
+    addPhase("write", start_time)
+
+    return    # DONE
+
+##################################################################################################################################################################
+#|  SASA METHOD: (context=ensemble) writes each residue's SASA statistics over all models: mean, standard deviation, minimum, maximum, mean relative SASA, and the   |#
+#|  fraction of models in which the residue is exposed (relative SASA above the threshold), for the whole residue and then for its sidechain                       |#
+##################################################################################################################################################################
+def find_Ensemble_resi(seq, chain, residues, writer):   # residues is the Dictionary from `shrakeRupley.ensembleTable()`
+
+    logPrint("debug", "Start of chain is position " + next(iter(residues), "N/A") + " and this sequence of length " + str(len(seq)) + " is:\n" + seq + "\n\n")
+    start_time = time.time()
+
+    for currposition, attributes in residues.items():
+        currRes = attributes["resn"]
+        residue = "" + AA_attributes[currRes][0] + currposition
+
+        # same presence rule as `find_Allchain_resi()`, applied to the first model
+        if attributes["atoms"] != 1:
+            values = []
+            for part, maxSASA in ((0, AA_attributes[currRes][2]), (1, AA_attributes[currRes][1])):
+                values += [attributes["mean"][part], attributes["sd"][part], attributes["min"][part], attributes["max"][part], attributes["mean"][part] / maxSASA, attributes["exposed"][part]]
+            values = [str(value) for value in values]
+
+        else:
+            values = (["Not present in structure model"] + ["N/A"] * 5) * 2
+
+        logPrint("debug", residue + " | " + " | ".join(values))
+        writer.writerow([residue] + values)
+    addPhase("write", start_time)
+
+    return    # DONE
+
+#####################################################################################################################################
+## Helper Methods: the checkpoint of an unfinished output file. `<outname>.ckpt` sits next to `<outname>.part` and records the job's ##
+## parameters, the chains already written (with their residue counts) and the size of the `.part` file after the last of them.      ##
+#####################################################################################################################################
+def readCheckpoint(outname, signature):
+
+    # a checkpoint is only used when both files exist and it was written by a job with the same parameters; anything else starts the job over
+    if not (os.path.exists(outname + '.ckpt') and os.path.exists(outname + '.part')):
+        return None
+    try:
+        with open(outname + '.ckpt') as file:
+            checkpoint = json.load(file)
+    except ValueError:
+        return None
+    if checkpoint.get("signature") != signature or os.path.getsize(outname + '.part') < checkpoint["size"]:
+        return None
+
+    return checkpoint
+
+def writeCheckpoint(outname, checkpoint, file):
+
+    # the rows must be on disk before the checkpoint that counts them; the checkpoint itself is replaced atomically (write-then-rename)
+    file.flush()
+    os.fsync(file.fileno())
+    checkpoint["size"] = file.tell()
+    with open(outname + '.ckpt.tmp', 'w') as ckpt:
+        json.dump(checkpoint, ckpt)
+    os.replace(outname + '.ckpt.tmp', outname + '.ckpt')
+
+#######################################################################################################################################
+## Helper Methods: start the current job's metrics, and emit them as one `METRICS {...}` JSON line (also appended to `metrics=<file>`) ##
+#######################################################################################################################################
+def startMetrics(query, depth, engine, context):
+
+    jobMetrics.clear()
+    jobMetrics.update({"query": query, "depth": depth, "engine": engine, "context": context, "status": "done", "atoms": 0, "chains": 0, "residues": 0,
+                       "phases": {phase: 0.0 for phase in metric_phases}, "start": time.time(), "cpu": time.process_time()})
+
+def writeMetrics(metrics_file=None):
+
+    jobMetrics["seconds"] = round(time.time() - jobMetrics.pop("start"), 3)
+    jobMetrics["cpu_seconds"] = round(time.process_time() - jobMetrics.pop("cpu"), 3)
+    jobMetrics["phases"] = {phase: round(seconds, 3) for phase, seconds in jobMetrics["phases"].items()}
+
+    # `ru_maxrss` is in kilobytes on Linux (the Condor execute nodes). NOTE in a batchSASA.py worker it is the peak of every job that worker has run so far.
+    jobMetrics["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1) if resource is not None else None
+
+    # printed at every log level, so each Condor `.out` file holds its job's metrics
+    line = json.dumps(jobMetrics, sort_keys=True)
+    print("METRICS " + line)
+    if metrics_file:
+        with open(metrics_file, "a") as file:
+            file.write(line + "\n")
+    jobMetrics.clear()
+
 ####################################################################################################################################################################
-#|  WRITER METHOD: Uses a List `stored_residues` populated with `resi` values for all selection-expressions; `resi` retrieves the PSE residue position as shown.  |#
+#|  WRITER METHOD: Builds a residue table for each unique chain's selection-expression; `resi` retrieves the PSE residue position as shown.                      |#
 ####################################################################################################################################################################
-def GO(query, header, requested, selexpression, stored_residues, mode, depth="ALL"):
+def GO(query, header, requested, mode, depth="ALL", sasa_pass="structure", engine="pymol", use_cache=True, use_results=True, context="complex", low_memory=False, adaptive=None, metrics_file=None, ligands=None, content=None, skip=()):
 
     ## Job description
-    print("Query: ", query,"\nResidue(s) requested:", depth)
+    logPrint("info", "Query: ", query,"\nResidue(s) requested:", depth)
 
-    ## "Stopwatch" starts now
-    start_time = time.time()
+    # retained ligands (`ligands=`) occlude the surface but are never written as residue rows
+    if ligands:
+        requested += " and not het"
 
-    with open('SASA_' + query + '_' + depth + '.csv', 'w', newline = '') as file: # write output values into csv row by row, vals in separate columns
+    ## "Stopwatch" starts now; each phase of the job is also timed on its own (see `addPhase()`)
+    start_time = time.time()
+    startMetrics(query, depth, engine, context)
+
+    # the output is written under a temporary name and renamed only once it is finished, so an existing `SASA_*.csv` file is always a complete result
+    outname = parseQuery(query, depth, context)[3]
+
+    # RESULT CACHE: an unchanged structure with unchanged settings has already been calculated; copy out the stored table instead of recalculating it
+    key = structure_hash = None
+    if use_results and resultCache is not None:
+        key, structure_hash, settings = getResultKey(query, mode, depth, sasa_pass, engine, use_cache, context, adaptive, ligands, content, skip)
+        cached = resultCache.lookup(key) if key is not None else None
+        if cached is not None:
+            writeCachedResult(cached, query, outname)
+            logPrint("info", "\nResult cache hit (key " + key[:12] + "); no SASA calculations were needed.\n\nOutput file: " + outname + " was saved in the working directory: " + os.getcwd())
+            jobMetrics["status"] = "cached"
+            writeMetrics(metrics_file)
+            return
+
+    # CHECKPOINT: a job that was stopped partway (ex. evicted from a Condor node) resumes after the last chain it finished; see `readCheckpoint()`.
+    # The structure's content hash is part of the signature, so a changed file under the same name starts over instead of resuming from stale rows.
+    if structure_hash is None:
+        structure_hash = structureHash(query, mode, use_cache, content)
+    signature = [query, depth, sasa_pass, engine, context, adaptive is not None, structure_hash] + (ligands or []) + (["skip"] + sorted(skip) if skip else [])
+    checkpoint = readCheckpoint(outname, signature)
+    if checkpoint is not None:
+        os.truncate(outname + '.part', checkpoint["size"])   # drops any rows of the chain that was interrupted
+        logPrint("info", "Resuming from checkpoint; chains already finished:", list(checkpoint["chains"]))
+        jobMetrics["status"] = "resumed"
+
+    with open(outname + '.part', 'a' if checkpoint is not None else 'w', newline = '') as file: # write output values into csv row by row, vals in separate columns
         # create a .csv file writer object                                                                         
         writer = csv.writer(file, delimiter = ',')
     
         # Begin writing into the csv output file with a master header describing the job
-        writer.writerow(header)
+        if checkpoint is None:
+            phase_time = time.time()
+            writer.writerow(header)
+            checkpoint = {"signature": signature, "chains": {}}
+            writeCheckpoint(outname, checkpoint, file)
+            addPhase("write", phase_time)
+
+        # chains finished before a restart, and chains left out with `skip=`, still occlude the others but are not calculated again
+        finished = list(checkpoint["chains"]) + [chain for chain in skip if chain not in checkpoint["chains"]]
+
+        # context=ensemble: every model of the file is calculated, one at a time, by either engine; the per-residue statistics are then split into per-chain tables
+        if context == "ensemble":
+            chainPlusFasta, stats = ensembleSASA(query, mode, engine, use_cache, content)
+
+        # NumPy engine: read the structure and calculate every atom's SASA without PyMOL; tables are then built per chain from the per-atom areas
+        elif engine == "numpy":
+            structure, areas, radii, grid = loadNumpyStructure(query, mode, use_cache, adaptive["coarse"] if adaptive is not None else None, ligands, content, finished)
+            phase_time = time.time()
+            if adaptive is not None:
+                # density=adaptive: every residue that needs it is recalculated at full density in one call, reusing the coarse pass's neighbor index
+                marked = set()
+                for chain in (chain for chain in shrakeRupley.getChains(structure) if str(chain) not in finished):
+                    for resi, attributes in shrakeRupley.residueTable(structure, areas, chain, None if depth == "ALL" else set(depth.split("-"))).items():
+                        if needsRefinement(attributes, adaptive):
+                            marked.add((chain, resi))
+                logPrint("info", "Adaptive density: refining", len(marked), "residues at dot_density", shrakeRupley.dot_density)
+                areas = shrakeRupley.refineSASA(structure, areas, radii, marked, shrakeRupley.probe_radius, shrakeRupley.dot_density, grid)
+            if context == "interface":
+                # each chain's isolated surface reuses the parsed coordinates, the complex's areas and its neighbor index; only interface atoms are recalculated
+                isolated = shrakeRupley.isolatedSASA(structure, areas, radii, shrakeRupley.probe_radius, shrakeRupley.dot_density, grid)
+            elif context == "ligand":
+                # context=ligand: only atoms touching a retained ligand are recalculated without it (apo); the tables are then built from the protein atoms alone
+                ligand = shrakeRupley.ligandMask(structure, ligands)
+                logPrint("info", "Ligand atoms kept in the structure:", int(ligand.sum()))
+                isolated = shrakeRupley.apoSASA(structure, areas, radii, ligand, shrakeRupley.probe_radius, shrakeRupley.dot_density, grid)[~ligand]
+                structure, areas = shrakeRupley.subset(structure, ~ligand), areas[~ligand]
+            phase_time = addPhase("surface", phase_time)
+
+            chainPlusFasta = {}
+            for chain in shrakeRupley.getChains(structure):
+                fasta = getNumpyFasta(structure, chain)
+                if fasta not in chainPlusFasta.values():
+                    chainPlusFasta.update({chain:fasta})
+            addPhase("chains", phase_time)
 
-        # start with a fresh pymol session
-        cmd.reinitialize()
-
-        # SASA settings
-        cmd.set('dot_solvent', 1)  ## 1 is for solvent surface area. 0 is for total molecular surface area [default]
-        cmd.set('dot_density', 4)  ## 1-4; defines quality (accuracy) of the calculation, better=more CPU
-
-        # Import structure, then remove unwanted (non-amino acid, or "het") objects. #FIXME this may remove biochemically important groups from proteins (ex, the `CHO` fluorophore in GFP; see 2B3P, resi #65-67 for details)
-        if mode == "fetch":
-            cmd.fetch(query)
-            print("Downloaded query ID: " + query)
         else:
-            cmd.load(query)
-            print("Loaded query file: " + query)
-
-        # TODO convert this into a remove-het helper method for parsing user-requested hets that should remain in the structure while SASA analysis is happening.
-        # TODO example hets worth keeping: AMPPNP or AMPPCP in AHA2 or SERCA
-        cmd.remove("het")
-    
-        # detect all chains present in the file and get the full fasta string sequence for each unique chain; remove the first line (unwanted header), then the whitespace,
-        # leaving only the AA single-letter characters in the string.
-        chainID_list = []     # List for recording chain ID's
-        chainPlusFasta = {}   # Dictionary for matching the current retrieved chain ID with its associated fasta
-
-        # Build a list of all chains in the structure file
-        for chain in cmd.get_chains():
-            fasta = cmd.get_fastastr("Chain " + str(chain)) # gets the associated fasta with each chain ID     
-            fasta = fasta.split("\n",1)[1]   # removes the first line from the /n delimited fasta string
-            fasta = re.sub("\n", "", fasta)  # removes remaining /n
-            chainID_list.append(chain)       # Records chain IDs. TODO Important to have this in addition to `chainPlusFasta{}` for when all chains present are called. 
-
-            # Build a dictionary containing the chain ID and its associated (unique) fasta sequence. When the current value of 'fasta' is unique,
-            # it is added as the value and its associated chain ID (value of 'chain') is its key.
-            # NOTE that this is not always the correct way to look at surface area - a biological unit may actually be multimeric vs. just being a crystallization artifact.
-            # TODO need to implement more code to deal with this? Should keep all the chains by default, leave user to specify that unique chains are desired.
-
-            # NOTE FIXME NOTE FIXME a simple implementation would be to 1) add another parameter that this method accepts, with a default value if not specified
-            # and 2) to have this value passed here, and checked in an if-then branch that builds in the `if fasta not in ...` statement. This branch is taken if unique chains
-            # are desired. 3) Finally, the alternative branch is all chains that are present. 4) Yet another branch may specify that chains are done either in isolation,
-            # or in complex. The value in this type of calculation would be in comparing protein components in a complex before and after they adopt a multimeric or complex configuration.
-            # NOTE FIXME NOTE FIXME if additional conditions are in consideration, switch statements may be preferable to/faster than multiple if-then-else branches.
-
-            if fasta not in chainPlusFasta.values():
-                chainPlusFasta.update({chain:fasta})
+            # PyMOL engine: Method call to `loadPymolStructure()`: a fresh session with the query loaded, het atoms removed, and (in single-pass mode) per-atom SASA in the b-factors
+            chainPlusFasta = loadPymolStructure(query, mode, sasa_pass, use_cache, low_memory, adaptive["coarse"] if adaptive is not None else None, ligands, content, finished)
+        jobMetrics["chains"] = len(chainPlusFasta)
 
         # Begin writing into the csv output file. For a multichain protein containing unique chains, this writes each chain to the same file separated by subheaders.
         for keyVal in chainPlusFasta:
 
+            if str(keyVal) in checkpoint["chains"]:
+                logPrint("info", "Chain " + str(keyVal) + " was finished before the restart; skipping it.")
+                continue
+            if str(keyVal) in skip:
+                logPrint("info", "Chain " + str(keyVal) + " is left out of the output (`skip=`).")
+                continue
+
             # Write the subheader. Subheaders are labeled by chain number and updated with each iteration
             writer.writerow("")
             subheader = ["Residue", "Total SASA", "Total Relative SASA", "Total: Exposed or Buried?", "Sidechain SASA", "Sidechain Relative SASA", "Sidechain: Exposed or Buried?", "PDB ID: " + query, "Chain " + str(keyVal) + " FASTA:", chainPlusFasta[keyVal]]
+            if context == "interface":
+                subheader = ["Residue", "Complex SASA", "Isolated SASA", "Interface Buried SASA", "Complex Relative SASA", "Isolated Relative SASA",
+                             "Complex Sidechain SASA", "Isolated Sidechain SASA", "Interface Buried Sidechain SASA", "Interface?"] + subheader[-3:]
+            if context == "ligand":
+                subheader = ["Residue", "Holo SASA", "Apo SASA", "Ligand Buried SASA", "Holo Relative SASA", "Apo Relative SASA",
+                             "Holo Sidechain SASA", "Apo Sidechain SASA", "Ligand Buried Sidechain SASA", "Ligand Contact?"] + subheader[-3:]
+            if context == "ensemble":
+                subheader = ["Residue", "Mean SASA", "SD SASA", "Min SASA", "Max SASA", "Mean Relative SASA", "Exposed Fraction",
+                             "Sidechain Mean SASA", "Sidechain SD SASA", "Sidechain Min SASA", "Sidechain Max SASA", "Sidechain Mean Relative SASA", "Sidechain Exposed Fraction",
+                             "Models: " + str(stats["models"])] + subheader[-3:]
+            if adaptive is not None:
+                subheader.insert(7, "Dot Density")
             writer.writerow(subheader)
 
-            # update the selection-expression string for iterating `resi`
-            selexpression = "" + "chain " + str(keyVal) + requested
-            print("Requesting next set of `resi` with selexpression =`" + selexpression + "`")  ## DEBUG
-            print("Set `stored_residues` should be empty for this iteration before method call; `stored_residues` contains:",stored_residues)  ## DEBUG
-
-            # Method call to `extractResCode()`: generate the List of `resi` based on `selexpression`'s value
-            resPositions = extractResCode(selexpression, stored_residues)
-
-            # Method call to `find_Allchain_resi()`: get and print the SASA values for each requested residue.
-            find_Allchain_resi(chainPlusFasta[keyVal], keyVal, resPositions, writer)  # the sorted list of indices `resPositions[]` is passed to the counting method
+            if context == "ensemble":
+                phase_time = time.time()
+                residues = shrakeRupley.ensembleTable(stats, keyVal, None if depth == "ALL" else set(depth.split("-")))
+                addPhase("indexing", phase_time)
+                find_Ensemble_resi(chainPlusFasta[keyVal], keyVal, residues, writer)
+
+            elif engine == "numpy":
+                # the NumPy engine always has the per-atom SASA of the whole structure, so its residue table already holds every residue's totals
+                phase_time = time.time()
+                residues = shrakeRupley.residueTable(structure, areas, keyVal, None if depth == "ALL" else set(depth.split("-")))
+                if adaptive is not None:
+                    for resi, attributes in residues.items():
+                        attributes["density"] = shrakeRupley.dot_density if (keyVal, resi) in marked else adaptive["coarse"]
+                if context in ("interface", "ligand"):
+                    isolatedResidues = shrakeRupley.residueTable(structure, isolated, keyVal, None if depth == "ALL" else set(depth.split("-")))
+                addPhase("indexing", phase_time)
+
+                if context == "interface":
+                    find_Interface_resi(chainPlusFasta[keyVal], keyVal, residues, isolatedResidues, writer)
+                elif context == "ligand":
+                    find_Interface_resi(chainPlusFasta[keyVal], keyVal, residues, isolatedResidues, writer, ("Ligand contact", "No contact"))
+                else:
+                    find_Allchain_resi(chainPlusFasta[keyVal], keyVal, residues, writer, "structure")
+
+            else:
+                # update the selection-expression string for building this chain's residue table
+                selexpression = "" + "chain " + str(keyVal) + requested
+                logPrint("debug", "Requesting next residue table with selexpression =`" + selexpression + "`")
+
+                # Method call to `buildResidueTable()`: one iterate pass collects position, `resn`, atom counts, occupancy and (in single-pass mode) SASA for every residue
+                if low_memory:
+                    residues = buildWindowTable(keyVal, requested)
+                else:
+                    residues = buildResidueTable(selexpression)
+                if adaptive is not None:
+                    residues = refineResidueTable(keyVal, residues, requested, adaptive)
+
+                # context=interface: the b-factors hold the complex's per-atom SASA; the same chain is then calculated on its own, one chain at a time
+                if context == "interface":
+                    find_Interface_resi(chainPlusFasta[keyVal], keyVal, residues, buildIsolatedTable(keyVal, requested), writer)
+                # context=ligand: the b-factors hold the per-atom SASA with the retained ligands (holo); residues they touch are recalculated without them (apo)
+                elif context == "ligand":
+                    find_Interface_resi(chainPlusFasta[keyVal], keyVal, residues, buildApoTable(keyVal, residues, requested), writer, ("Ligand contact", "No contact"))
+                else:
+                    # Method call to `find_Allchain_resi()`: get and print the SASA values for each requested residue.
+                    find_Allchain_resi(chainPlusFasta[keyVal], keyVal, residues, writer, sasa_pass)
+
+            # every finished chain is pushed to disk right away and recorded in the checkpoint, so a long job never holds more than one chain's rows in memory
+            # and a restarted job never repeats a finished chain
+            phase_time = time.time()
+            checkpoint["chains"][str(keyVal)] = len(residues)
+            writeCheckpoint(outname, checkpoint, file)
+            addPhase("write", phase_time)
+
+    phase_time = time.time()
+    os.replace(outname + '.part', outname)
+    os.remove(outname + '.ckpt')
+    addPhase("write", phase_time)
+    jobMetrics["residues"] = sum(checkpoint["chains"].values())
+
+    if key is not None:
+        resultCache.store(key, outname, query, structure_hash, settings)
 
     ## "Stopwatch" stops now; print runtime
     stop_time = time.time()
-    print("\nTime (seconds) taken for SASA calculations: " + str(stop_time - start_time) + "\n\nOutput file: " + "SASA_" + query + "_" + depth + ".csv was saved in the working directory: " + os.getcwd())
+    logPrint("info", "\nTime (seconds) taken for SASA calculations: " + str(stop_time - start_time) + "\n\nOutput file: " + outname + " was saved in the working directory: " + os.getcwd())
+    writeMetrics(metrics_file)
 
     return    # DONE
 
-#######################################################################################################################################################
-##~~~~~~~~~~~~~~~~ ___DRIVER CODE (VROOM VROOM!)___~~~~~~~~~~~~~~~~##  (MAIN method; calls all others. Writes to the csv file with each method call).
+##################################################################################################################################################
+## Helper Method: normalize a query and its depth the way a job does, and return the name of the output file that job writes                    ##
+##################################################################################################################################################
+def parseQuery(query, depth="ALL", context="complex"):
 
-# BEGIN ~ ~ ~
-header = ["SOLVENT ACCESSIBLE SURFACE AREAS OF TARGET PROTEOME"]
-requested = "" ## NOTE the `requested` variable stores the `selexpression` string's extension which affects which `resi` are iterated.
-selexpression = ""
+    # check whether user is fetching a protein by its PDB ID or if the user wants to load an existing molecule file instead.
+    if "." in query:   #NOTE greedy for all file extensions - refine later
+        mode = "load"
+    else:
+        mode = "fetch"
+        query = query.upper()
+
+    # a comma-separated list of residue codes (ex. `K,D,E` or `LYS,ASP,GLU`) is a single job. Single-letter codes are written to the output filename as the 3-letter code,
+    # repeated codes are dropped, and the codes are joined with "-" (ex. `SASA_4H1W_LYS-ASP-GLU.csv`). Unknown codes are kept as typed, so `runQuery()` can report them.
+    codes = []
+    for code in depth.upper().split(","):
+        code = AA_letterCode.get(code.strip(), code.strip())
+        if code not in codes:
+            codes.append(code)
+    depth = "-".join(codes)
+
+    # interface and ligand tables have different columns, so they are written to their own file (ex. `SASA_4H1W_ALL_ligand.csv`)
+    suffix = "_" + context if context in ("interface", "ligand", "ensemble") else ""
+
+    return query, mode, depth, 'SASA_' + query + '_' + depth + suffix + '.csv'
+
+##################################################################################################################################################
+## Helper Method: the output files a job leaves in the working directory: its output file, or one file per residue type when `split=1`          ##
+##################################################################################################################################################
+def outputFiles(query, depth="ALL", options={}):
+
+    context = options.get("context", "complex").lower()
+    query, mode, depth, outname = parseQuery(query, depth, context)
+    if options.get("split", "0") == "1" and depth != "ALL":
+        return [parseQuery(query, code, context)[3] for code in depth.split("-")]
+
+    return [outname]
+
+##################################################################################################################################################
+## Helper Method: (store=FILE) move a finished job's output files into the SQLite result store; returns where the job's results were saved       ##
+##################################################################################################################################################
+def finishOutput(query, depth, options={}):
+
+    # STORE: `store=<file>` (ex. `store=SASA_results.db`) appends the job's residues to one SQLite file instead of leaving a csv file per structure;
+    # `python resultStore.py export <job>` writes any stored job back out as the usual csv file.
+    if "store" not in options:
+        return ", ".join(outputFiles(query, depth, options))
+
+    for outname in outputFiles(query, depth, options):
+        job, count = resultStore.importCSV(outname, options["store"])
+        os.remove(outname)
+        logPrint("info", "Stored " + str(count) + " residues of " + job + " in " + options["store"])
+
+    return options["store"]
+
+##################################################################################################################################################
+## Helper Method: whether a job has already finished: all of its output files exist, or (with `store=`) all of them were stored                 ##
+##################################################################################################################################################
+def jobFinished(query, depth="ALL", options={}):
+
+    if "store" in options:
+        if resultStore is None:
+            return False    # `runQuery()` reports the missing module
+        return all(resultStore.hasJob(outname[:-len(".csv")], options["store"]) for outname in outputFiles(query, depth, options))
+
+    return all(os.path.exists(outname) for outname in outputFiles(query, depth, options))
+
+##################################################################################################################################################
+## Helper Method: (split=1) divide a finished multi-residue output file into one file per residue type, in the same format as single-type jobs  ##
+##################################################################################################################################################
+def splitOutput(outname, query, depth, context="complex"):
+
+    # a single residue type is already written under the name its split file would have; splitting it would replace the file and then remove it
+    codes = depth.split("-")
+    if len(codes) == 1:
+        return
+
+    with open(outname, newline = '') as file:
+        rows = list(csv.reader(file))
+
+    for code in codes:
+        splitname = parseQuery(query, code, context)[3]
+        with open(splitname + '.part', 'w', newline = '') as file:
+            writer = csv.writer(file, delimiter = ',')
+            writer.writerow(rows[0])                 # master header
+            for row in rows[1:]:
+                # blank rows and chain subheaders go to every file; residue rows (labeled like `K123`) only to the file of their type
+                if not row or row[0] == "Residue" or row[0][0] == AA_attributes[code][0]:
+                    writer.writerow(row)
+        os.replace(splitname + '.part', splitname)
+        logPrint("info", "Output file: " + splitname + " was split from " + outname)
+
+    os.remove(outname)
+
+#############################################################################################################################################
+## JOB METHOD: validate one job's parameters and run it; used by the driver code below and by batch runners that import this script     ##
+#############################################################################################################################################
+def runQuery(query, depth="ALL", options={}, content=None):
+
+    global log_level
+
+    # CONTEXT: "complex" (default) calculates every chain's SASA in the context of the whole structure. "interface" also calculates each chain on its own
+    # (from the same structure load) and writes the surface each residue buries in the interface; see `find_Interface_resi()`.
+    # "ligand" keeps the hets listed in `ligands=` (3-letter het codes, ex. `ligands=ANP,MG`) and writes each residue's SASA with them (holo), without them (apo),
+    # and the surface the ligands bury; both come from one structure load, and only residues within reach of a ligand are recalculated for the apo values.
+    # "ensemble" calculates every model of a multi-model file (NMR models, MD frames written as MODEL records or mmCIF model numbers) and writes each residue's
+    # mean, standard deviation, minimum and maximum SASA and the fraction of models in which it is exposed; see `ensembleSASA()`. Other contexts use the first model.
+    context = options.get("context", "complex").lower()
+    ligands = sorted(set(code.strip().upper() for code in options["ligands"].split(",") if code.strip())) if options.get("ligands") else None
+
+    query, mode, depth, outname = parseQuery(query, depth, context)
+
+    # PASS: how many surface calculations PyMOL performs per job. "structure" (default) computes the SASA of every atom once, loads the values into the b-factor
+    # column, and then sums whole-residue and sidechain totals in python. "residue" is the original behavior: two `cmd.get_area()` calls for every residue.
+    # Both write the same output file; "residue" is kept for checking results against older jobs.
+    sasa_pass = options.get("pass", "structure").lower()
+
+    # ENGINE: which program calculates the surface. "pymol" (default whenever PyMOL is installed) uses `cmd.get_area()`. "numpy" uses the PyMOL-independent
+    # Shrake-Rupley engine in shrakeRupley.py, which matches PyMOL's dot_solvent=1, dot_density=4 areas to within about 1 square Angstrom per residue.
+    engine = options.get("engine", "pymol" if cmd is not None else "numpy").lower()
+
+    # CACHE: fetched PDB IDs are read from (and saved to) the local structure cache in structureCache.py, so a rerun never downloads the same structure twice.
+    # `cache=0` always downloads with `cmd.fetch()` instead, as older versions of this script did.
+    use_cache = options.get("cache", "1") != "0"
+
+    # RESULTS: finished tables are stored in the result cache in resultCache.py and reused when the same structure is run again with the same settings.
+    # `results=0` always recalculates (and does not store the new table).
+    use_results = options.get("results", "1") != "0"
+
+    # MEMORY: "normal" (default) calculates the surface of the whole assembly at once. "low" calculates one chain at a time on a window holding only that chain
+    # and the nearby atoms of other chains (same values), for entries too large for the memory requested in the Condor submit file. The entry is read as text and
+    # never loaded into PyMOL whole, so low-memory jobs need a PDB or mmCIF structure, NumPy (for the window search) and structureArchive.py (for the first model).
+    # NOTE the NumPy engine already works through the structure one grid cell at a time, so it needs no low-memory mode and ignores this option.
+    low_memory = options.get("memory", "normal").lower() == "low"
+
+    # DENSITY: "fixed" (default) calculates every atom at dot_density 4. "adaptive" first calculates the whole structure at a coarse density (`coarse=`, default 2),
+    # then recalculates at dot_density 4 only the residues whose whole-residue or sidechain relative SASA is within `band=` (default 0.05) of the burial threshold,
+    # plus every residue of the types listed in `refine=` (ex. `refine=K,D,E`). The coarse density's error is below 0.04 relative SASA, so the Exposed/Buried calls
+    # match the fixed mode; a "Dot Density" column records which density produced each row.
+    # NOTE the NumPy engine recalculates only the refined residues' atoms (about 3x faster on a typical monomer). PyMOL always calculates whole objects, so its
+    # refinement recalculates a window around the refined residues instead; that saves time only when they cover a small part of a large structure.
+    adaptive = None
+    if options.get("density", "fixed").lower() == "adaptive":
+        adaptive = {"coarse": options.get("coarse", "2"), "band": options.get("band", "0.05"),
+                    "refine": set(parseQuery(query, options["refine"])[2].split("-")) if options.get("refine") else set()}
+        try:
+            adaptive["coarse"], adaptive["band"] = int(adaptive["coarse"]), float(adaptive["band"])
+        except ValueError:
+            pass    # left as typed; reported with the other job parameters below
+
+    # LOG: how much this job prints (`log=quiet|info|debug`; see `log_levels`). METRICS: every job prints one `METRICS {...}` line with its per-phase timings,
+    # atom/chain/residue counts and peak memory; `metrics=<file>` also appends that line (without the prefix) to a file shared by a whole run.
+    log = options.get("log", default_log_level).lower()
+    log_level = log if log in log_levels else default_log_level
+    metrics_file = options.get("metrics")
+
+    # SKIP: chains (`skip=B,C`) that are left out of the output. They still occlude the other chains, but are not calculated; chainDedup.py uses this to calculate
+    # only the chains of an entry that no earlier entry of a list has, and writes the skipped chains from the earlier entries' tables.
+    skip = [chain.strip() for chain in options["skip"].split(",") if chain.strip()] if options.get("skip") else []
+
+    header = ["SOLVENT ACCESSIBLE SURFACE AREAS OF TARGET PROTEOME"]
+    requested = "" ## NOTE the `requested` variable stores the `selexpression` string's extension which affects which `resi` are iterated.
+
+    # check user's requested job parameters
+    if sasa_pass not in ("structure", "residue"):
+        # error - the pass option only has two valid values
+        err1 = "#   ATTN user! Check your batch file: `pass=" + sasa_pass + "` must be either `pass=structure` or `pass=residue`.   #"
+
+    elif options.get("memory", "normal").lower() not in ("normal", "low") or (low_memory and sasa_pass != "structure"):
+        # error - unknown memory mode; the chain windows are single-pass calculations
+        err1 = "#   ATTN user! Check your batch file: `memory=" + options.get("memory") + "` must be either `memory=normal` or `memory=low` (with `pass=structure`).   #"
+
+    elif low_memory and engine == "pymol" and (shrakeRupley is None or structureArchive is None or (mode == "load" and not structureArchive.isStructure(query))):
+        # error - the chain windows are cut from the structure's text (see `readChainWindows()`)
+        err1 = "#   ATTN user! `memory=low` needs NumPy, structureArchive.py and a PDB or mmCIF structure (.pdb, .cif, .ent or .mmcif, optionally gzipped).   #"
+
+    elif adaptive is not None and (not isinstance(adaptive["coarse"], int) or not isinstance(adaptive["band"], float) or not adaptive["band"] >= 0
+                                   or not all(code in AA_letterCode.values() for code in adaptive["refine"])):
+        # error - the adaptive density's settings must be numbers, and its refined residue types valid residue codes
+        err1 = "#   ATTN user! Check your batch file: `density=adaptive` needs `coarse=` 0-3, `band=` of at least 0 and `refine=` residue codes (ex. `coarse=2 band=0.05 refine=K,D`).   #"
+
+    elif options.get("density", "fixed").lower() not in ("fixed", "adaptive") or (adaptive is not None and (sasa_pass != "structure" or low_memory or context != "complex" or not 0 <= adaptive["coarse"] < dot_density)):
+        # error - unknown density mode; the adaptive refinement works on the single-pass, whole-structure, complex-context calculation only
+        err1 = "#   ATTN user! Check your batch file: `density=" + options.get("density") + "` must be `density=fixed` or `density=adaptive` (with `pass=structure`, `memory=normal`, `context=complex` and `coarse=` 0-3).   #"
+
+    elif context not in ("complex", "interface", "ligand", "ensemble") or (context != "complex" and sasa_pass != "structure"):
+        # error - unknown context; the interface, ligand and ensemble calculations start from the per-atom SASA of the single-pass mode
+        err1 = "#   ATTN user! Check your batch file: `context=" + context + "` must be `context=complex`, `context=interface`, `context=ligand` or `context=ensemble` (with `pass=structure`).   #"
+
+    elif context == "ensemble" and (low_memory or shrakeRupley is None or structureArchive is None):
+        # error - the ensemble statistics are accumulated with NumPy, over whole-structure calculations of each model (read one at a time by structureArchive.py)
+        err1 = "#   ATTN user! Check your batch file: `context=ensemble` needs NumPy and structureArchive.py, and cannot be combined with `memory=low`.   #"
+
+    elif (context == "ligand") != (ligands is not None):
+        # error - the ligand context needs its list of hets to keep, and the list means nothing in any other context
+        err1 = "#   ATTN user! Check your batch file: `context=ligand` needs `ligands=` (ex. `ligands=ANP,MG`), and `ligands=` is only used with `context=ligand`.   #"
+
+    elif engine not in ("pymol", "numpy") or (engine == "pymol" and cmd is None) or (engine == "numpy" and shrakeRupley is None):
+        # error - unknown engine, or the requested engine cannot be imported
+        err1 = "#   ATTN user! Check your batch file: `engine=" + engine + "` must be `engine=pymol` (needs PyMOL) or `engine=numpy` (needs NumPy).   #"
+
+    elif log not in log_levels:
+        # error - unknown log level
+        err1 = "#   ATTN user! Check your batch file: `log=" + log + "` must be `log=quiet`, `log=info` or `log=debug`.   #"
+
+    elif "store" in options and context != "complex":
+        # error - the result store holds standard tables only
+        err1 = "#   ATTN user! Check your batch file: `store=` cannot be combined with `context=" + context + "`.   #"
+
+    elif "store" in options and resultStore is None:
+        # error - the result store module was not found next to this script (ex. not listed in the Condor submit file's transfer_input_files)
+        err1 = "#   ATTN user! Check your batch file: `store=` needs resultStore.py in the job's working directory (add it to transfer_input_files).   #"
+
+    elif depth == "ALL":
+        # call GO()
+        GO(query, header, requested, mode, depth, sasa_pass, engine, use_cache, use_results, context, low_memory, adaptive, metrics_file, ligands, content, skip)    # NOTE: an empty string extends `selexpression` when set to default: 'ALL'
+        return finishOutput(query, depth, options)
+
+    elif all(code in AA_letterCode.values() for code in depth.split("-")):
+        # call GO()
+        ## NOTE `parseQuery()` has already converted every requested code to its 3-letter code and joined them with "-"; all of them go into one selection
+        ## (ex. `resn LYS+ASP+GLU`), so every requested residue type comes from the same structure load and the same surface calculation.
+        requested = " and resn " + "+".join(depth.split("-"))           # NOTE: if `sys.argv[4]` is found to be valid, the request is run with the appropriate 3-letter code(s).
+        GO(query, header, requested, mode, depth, sasa_pass, engine, use_cache, use_results, context, low_memory, adaptive, metrics_file, ligands, content, skip)
+
+        # SPLIT: `split=1` writes one output file per residue type (named exactly like a single-type job's file) instead of one combined file
+        if options.get("split", "0") == "1":
+            splitOutput(outname, query, depth, context)
+        return finishOutput(query, depth, options)
 
-# check user's requested job parameters
-if depth == "ALL":
-    # call GO()
-    GO(query, header, requested, selexpression, stored_residues, mode)    # NOTE: an empty string extends `selexpression` when set to default: 'ALL'
+    else:
+        # error - user must enter appropriate <args>
+        err1 = "#   ATTN user! Check your batch file: `" + depth + "` is not a valid single or 3-letter residue code (or comma-separated list of codes).   #"
 
-elif depth in AA_letterCode.keys():
-    # call GO()
-    # TODO convert this case into a string-splitting process, where "," is the delimiter. This would avoid requiring a separate data structure by letting me stick with strings.
-    
-    # TODO this will need to be able to accept a string-as-list, where "," separates elements and each are bundled into a list type (even if only one code is requested)
-    # TODO then, the `requested=` needs to be modified to reflect the number of items requested when the number of aa codes > 1.
-    depth = AA_letterCode[depth]        ## NOTE currently this only works with 1 requested lettercode at a time; converting depth into a list that accepts all valid, unique instances of an amino acid and then getting their resi values (and sorting in order) will allow multiple aa requests in the same run.
-    requested = " and resn " + depth                                # NOTE: if `sys.argv[4]` is found to be valid, the request is run with the appropriate 3-letter code.
-    GO(query, header, requested, selexpression, stored_residues, mode, depth)
-
-else:
-    # error - user must enter appropriate <args>
-    err1 = "#   ATTN user! Check your batch file: `" + depth + "` is not a valid single or 3-letter residue code.   #"
     err2 = "#" * len(err1)
     print("\n\n",err2,"\n\n",err1,"\n\n",err2,"\n\n")
 
-## END ~ ~ ~
\ No newline at end of file
+    return None
+
+def isArchive(query):
+    # the test of `structureArchive.isArchive()`, repeated here so an archive source is still recognized (and reported) when structureArchive.py is missing
+    return os.path.isdir(query) or query.lower().endswith((".tar", ".tar.gz", ".tgz"))
+
+#############################################################################################################################################
+## JOB METHOD: run every structure file of a tar/tar.gz archive or directory as its own job, each streamed from memory (see structureArchive.py) ##
+#############################################################################################################################################
+def runArchive(source, depth="ALL", options={}):
+
+    if structureArchive is None:
+        err1 = "#   ATTN user! Check your batch file: `" + source + "` is an archive or directory, which needs structureArchive.py in the job's working directory (add it to transfer_input_files).   #"
+        err2 = "#" * len(err1)
+        print("\n\n",err2,"\n\n",err1,"\n\n",err2,"\n\n")
+        return None
+
+    # MEMBERS: `members=<glob>` (ex. `members=*.pdb.gz`) only runs the members whose file names match. Each member's output is named by its member name
+    # (ex. `SASA_AF-P19456-F1-model_v2.pdb_ALL.csv`; see `structureArchive.memberName()`), so rerunning the same archive skips every member that has already finished.
+    done = skipped = failed = 0
+    for name, content in structureArchive.iterMembers(source, options.get("members")):
+        if jobFinished(name, depth, options):
+            skipped += 1
+            continue
+
+        # one unreadable member must not stop the rest of the archive; an unfinished job keeps its `.part` and `.ckpt` files and resumes on the next run
+        try:
+            result = runQuery(name, depth, options, content)
+        except Exception as err:
+            print("Member " + name + " failed: " + type(err).__name__ + ": " + str(err))
+            failed += 1
+            continue
+        if result is None:
+            return None     # invalid job arguments; they are the same for every member, and `runQuery()` has already printed why
+        done += 1
+
+    logPrint("info", "\nArchive " + source + ": " + str(done) + " members done, " + str(skipped) + " already finished (skipped), " + str(failed) + " failed")
+    return done, skipped, failed
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE (VROOM VROOM!)___~~~~~~~~~~~~~~~~##  (MAIN method; calls all others. Writes to the csv file with each method call).
+## NOTE `pymol -c SASAquatch.py` runs this script with __name__ == "pymol"; importing it from another script (ex. batchSASA.py) skips the driver code.
+
+if __name__ in ("__main__", "pymol"):
+    # BEGIN ~ ~ ~
+    print("Number of arguments entered when running this instance of `SASAquatch.py`:", len(sys.argv)-1) # check number of arguments entered
+    print("WARNING 10/20/2022: cmd.load is now supported but on Condor those files need to be available, explicitly listed in the batch list file and then sent to the cluster.\n This means `BulkSubmit.sh needs to be updated to check for the load condition and to then copy the listed files over to the cluster with everything else.")
+
+    # NOTE This script must take arguments at [3] and [4] because the intrepreter argument "pymol", the "-c" flag, and the script name are being interpred by this script as initial arguments [0], [1], and [2].
+    # QUERY: assign PDB ID to the first argument in the list of possible arguments, uppercase it (arg is case insensitive), and typecast to string
+    #query = str(sys.argv[3].upper())           # TODO is the upper() method call necessary? Forces all queries to be case insensitive BUT if a file is being identified for cmd.load,
+                                                # TODO that is likely to be case-sensitive and may be causing the pdb file failures on the CHTC even though it works locally
+
+    # OPTIONS: any argument written as `key=value` (ex. `pass=residue`) is an optional job setting, not a positional argument. These are collected into a
+    # Dictionary first and then removed from the argument list, so that the query and depth arguments keep their usual positions.
+    options = dict(arg.split("=", 1) for arg in sys.argv if "=" in arg)
+    args = [arg for arg in sys.argv if "=" not in arg]
+
+    # The script's own name is at [2] when run as `pymol -c SASAquatch.py`, but at [0] when run as `python SASAquatch.py` (possible with `engine=numpy`);
+    # the query and depth always follow it. The first argument ending in ".py" is the script, since structure files never have that extension.
+    scriptPos = next(i for i, arg in enumerate(args) if arg.endswith(".py"))
+    args = ["pymol", "-c"] + args[scriptPos:]
+
+    query = str(args[3])                        # TODO testing query without uppercasing                                        
+
+    # DEPTH: assign query type ('ALL' as default, unless a 4th argument is explicitly entered: an amino acid single letter code or 3-letter code).
+    # checking first for another argument must be done before attempting to assign it; else a nonexistent argument will make the script close instead.
+    if len(args)-1 == 4:
+        depth = str(args[4].upper())            # TODO is the upper() method call necessary? Forces all queries to be case insensitive BUT if a file is being identified for cmd.load,
+                                                # TODO that is likely to be case-sensitive and may be causing the pdb file failures on the CHTC even though it works locally
+
+    else:
+        depth = "ALL"
+
+    # a tar/tar.gz archive or a directory of structure files runs every structure in it, streamed without extracting anything to disk
+    if isArchive(query):
+        runArchive(query, depth, options)
+    else:
+        runQuery(query, depth, options)
+
+    ## END ~ ~ ~
@@ -0,0 +1,222 @@
+## Run SASAquatch.py over a whole list file of PDB IDs (or structure files) on one multi-core machine, instead of submitting one Condor job per line.
+
+## NOTE This reads the same list files as BulkSubmit.sh: one job per line, written exactly like that job's arguments (ex. `4H1W`, `4H1W K`, `4H1W K,D,E split=1`, `5KSDon4H1W.pdb`).
+## NOTE Jobs are handed to a fixed pool of worker processes. Each worker imports SASAquatch.py (and PyMOL) once and then only reinitializes its PyMOL session
+## between structures, so PyMOL is not cold-started for every job. Output files are the same `SASA_<query>_<depth>.csv` files SASAquatch.py writes, saved in the
+## working directory, and each job's console output is saved to `output/SASA_<query>_<depth>.out` like the Condor output files.
+
+## NOTE Restarting the same list skips every job whose output csv already exists. SASAquatch.py only renames its output to `SASA_*.csv` once the file is finished,
+## so an existing csv is always a complete result; jobs that failed or timed out are run again, resuming after the last chain they finished.
+
+## USAGE: $ python batchSASA.py <listfile> [workers=N] [timeout=SECONDS] [recycle=N] [dedup=1] [any SASAquatch.py option, ex. engine=numpy]
+##   workers  number of worker processes (default: every CPU core)
+##   timeout  seconds a single structure may run before its worker is killed (and replaced) and the job is logged as timed out (default: no limit)
+##   recycle  replace each worker process after it has run this many structures, to return memory to the system (default: never)
+##   dedup    1 = fingerprint every chain of the list first, calculate each chain-in-context once, and write the chains already calculated for other entries from
+##            their tables (see chainDedup.py); the plan, the jobs left to calculate and the per-chain report (with conformer flags) are saved as chainDedup.py saves them
+
+import collections        # methods for the queue of jobs waiting for a worker
+import contextlib         # methods for redirecting a job's console output into its log file
+import multiprocessing    # methods for the worker processes
+import multiprocessing.connection # methods for waiting on several workers at once
+import os                 # methods for directory handling
+import sys                # methods for taking command line arguments
+import time               # methods for tracking efficiency of the code (CPU time)
+
+# Options read by this script; every other `key=value` argument is passed through to SASAquatch.py's `runQuery()`.
+batch_options = ("workers", "timeout", "recycle", "dedup")
+
+##############################################################################################################################
+## Helper Method: split a list file into jobs of (query, depth, options), using the same argument rules as SASAquatch.py   ##
+##############################################################################################################################
+def readJobs(listfile, options={}):
+
+    jobs = []
+    with open(listfile) as file:
+        for line in file:
+            tokens = line.split()
+            if not tokens or tokens[0].startswith("#"):
+                continue
+
+            # `key=value` tokens on a line override the options given on the command line, for that line only
+            jobOptions = dict(options)
+            jobOptions.update(dict(token.split("=", 1) for token in tokens if "=" in token))
+            positional = [token for token in tokens if "=" not in token]
+            depth = positional[1].upper() if len(positional) > 1 else "ALL"
+            jobs.append((positional[0], depth, jobOptions))
+
+    return jobs
+
+##############################################################################################################################
+## WORKER METHOD: the loop of one worker process; runs every job the parent sends over `conn`, until it is sent None       ##
+##############################################################################################################################
+def workerLoop(conn):
+
+    # importing SASAquatch here means PyMOL is started once per worker, not once per structure; the module is kept in this process for every later job
+    global SASAquatch
+    import SASAquatch
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        conn.send(runJob(job))
+
+##############################################################################################################################
+## WORKER METHOD: run one structure in a worker process; returns (query, depth, status, seconds, message)                  ##
+##############################################################################################################################
+def runJob(job):
+
+    query, depth, options = job
+    query, mode, fullDepth, outname = SASAquatch.parseQuery(query, depth, options.get("context", "complex").lower())
+    start_time = time.time()
+
+    os.makedirs("output", exist_ok=True)
+    logname = os.path.join("output", outname[:-len(".csv")] + ".out")
+
+    try:
+        with open(logname, "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            result = SASAquatch.runQuery(query, depth, options)
+        status, message = ("done", result) if result is not None else ("failed", "invalid job arguments; see " + logname)
+
+    except Exception as err:
+        status, message = "failed", type(err).__name__ + ": " + str(err)
+
+    # an unfinished job leaves its partial output (`.part`) and checkpoint (`.ckpt`) behind; they are kept, so rerunning the list resumes after the last finished chain
+    return query, fullDepth, status, time.time() - start_time, message
+
+def jobLabel(job):
+    # (query, depth) of a job as its worker would have reported them, for a job whose worker never reported back
+    import SASAquatch as parser
+    return tuple(parser.parseQuery(job[0], job[1])[0:3:2])
+
+#####################################################################################################################################
+## Helper Methods: start a worker process (a "slot" holds the process, its end of the pipe, its current job and the jobs it ran),  ##
+## and stop one, politely or by killing it                                                                                          ##
+#####################################################################################################################################
+def startWorker(context):
+
+    conn, workerConn = context.Pipe()
+    process = context.Process(target=workerLoop, args=(workerConn,), daemon=True)
+    process.start()
+    workerConn.close()
+    return {"process": process, "conn": conn, "job": None, "start": None, "runs": 0}
+
+def stopWorker(slot, kill=False):
+
+    if kill:
+        slot["process"].kill()
+    else:
+        try:
+            slot["conn"].send(None)
+        except OSError:
+            pass    # the worker is already gone
+    slot["process"].join()
+    slot["conn"].close()
+
+##############################################################################################################################
+## BATCH METHOD: run every unfinished job in a list file on a pool of worker processes; returns a List of job results      ##
+##############################################################################################################################
+def runBatch(listfile, options={}, workers=None, timeout=None, recycle=None, dedup=False):
+
+    import SASAquatch as parser     # only `jobFinished()` is needed here, to find each job's output files (or stored results)
+
+    # DEDUP: chains that appear (with the same surroundings) in earlier entries are not calculated again; they are written from those entries' tables at the end
+    listed = readJobs(listfile, options)
+    plan = None
+    if dedup:
+        import chainDedup
+        plan = chainDedup.planDedup(listed)
+        chainDedup.writePlan(plan, listfile)
+        listed = [tuple(job) for job in plan["run"]]
+        conformers = [row for row in plan["report"] if row[5] == "conformer"]
+        print("Dedup: entries reused from other entries' chains:", sum(1 for entry in plan["fanout"] if not entry.get("partial")),
+              "| entries run for their new chains only:", sum(1 for entry in plan["fanout"] if entry.get("partial")), "| chains flagged as conformers:", len(conformers))
+        for query, depth, chain, length, fingerprint, status, note in conformers:
+            print("  conformer:", query + ":" + chain, "has the sequence of", note, "in other coordinates or surroundings")
+        print("Dedup plan saved to", chainDedup.default_plan, "and report to", chainDedup.default_report)
+
+    jobs = []
+    skipped = 0
+    for query, depth, jobOptions in listed:
+        if parser.jobFinished(query, depth, jobOptions):
+            skipped += 1
+            continue
+        jobs.append((query, depth, jobOptions))
+
+    workers = workers or os.cpu_count()
+    print("Jobs in list file:", len(jobs) + skipped, "| already complete (skipped):", skipped, "| to run:", len(jobs), "| workers:", workers)
+
+    # "spawn" starts every worker as a clean process, so no PyMOL state is shared with (or copied from) this parent process.
+    # NOTE the timeout is enforced from here: PyMOL's and NumPy's calculations run in C and cannot be interrupted from inside the worker, so a worker that
+    # overruns its structure is killed and replaced (its job's `.part` and `.ckpt` files are kept, as for any unfinished job).
+    results = []
+    context = multiprocessing.get_context("spawn")
+    slots = [startWorker(context) for worker in range(min(workers, len(jobs)))]
+    pending = collections.deque(jobs)
+    while pending or any(slot["job"] is not None for slot in slots):
+        for slot in slots:
+            if slot["job"] is None and pending:
+                if recycle and slot["runs"] >= recycle:
+                    stopWorker(slot)     # returns the worker's memory to the system
+                    slot.update(startWorker(context))
+                slot["job"], slot["start"] = pending.popleft(), time.time()
+                slot["conn"].send(slot["job"])
+
+        busy = [slot for slot in slots if slot["job"] is not None]
+        wait = max(0.0, min(slot["start"] + timeout for slot in busy) - time.time()) if timeout else None
+        ready = multiprocessing.connection.wait([slot["conn"] for slot in busy], wait)
+
+        for slot in busy:
+            if slot["conn"] in ready:
+                try:
+                    result = slot["conn"].recv()
+                except EOFError:
+                    # the worker process died (ex. PyMOL crashed on this structure)
+                    result = jobLabel(slot["job"]) + ("failed", time.time() - slot["start"], "worker process exited with code " + str(slot["process"].exitcode))
+                    stopWorker(slot, kill=True)
+                    slot.update(startWorker(context))
+            elif timeout and time.time() - slot["start"] >= timeout:
+                result = jobLabel(slot["job"]) + ("timeout", time.time() - slot["start"], "stopped after " + str(timeout) + " seconds")
+                stopWorker(slot, kill=True)
+                slot.update(startWorker(context))
+            else:
+                continue
+
+            slot["job"] = None
+            slot["runs"] += 1
+            results.append(result)
+            query, depth, status, seconds, message = result
+            print("[" + str(len(results)) + "/" + str(len(jobs)) + "]", query, depth, status, "(" + str(round(seconds, 1)) + " s)", message)
+
+    for slot in slots:
+        stopWorker(slot)
+
+    if plan is not None:
+        written, failed = chainDedup.runFanout(plan)
+        print("Dedup: reused entries written:", written)
+        for entry in failed:
+            results.append((entry["query"], entry["depth"], "failed", 0.0, "its chains' source tables are missing; run it again without dedup=1"))
+
+    return results
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("No list file has been specified; usage: python batchSASA.py <listfile> [workers=N] [timeout=SECONDS] [recycle=N] [SASAquatch.py options]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    workers = int(options.pop("workers")) if "workers" in options else None
+    timeout = float(options.pop("timeout")) if "timeout" in options else None
+    recycle = int(options.pop("recycle")) if "recycle" in options else None
+    dedup = options.pop("dedup", "0") == "1"
+
+    start_time = time.time()
+    results = runBatch(sys.argv[1], options, workers, timeout, recycle, dedup)
+
+    failed = [result for result in results if result[2] != "done"]
+    print("\nTime (seconds) taken for batch: " + str(time.time() - start_time) + "\nCompleted:", len(results) - len(failed), "| Failed or timed out:", len(failed))
+    for query, depth, status, seconds, message in failed:
+        print("  ", query, depth, status, message)
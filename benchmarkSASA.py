@@ -0,0 +1,226 @@
+## Benchmark suite for SASAquatch.py: runs each engine/mode on the bundled structures and on synthetic multi-chain assemblies, and compares against a saved baseline.
+
+## NOTE Every case runs in its own fresh python process, so its peak memory (RSS) is measured on its own and no PyMOL state carries over between cases.
+## Each case reports:
+##   wall        seconds for the whole job (structure load, surface calculation, output file)
+##   rss_mb      peak resident memory of the process, in MB
+##   res_per_s   residue rows written per second
+##   sel_per_res PyMOL selections (cmd.* calls that evaluate a selection expression) issued per residue row; 0 for the NumPy engine
+## NOTE Synthetic assemblies (`asm2`, `asm4`) are copies of 5KSDon4H1W.pdb packed side by side as chains A, B, ... so that each copy touches its neighbors
+## (closest atoms 3.5 Angstroms apart) without any atoms overlapping.
+## NOTE Every case is run `repeats` times (default 3) and its wall time and peak RSS are the medians of those runs, for the baseline and for the check alike.
+## NOTE Regression check: with an existing baseline file, the suite fails (exit code 1) when any case is slower or uses more memory than its baseline by more than
+## `tolerance` (default 0.25, i.e. 25%), issues more selections per residue than before, crashes, or is in the baseline but has no result. `save=1` writes the
+## new results as the baseline instead (and also fails when a case crashed, since its result cannot be saved).
+## NOTE The baseline (`benchmark_baseline.json` next to this script) is not part of the repository: wall time and memory depend on the machine, the PyMOL build
+## and the NumPy version, so a baseline is only comparable on the machine that wrote it. The first run on a machine writes it; run `save=1` on a known-good
+## commit to reset it, then compare later commits against it on the same machine.
+
+## USAGE: $ python benchmarkSASA.py [cases=5KSDon3BA6,asm2] [modes=pymol,numpy] [baseline=benchmark_baseline.json] [tolerance=0.25] [repeats=3] [save=1]
+##   modes: pymol (pass=structure), pymol-residue (pass=residue; very slow), pymol-lowmem (memory=low), pymol-adaptive, numpy, numpy-adaptive
+
+import json               # methods for the baseline file and for passing results between processes
+import numpy              # methods for spacing the copies of a synthetic assembly
+import os                 # methods for directory handling
+import resource           # methods for peak memory (RSS) of a process
+import shutil             # methods for cleaning up the scratch directory
+import statistics         # methods for the median of a case's repeats
+import subprocess         # methods for running each case in a fresh process
+import sys                # methods for taking command line arguments
+import tempfile           # methods for the scratch directory
+import time               # methods for tracking efficiency of the code (CPU time)
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+# bundled structures, and synthetic assemblies of N copies of 5KSDon4H1W.pdb
+structures = {"5KSDon3BA6": "5KSDon3BA6.pdb", "5KSDon4H1W": "5KSDon4H1W.pdb", "AF-P19456": "AF-P19456-F1-model_v2.pdb", "asm2": 2, "asm4": 4}
+
+# SASAquatch.py options for each mode; results=0 and cache=0 so that every case really calculates
+modes = {"pymol": {"engine": "pymol"}, "pymol-residue": {"engine": "pymol", "pass": "residue"}, "pymol-lowmem": {"engine": "pymol", "memory": "low"},
+         "pymol-adaptive": {"engine": "pymol", "density": "adaptive"}, "numpy": {"engine": "numpy"}, "numpy-adaptive": {"engine": "numpy", "density": "adaptive"}}
+default_modes = ["pymol", "pymol-lowmem", "pymol-adaptive", "numpy", "numpy-adaptive"]
+
+# PyMOL commands that evaluate a selection expression every time they are called
+selection_commands = ("get_area", "iterate", "count_atoms", "index", "select", "create", "remove", "get_fastastr", "get_chains", "alter")
+
+######################################################################################################################################
+## Helper Method: write a synthetic assembly of `copies` copies of 5KSDon4H1W.pdb, one chain each, packed in a row along the x-axis so  ##
+## that neighbors are in contact (closest atoms `contact` Angstroms apart) without overlapping                                          ##
+######################################################################################################################################
+def writeAssembly(copies, filename, contact=3.5):
+
+    with open(os.path.join(repo_dir, "5KSDon4H1W.pdb")) as file:
+        atoms = [line for line in file if line.startswith("ATOM")]
+    coords = numpy.array([[float(line[30:38]), float(line[38:46]), float(line[46:54])] for line in atoms])
+
+    # the shortest step along x at which no atom of a copy comes closer than `contact` Angstroms to an atom of the copy before it: the copies do not
+    # interpenetrate, but their facing atoms touch across the gap, so every pair of neighbors has an interface (like the chains of a real assembly).
+    # An atom pair that is `yz` apart across the x-axis needs the pair `sqrt(contact^2 - yz^2)` apart along x
+    step = 0.0
+    for start in range(0, len(coords), 100):
+        block = coords[start:start + 100]
+        yz = ((block[:, None, 1:] - coords[None, :, 1:]) ** 2).sum(axis=2)
+        near = yz < contact ** 2
+        if near.any():
+            gaps = block[:, None, 0] - coords[None, :, 0] + numpy.sqrt(numpy.where(near, contact ** 2 - yz, 0.0))
+            step = max(step, float(gaps[near].max()))
+
+    with open(filename, "w") as file:
+        for copy in range(copies):
+            chain = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[copy]
+            for line in atoms:
+                x = float(line[30:38]) + copy * step
+                file.write(line[:21] + chain + line[22:30] + "%8.3f" % x + line[38:])
+            file.write("TER\n")
+        file.write("END\n")
+
+##########################################################################################################################
+## CASE METHOD: run one structure in one mode inside this process; returns the case's measurements as a Dictionary     ##
+##########################################################################################################################
+def runCase(filename, mode):
+
+    sys.path.insert(0, repo_dir)
+    import contextlib
+    import io
+    import SASAquatch
+
+    # count selections by wrapping every selection-evaluating PyMOL command SASAquatch.py calls
+    selections = [0]
+    if SASAquatch.cmd is not None:
+        for name in selection_commands:
+            original = getattr(SASAquatch.cmd, name)
+            def counted(*args, _original=original, **kwargs):
+                selections[0] += 1
+                return _original(*args, **kwargs)
+            setattr(SASAquatch.cmd, name, counted)
+
+    options = dict(modes[mode], results="0", cache="0")
+    start_time = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        outname = SASAquatch.runQuery(filename, "ALL", options)
+    wall = time.time() - start_time
+
+    # residue rows: everything in the output except the master header, blank rows and chain subheaders
+    with open(outname) as file:
+        residues = sum(1 for line in file if line.strip() and "," in line and not line.startswith("Residue,"))
+
+    return {"wall": wall, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, "residues": residues,
+            "res_per_s": residues / wall if wall else 0.0, "sel_per_res": selections[0] / residues if residues else 0.0}
+
+##########################################################################################################################
+## SUITE METHOD: run every (structure, mode) case `repeats` times, each in a fresh process; returns Dictionaries of     ##
+## "structure/mode" -> median results and of "structure/mode" -> the last error line of every case that crashed         ##
+##########################################################################################################################
+def runSuite(cases, caseModes, repeats=3):
+
+    scratch = tempfile.mkdtemp(prefix="benchmarkSASA_")
+    results, failed = {}, {}
+    try:
+        for case in cases:
+            if isinstance(structures[case], int):
+                filename = os.path.join(scratch, case + ".pdb")
+                writeAssembly(structures[case], filename)
+            else:
+                filename = os.path.join(scratch, structures[case])
+                shutil.copyfile(os.path.join(repo_dir, structures[case]), filename)
+
+            for mode in caseModes:
+                runs = []
+                for repeat in range(repeats):
+                    child = subprocess.run([sys.executable, os.path.abspath(__file__), "case", os.path.basename(filename), mode], cwd=scratch, capture_output=True, text=True)
+                    if child.returncode != 0:
+                        failed[case + "/" + mode] = (child.stderr.strip().splitlines() or ["exit code " + str(child.returncode)])[-1]
+                        print(case + "/" + mode, "FAILED:", failed[case + "/" + mode])
+                        break
+                    runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+                else:
+                    results[case + "/" + mode] = medianResult(runs)
+                    print(printRow(case + "/" + mode, results[case + "/" + mode]))
+    finally:
+        shutil.rmtree(scratch)
+
+    return results, failed
+
+##########################################################################################################################
+## Helper Method: one result from the repeats of a case: the median wall time and peak RSS, so one slow or noisy run   ##
+## (disk cache, a busy machine) neither sets nor fails the baseline                                                     ##
+##########################################################################################################################
+def medianResult(runs):
+
+    result = dict(runs[0])
+    result["wall"] = statistics.median(run["wall"] for run in runs)
+    result["rss_mb"] = statistics.median(run["rss_mb"] for run in runs)
+    result["res_per_s"] = result["residues"] / result["wall"] if result["wall"] else 0.0
+    result["repeats"] = len(runs)
+    return result
+
+def printRow(name, result):
+    return "%-28s %9.2f s %9.1f MB %10.1f res/s %8.2f sel/res" % (name, result["wall"], result["rss_mb"], result["res_per_s"], result["sel_per_res"])
+
+##########################################################################################################################
+## CHECK METHOD: compare results with a baseline; returns a List of regression messages (empty when nothing regressed).   ##
+## `expected` are the cases that were run; a crashed case, or one of them that is in the baseline without a result, is a regression ##
+##########################################################################################################################
+def checkRegressions(results, baseline, tolerance=0.25, failed={}, expected=()):
+
+    regressions = [name + ": crashed (" + error + ")" for name, error in failed.items()]
+    regressions += [name + ": no result (baseline has one)" for name in expected if name in baseline and name not in results and name not in failed]
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result["wall"] > base["wall"] * (1 + tolerance):
+            regressions.append(name + ": wall time " + str(round(result["wall"], 2)) + " s vs. baseline " + str(round(base["wall"], 2)) + " s")
+        if result["rss_mb"] > base["rss_mb"] * (1 + tolerance):
+            regressions.append(name + ": peak RSS " + str(round(result["rss_mb"], 1)) + " MB vs. baseline " + str(round(base["rss_mb"], 1)) + " MB")
+        if result["sel_per_res"] > base["sel_per_res"] + 1e-9:
+            regressions.append(name + ": selections per residue " + str(round(result["sel_per_res"], 3)) + " vs. baseline " + str(round(base["sel_per_res"], 3)))
+
+    return regressions
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+
+    # child process: run a single case and print its results as one line of JSON
+    if len(sys.argv) == 4 and sys.argv[1] == "case":
+        print(json.dumps(runCase(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    cases = options["cases"].split(",") if "cases" in options else list(structures)
+    caseModes = options["modes"].split(",") if "modes" in options else default_modes
+    baselineFile = options.get("baseline", os.path.join(repo_dir, "benchmark_baseline.json"))
+    tolerance = float(options.get("tolerance", 0.25))
+
+    unknown = [case for case in cases if case not in structures] + [mode for mode in caseModes if mode not in modes]
+    if unknown:
+        print("Unknown case(s) or mode(s):", ", ".join(unknown), "\nCases:", ", ".join(structures), "\nModes:", ", ".join(modes))
+        sys.exit(2)
+
+    results, failed = runSuite(cases, caseModes, int(options.get("repeats", 3)))
+
+    if options.get("save", "0") == "1" or not os.path.exists(baselineFile):
+        # keep the results of cases that were not rerun this time
+        baseline = {}
+        if os.path.exists(baselineFile):
+            with open(baselineFile) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(baselineFile, "w") as file:
+            json.dump(baseline, file, indent=1, sort_keys=True)
+        print("\nBaseline saved to", baselineFile)
+        if failed:
+            print("\nCRASHED (not saved):", ", ".join(failed))
+            sys.exit(1)
+        sys.exit(0)
+
+    with open(baselineFile) as file:
+        regressions = checkRegressions(results, json.load(file), tolerance, failed, [case + "/" + mode for case in cases for mode in caseModes])
+    if regressions:
+        print("\nREGRESSIONS (tolerance " + str(round(tolerance * 100)) + "%):")
+        for message in regressions:
+            print("  ", message)
+        sys.exit(1)
+
+    print("\nNo regressions against", baselineFile, "(tolerance " + str(round(tolerance * 100)) + "%)")
@@ -0,0 +1,276 @@
+## Redundancy-aware scheduling for a list of PDB IDs (or structure files): every unique chain-in-context is calculated once, and its residue table is reused by
+## every other entry of the list that holds the same chain in the same surroundings.
+
+## NOTE SASAquatch.py already writes only the first chain of each unique sequence within one entry (`chainPlusFasta`). This pre-pass reads every structure of a list
+## (through the structure cache) and fingerprints each chain that entry would write:
+##   sequence      the chain's fasta sequence, read by the job's engine: for `engine=pymol` the structure is loaded into PyMOL, whose chain order and fasta
+##                 (guide atoms only) can differ from the NumPy reader's, so the plan skips and relabels exactly the chains the job writes
+##   coordinates   every atom of the chain (resi, resn, atom name, position), plus every atom of other chains close enough to change its surface (element, position).
+##                 For `engine=numpy`, positions are taken relative to the chain's first atom, so the same coordinates translated as a whole give the same fingerprint
+##                 (and the same areas). PyMOL calculates in single precision, so a translated copy can differ by a few hundredths of a square Angstrom; for
+##                 `engine=pymol` only identical coordinates are reused.
+## An entry whose chains all have fingerprints of chains calculated earlier in the list is not run: its output file is written from the tables of those chains
+## ("fan-out"), relabeled with its own query, chain IDs and header. An entry with only some such chains is run with `skip=` set to them, so only its new chains
+## are calculated (the skipped chains still occlude them); its output file is then rewritten with the skipped chains' tables filled in, in the job's chain order.
+## The chains an entry calculates become reusable for the entries after it.
+## NOTE A chain with the same sequence as an earlier chain but a different fingerprint (another conformation, other neighbors, other numbering) is still calculated
+## and is flagged "conformer" in the report, with the earlier chain it was compared to.
+## NOTE Only `context=complex` jobs without `store=` are deduplicated (entries are compared only with jobs of the same depth and options); every other job, and every
+## entry whose structure cannot be read, is simply run.
+
+## USAGE: $ python chainDedup.py plan <listfile> [plan=dedup_plan.json] [report=dedup_report.csv] [SASAquatch.py options]   # writes <listfile>_unique.txt to submit
+##        $ python chainDedup.py fanout [plan=dedup_plan.json]     # after the unique jobs have finished (ex. Results/ gathered from Condor), write the reused entries
+##        $ python batchSASA.py <listfile> dedup=1 [options]       # both steps around a batch run
+
+import csv                # methods for handling csv file i/o
+import hashlib            # methods for the chain fingerprints
+import json               # methods for reading and writing the plan file
+import os                 # methods for directory handling
+import sys                # methods for taking command line arguments
+import numpy as np        # vectorized rounding of coordinates
+import SASAquatch         # job naming, output files, structure lookup and fasta sequences, exactly as the jobs themselves use them
+import shrakeRupley       # structure reader and contact detection (NumPy; PyMOL is only needed to plan engine=pymol jobs)
+import batchSASA          # list file parsing (same argument rules as BulkSubmit.sh)
+
+default_plan = "dedup_plan.json"
+default_report = "dedup_report.csv"
+
+###########################################################################################################################################
+## Helper Method: (engine=pymol) the chains an entry's job would write, with their fasta sequences, read by PyMOL from the structure file ##
+## exactly as the job reads them (PyMOL's chain order, and sequences from its guide atoms)                                              ##
+###########################################################################################################################################
+def pymolChains(filename):
+
+    if SASAquatch.cmd is None:
+        raise RuntimeError("PyMOL is needed to read the chains of an engine=pymol job")
+
+    SASAquatch.cmd.delete("all")
+    try:
+        SASAquatch.cmd.load(filename)
+        SASAquatch.removeHets()
+        return SASAquatch.getPymolChains()
+    finally:
+        SASAquatch.cmd.delete("all")
+
+###########################################################################################################################################
+## Helper Method: fingerprint every chain an entry's job would write; returns a List of (chain, fasta, fingerprint) in the job's order ##
+###########################################################################################################################################
+def chainFingerprints(structure, engine="pymol", sequences=None):
+
+    radii = shrakeRupley.getRadii(structure)
+    grid = shrakeRupley.getGrid(structure["coords"], radii)
+
+    # the chains the job writes and their sequences: for `engine=pymol`, as PyMOL read them (`pymolChains()`); otherwise as the NumPy engine reads them, in file order
+    if sequences is None:
+        sequences = {}
+        for chain in shrakeRupley.getChains(structure):
+            fasta = SASAquatch.getNumpyFasta(structure, chain)
+            if fasta not in sequences.values():
+                sequences[chain] = fasta    # same rule as `chainPlusFasta` in SASAquatch.py: only the first chain of each sequence is written
+
+    fingerprints = []
+    for chain, fasta in sequences.items():
+        inChain = structure["chain"] == chain
+        if not inChain.any():
+            raise KeyError("chain " + chain + " has no atoms in the structure file")
+
+        # the chain's surroundings are the atoms of other chains that touch it (the only ones that can bury part of its surface)
+        context = shrakeRupley.interfaceMask(structure, radii, grid=grid, labels=inChain) & ~inChain
+        origin = structure["coords"][inChain][0] if engine == "numpy" else np.zeros(3)
+        chainCoords = np.round(structure["coords"][inChain] - origin, 3) + 0.0       # (+ 0.0 turns -0.0 into 0.0)
+        contextCoords = np.round(structure["coords"][context] - origin, 3) + 0.0
+
+        digest = hashlib.sha256(fasta.encode())
+        for resi, resn, name, (x, y, z) in zip(structure["resi"][inChain], structure["resn"][inChain], structure["name"][inChain], chainCoords):
+            digest.update(("%s %s %s %.3f %.3f %.3f\n" % (resi, resn, name, x, y, z)).encode())
+        digest.update(b"context\n")
+        for line in sorted("%s %.3f %.3f %.3f\n" % (elem, x, y, z) for elem, (x, y, z) in zip(structure["elem"][context], contextCoords)):
+            digest.update(line.encode())
+        fingerprints.append((chain, fasta, digest.hexdigest()))
+
+    return fingerprints
+
+def groupKey(depth, options):
+    # entries are only compared with jobs that write the same residues with the same settings
+    return json.dumps([depth, sorted(options.items())])
+
+################################################################################################################################################
+## PLAN METHOD: fingerprint every entry of a list; returns the plan Dictionary: "run" (jobs to calculate), "fanout" (jobs written from other  ##
+## jobs' tables, with (chain, source query, source chain) for each of their chains) and "report" (one row per fingerprinted chain)            ##
+################################################################################################################################################
+def planDedup(jobs):
+
+    plan = {"run": [], "fanout": [], "report": []}
+    known = {}        # (group, fingerprint) -> (query, chain) of the first calculated chain with it
+    sequences = {}    # (group, fasta) -> (query, chain, fingerprint) of the first calculated chain with it
+
+    # the plan only prints errors; each structure is looked up exactly as its job would look it up (structure cache first)
+    log_level = SASAquatch.log_level
+    SASAquatch.log_level = "quiet"
+    for query, depth, options in jobs:
+        if options.get("context", "complex").lower() != "complex" or "store" in options or SASAquatch.isArchive(query):
+            plan["run"].append([query, depth, options])
+            continue
+
+        engine = options.get("engine", "pymol" if SASAquatch.cmd is not None else "numpy").lower()
+        try:
+            mode = SASAquatch.parseQuery(query, depth)[1]
+            filename = SASAquatch.getStructureFile(query, mode, options.get("cache", "1") != "0")
+            structure = shrakeRupley.readStructure(filename)
+            structure = shrakeRupley.subset(structure, ~structure["het"])
+            fingerprints = chainFingerprints(structure, engine, pymolChains(filename) if engine == "pymol" else None)
+        except Exception as err:
+            print("Could not fingerprint", query + ":", type(err).__name__, err, "(it will be run)")
+            plan["run"].append([query, depth, options])
+            continue
+
+        group = groupKey(depth, options)
+        sources = [known.get((group, fingerprint)) for chain, fasta, fingerprint in fingerprints]
+        reused = [chain for (chain, fasta, fingerprint), source in zip(fingerprints, sources) if source is not None]
+
+        for (chain, fasta, fingerprint), source in zip(fingerprints, sources):
+            if source is not None:
+                status, note = "reused", source[0] + ":" + source[1]
+            else:
+                status, note = "calculated", ""
+                earlier = sequences.get((group, fasta))
+                if earlier is not None and earlier[2] != fingerprint:
+                    status, note = "conformer", earlier[0] + ":" + earlier[1]   # same sequence, other coordinates or surroundings
+                known.setdefault((group, fingerprint), (query, chain))
+                sequences.setdefault((group, fasta), (query, chain, fingerprint))
+            plan["report"].append([query, depth, chain, len(fasta), fingerprint[:16], status, note])
+
+        # an entry with new chains is run for those chains alone; its own output file is the source of its new chains' tables
+        if len(reused) < len(fingerprints):
+            plan["run"].append([query, depth, dict(options, skip=",".join(reused)) if reused else options])
+        if reused:
+            plan["fanout"].append({"query": query, "depth": depth, "options": options, "partial": len(reused) < len(fingerprints),
+                                   "chains": [[chain, source[0], source[1]] if source is not None else [chain, query, chain] for (chain, fasta, fingerprint), source in zip(fingerprints, sources)]})
+    SASAquatch.log_level = log_level
+
+    return plan
+
+def writePlan(plan, listfile, planfile=default_plan, reportfile=default_report):
+
+    # the jobs left to calculate, one per line in the list file format (ready for BulkSubmit.sh or batchSASA.py)
+    uniquefile = os.path.splitext(listfile)[0] + "_unique.txt"
+    with open(uniquefile, "w") as file:
+        for query, depth, options in plan["run"]:
+            file.write(" ".join([query, depth] + [key + "=" + value for key, value in sorted(options.items())]) + "\n")
+
+    with open(planfile + ".tmp", "w") as file:
+        json.dump(plan, file, indent=1)
+    os.replace(planfile + ".tmp", planfile)
+
+    with open(reportfile, "w", newline = '') as file:
+        writer = csv.writer(file, delimiter = ',', lineterminator = '\n')
+        writer.writerow(["Query", "Depth", "Chain", "Sequence Length", "Fingerprint", "Status", "Source or Earlier Conformer"])
+        writer.writerows(plan["report"])
+
+    return uniquefile
+
+#############################################################################################################################
+## Helper Method: read a finished output csv into (master header, Dictionary of chain ID -> (subheader, residue rows))    ##
+#############################################################################################################################
+def readTables(outname):
+
+    with open(outname, newline = '') as file:
+        lines = list(csv.reader(file))
+
+    tables = {}
+    rows = None
+    for line in lines[1:]:
+        if not line:
+            continue
+        if line[0] == "Residue":
+            rows = []
+            tables[line[-2][len("Chain "):-len(" FASTA:")]] = (line, rows)
+        else:
+            rows.append(line)
+
+    return lines[0], tables
+
+#####################################################################################################################################
+## FAN-OUT METHOD: write the output files of one reused entry from the tables of the chains it shares; returns its output files  ##
+#####################################################################################################################################
+def writeFanout(entry):
+
+    query, depth, options = entry["query"], entry["depth"], entry["options"]
+    outnames = SASAquatch.outputFiles(query, depth, options)
+
+    # with `split=1`, the i-th output file of this entry is built from the i-th output file (same residue type) of each source
+    for position, outname in enumerate(outnames):
+        sources = {}
+        with open(outname + '.part', 'w', newline = '') as file:
+            writer = csv.writer(file, delimiter = ',')
+            for number, (chain, sourceQuery, sourceChain) in enumerate(entry["chains"]):
+                sourcename = SASAquatch.outputFiles(sourceQuery, depth, options)[position]
+                if sourcename not in sources:
+                    sources[sourcename] = readTables(sourcename)
+                header, tables = sources[sourcename]
+                subheader, rows = tables[sourceChain]
+
+                if number == 0:
+                    writer.writerow(header)
+                writer.writerow("")
+                writer.writerow(subheader[:-3] + ["PDB ID: " + SASAquatch.parseQuery(query, depth)[0], "Chain " + chain + " FASTA:", subheader[-1]])
+                writer.writerows(rows)
+        os.replace(outname + '.part', outname)
+
+    return outnames
+
+def runFanout(plan):
+
+    # entries whose sources did not finish are left for a normal run (listed in `<plan>_failed.txt` by the driver code). A partial entry's output file only holds its
+    # new chains until it is rewritten here, so it is rewritten every time (from the same tables), and left alone while its own `skip=` job is unfinished.
+    written, failed = 0, []
+    for entry in plan["fanout"]:
+        finished = SASAquatch.jobFinished(entry["query"], entry["depth"], entry["options"])
+        if finished and not entry.get("partial"):
+            continue
+        if entry.get("partial") and not finished:
+            print("Chains not reused yet for", entry["query"], entry["depth"] + ": its own job (skip=) has not finished")
+            continue
+        try:
+            writeFanout(entry)
+            written += 1
+        except (OSError, KeyError) as err:
+            for outname in SASAquatch.outputFiles(entry["query"], entry["depth"], entry["options"]):
+                if os.path.exists(outname + '.part'):
+                    os.remove(outname + '.part')
+            failed.append(entry)
+            print("Could not reuse chains for", entry["query"], entry["depth"] + ":", type(err).__name__, err)
+
+    return written, failed
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("plan", "fanout") or (sys.argv[1] == "plan" and len(sys.argv) < 3):
+        print("Usage: python chainDedup.py plan <listfile> [plan=FILE] [report=FILE] [SASAquatch.py options] | fanout [plan=FILE]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    planfile = options.pop("plan", default_plan)
+    reportfile = options.pop("report", default_report)
+
+    if sys.argv[1] == "plan":
+        plan = planDedup(batchSASA.readJobs(sys.argv[2], options))
+        uniquefile = writePlan(plan, sys.argv[2], planfile, reportfile)
+        conformers = sum(1 for row in plan["report"] if row[5] == "conformer")
+        reused = sum(1 for entry in plan["fanout"] if not entry.get("partial"))
+        print("Jobs:", len(plan["run"]) + reused, "| to calculate:", len(plan["run"]), "| of them for their new chains only (skip=):", len(plan["fanout"]) - reused,
+              "| reused from other entries:", reused, "| chains flagged as conformers:", conformers)
+        print("Jobs to calculate written to", uniquefile + "; plan saved to", planfile, "and report to", reportfile)
+
+    else:
+        with open(planfile) as file:
+            plan = json.load(file)
+        written, failed = runFanout(plan)
+        print("Reused entries written:", written, "| could not be written:", len(failed))
+        if failed:
+            failedfile = os.path.splitext(planfile)[0] + "_failed.txt"
+            with open(failedfile, "w") as file:
+                for entry in failed:
+                    file.write(" ".join([entry["query"], entry["depth"]] + [key + "=" + value for key, value in sorted(entry["options"].items())]) + "\n")
+            print("Run them as usual with the list file", failedfile)
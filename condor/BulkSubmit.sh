@@ -56,10 +56,12 @@ if [ $# -gt 0 ]; then
 	echo "#" >> SASA$d.sub
 	echo "#" >> SASA$d.sub
 	echo "# transfer_input_files = file1,/absolute/pathto/file2,etc" >> SASA$d.sub
-	echo "transfer_input_files = SASAquatch.py, http://proxy.chtc.wisc.edu/SQUID/chtc/python37.tar.gz" >> SASA$d.sub
+	echo "transfer_input_files = SASAquatch.py, resultStore.py, structureArchive.py, shrakeRupley.py, structureCache.py, resultCache.py, http://proxy.chtc.wisc.edu/SQUID/chtc/python37.tar.gz" >> SASA$d.sub
 	echo "request_cpus = 2" >> SASA$d.sub			# modified memory requests from original tutorial template
 	echo "request_memory = 2GB" >> SASA$d.sub		# new requests reflect the size of each job at time of execution
 	echo "request_disk = 300MB" >> SASA$d.sub
+	# NOTE `python aggregateMetrics.py files=output/*.out` suggests request_memory and request_cpus from the METRICS lines of a finished run
+	# NOTE `python planSubmit.py <listfile>` writes a submit file with requests sized to each structure instead, packing small structures several to a job
 
 	### EXTEND THE SUBMIT FILE BY ADDING QUERIES AND QEUE COMMANDS (FOR-LOOP HERE FOR REPEATEDLY WRITING QUERIES FROM A LIST TO THE SUBMIT FILE) ###
 	for line in $(cat $1); do
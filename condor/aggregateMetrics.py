@@ -0,0 +1,110 @@
+## Rolls up the `METRICS {...}` lines SASAquatch.py prints at the end of every job, across the whole output of a Condor run (or a batchSASA.py run),
+## to show which phase of a job dominates its runtime and to size the `request_memory` / `request_cpus` lines BulkSubmit.sh writes into the submit file.
+
+## NOTE Input is any mix of Condor `.out` files (only the lines starting with "METRICS " are read) and `metrics=<file>` files written by SASAquatch.py (one JSON
+## object per line). A job that was rerun (ex. resumed from its checkpoint) is counted once for every run. Jobs answered from the result cache ("cached") are
+## counted, but left out of the timing and memory statistics since they did not calculate anything.
+## NOTE Reported for each phase (load, het_removal, chains, indexing, surface, write): total seconds over every job, mean and 95th percentile per job, and the
+## phase's share of all phase time. Suggested requests:
+##   request_memory   the largest peak RSS of any job, times `headroom` (default 1.5), rounded up to the next 256 MB
+##   request_cpus     the 95th percentile of (CPU seconds / wall seconds) per job, rounded up; 1 means the jobs never kept a second core busy
+
+## USAGE: $ python aggregateMetrics.py [files=output/*.out,metrics.jsonl] [headroom=1.5] [csv=metrics_summary.csv]
+
+import csv                # methods for handling csv file i/o
+import glob               # methods for listing output files
+import json               # methods for reading the metrics lines
+import math               # methods for rounding up the suggested requests
+import sys                # methods for taking command line arguments
+
+phases = ("load", "het_removal", "chains", "indexing", "surface", "write")
+
+#######################################################################################################
+## Helper Method: every job's metrics from a list of glob patterns; returns a List of Dictionaries  ##
+#######################################################################################################
+def readMetrics(patterns):
+
+    jobs = []
+    for filename in sorted(set(name for pattern in patterns for name in glob.glob(pattern))):
+        with open(filename, errors = "replace") as file:
+            for line in file:
+                if line.startswith("METRICS "):
+                    line = line[len("METRICS "):]
+                elif not line.startswith("{"):
+                    continue
+                try:
+                    metrics = json.loads(line)
+                except ValueError:
+                    continue    # a line cut short by a job that was killed while printing it
+                if "phases" in metrics:
+                    jobs.append(metrics)
+
+    return jobs
+
+def percentile(values, fraction):
+    # nearest-rank percentile; 0 for an empty list
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)] if values else 0.0
+
+###############################################################################################################################
+## SUMMARY METHOD: per-phase statistics and suggested Condor requests; returns (rows of the phase table, suggestions Dictionary) ##
+###############################################################################################################################
+def summarizeMetrics(jobs, headroom=1.5):
+
+    calculated = [metrics for metrics in jobs if metrics.get("status") != "cached"]
+    phaseTotal = sum(sum(metrics["phases"].get(phase, 0.0) for phase in phases) for metrics in calculated)
+
+    rows = []
+    for phase in phases:
+        seconds = [metrics["phases"].get(phase, 0.0) for metrics in calculated]
+        rows.append([phase, round(sum(seconds), 3), round(sum(seconds) / len(seconds), 3) if seconds else 0.0, round(percentile(seconds, 0.95), 3),
+                     round(100 * sum(seconds) / phaseTotal, 1) if phaseTotal else 0.0])
+
+    rss = [metrics["peak_rss_mb"] for metrics in calculated if metrics.get("peak_rss_mb") is not None]
+    cpus = [metrics["cpu_seconds"] / metrics["seconds"] for metrics in calculated if metrics.get("seconds")]
+    suggestions = {"jobs": len(jobs), "cached": len(jobs) - len(calculated),
+                   "seconds_mean": round(sum(metrics["seconds"] for metrics in calculated) / len(calculated), 3) if calculated else 0.0,
+                   "seconds_p95": round(percentile([metrics["seconds"] for metrics in calculated], 0.95), 3),
+                   "rss_max_mb": max(rss, default=0.0), "rss_p95_mb": percentile(rss, 0.95),
+                   "request_memory_mb": 256 * math.ceil(max(rss, default=0.0) * headroom / 256) if rss else None,
+                   "request_cpus": max(1, math.ceil(percentile(cpus, 0.95))) if cpus else None}
+
+    return rows, suggestions
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    patterns = options.get("files", "output/*.out").split(",")
+
+    jobs = readMetrics(patterns)
+    if not jobs:
+        print("No METRICS lines found in", ", ".join(patterns))
+        sys.exit(1)
+    rows, suggestions = summarizeMetrics(jobs, float(options.get("headroom", 1.5)))
+
+    print("Jobs:", suggestions["jobs"], "| answered from the result cache:", suggestions["cached"],
+          "| seconds per job: mean", suggestions["seconds_mean"], "p95", suggestions["seconds_p95"])
+    print("\n%-12s %12s %10s %10s %8s" % ("Phase", "Total (s)", "Mean (s)", "p95 (s)", "Share"))
+    for phase, total, mean, p95, share in rows:
+        print("%-12s %12.1f %10.3f %10.3f %7.1f%%" % (phase, total, mean, p95, share))
+
+    # the jobs with the largest memory footprint are the ones a `request_memory` value has to cover
+    print("\nLargest peak RSS (MB):")
+    for metrics in sorted(jobs, key=lambda metrics: metrics.get("peak_rss_mb") or 0.0, reverse=True)[:5]:
+        print("  ", metrics["query"], metrics["depth"], metrics.get("peak_rss_mb"), "MB,", metrics["atoms"], "atoms,", metrics["chains"], "chains")
+
+    print("\nPeak RSS: max", suggestions["rss_max_mb"], "MB, p95", suggestions["rss_p95_mb"], "MB")
+    print("Suggested submit file requests (see BulkSubmit.sh):")
+    print("   request_memory =", str(suggestions["request_memory_mb"]) + "MB" if suggestions["request_memory_mb"] else "(no memory measurements)")
+    print("   request_cpus =", suggestions["request_cpus"] if suggestions["request_cpus"] else "(no timing measurements)")
+
+    if "csv" in options:
+        with open(options["csv"], "w", newline = '') as file:
+            writer = csv.writer(file, delimiter = ',', lineterminator = '\n')
+            writer.writerow(["Phase", "Total (seconds)", "Mean (seconds)", "p95 (seconds)", "Share (%)"])
+            writer.writerows(rows)
+            writer.writerow([])
+            for name, value in suggestions.items():
+                writer.writerow([name, value])
+        print("\nSummary written to", options["csv"])
@@ -0,0 +1,149 @@
+## Python version of analyzeResults.sh: checks every result file of a finished Condor run for signs of a botched job and writes the summary `eval_<date>.csv`.
+
+## NOTE Same checks, same order and same output columns as analyzeResults.sh:
+##   (1) Null:      the result file has no residue rows
+##   (2) SASA:      `exposed`% or less of the residues are rated exposed (default 10)
+##   (3) Occupancy: more than `missing`% of the residues have no modeled density ("N/A") (default 35)
+##   (4) Memory:    a result csv was left behind in the job directory, so the job did not finish on the queue
+## NOTE Each result file is read exactly once, and files are checked in parallel by a pool of worker processes. The percentages are rounded exactly as the shell
+## script rounded them (truncated to whole percents), so both scripts flag the same files. Time spent in each check is written below the summary.
+
+## USAGE: $ python analyzeResults.py [results=Results] [log=log] [leftover=/software/mrblackburn/pymol] [exposed=10] [missing=35] [workers=N] [outdir=evaluations]
+
+import csv                # methods for handling csv file i/o
+import glob               # methods for listing result files
+import itertools          # methods for flattening the rows of a result file
+import multiprocessing    # methods for checking files in parallel
+import numpy              # methods for counting residues over a whole result file at once
+import os                 # methods for directory handling
+import sys                # methods for taking command line arguments
+import time               # methods for the date stamp and per-check timings
+
+# Defaults match the `declare -i` values in analyzeResults.sh
+default_options = {"results": "Results", "log": "log", "leftover": "/software/mrblackburn/pymol", "exposed": "10", "missing": "35", "outdir": "evaluations"}
+
+#############################################################################################################################################
+## Helper Method: the job name of a result file (retrieves * from SASA_*_ALL, where * is only the PDB query ID), as analyzeResults.sh does ##
+#############################################################################################################################################
+def jobName(filename):
+    return os.path.basename(filename)[:-len(".csv")].replace("SASA_", "").replace("_ALL", "")
+
+#############################################################################################################################
+## Helper Method: read one result file once; returns (job name, residue rows, exposed rows, rows lacking density, seconds) ##
+#############################################################################################################################
+def countResidues(filename):
+
+    start_time = time.time()
+    with open(filename, newline = '') as file:
+        # the master header and blank rows are skipped here; chain subheaders ("Residue" rows) are dropped below
+        rows = [row for row in csv.reader(file) if len(row) >= 7]
+
+    # all fields of the file in one flat array, with the row each field came from (rows differ in width between contexts)
+    widths = numpy.fromiter(map(len, rows), dtype = int, count = len(rows))
+    fields = numpy.array(list(itertools.chain.from_iterable(rows)), dtype = str)
+    fieldRow = numpy.repeat(numpy.arange(len(rows)), widths)
+    residue = fields[numpy.cumsum(widths) - widths] != "Residue"
+
+    total = int(numpy.count_nonzero(residue))
+    exposed = numpy.unique(fieldRow[(fields == "Exposed") & residue[fieldRow]]).size
+    missing = numpy.unique(fieldRow[(fields == "N/A") & residue[fieldRow]]).size
+
+    return jobName(filename), total, exposed, missing, time.time() - start_time
+
+#############################################################################################################################
+## CHECK METHOD: checks (1)-(3) for one counted result file; returns the followup reason, or None when the file passes    ##
+#############################################################################################################################
+def checkResidues(total, exposed, missing, exposed_threshold, missing_threshold):
+
+    ## 1ST CHECK: is the current result file populated with data, or is it empty?
+    if total == 0:
+        return "(1) Null: gave an empty output file; possibly due to a density/occupancy stat error [check if this is an EM structure]"
+
+    # whole percents, truncated (the shell script's `bc` scale=2 division followed by `* 100`)
+    perc = exposed * 100 // total
+    percNA = missing * 100 // total
+
+    ## 2ND CHECK: does the current result file contain too many residues flagged "Buried"?
+    if perc <= exposed_threshold:
+        return "(2) SASA: residues rated exposed vs. total residues: " + str(exposed) + "/" + str(total) + " (" + str(perc) + "% of the protein)"
+
+    ## 3RD CHECK: does the file describe an unusual amount of missing electron density?
+    if percNA > missing_threshold:
+        return "(3) Occupancy: residues lacking modeled density in structure: " + str(missing) + "/" + str(total) + " (" + str(percNA) + "% of the protein)"
+
+    return None
+
+###############################################################################################################################
+## ANALYSIS METHOD: run every check over a results directory and write the evaluation file; returns the evaluation filename ##
+###############################################################################################################################
+def analyzeResults(options={}, workers=None):
+
+    settings = dict(default_options)
+    settings.update(options)
+    exposed_threshold = int(settings["exposed"])
+    missing_threshold = int(settings["missing"])
+    d = time.strftime("%Y-%m-%d")
+    print("Scanning output files for signs of edge cases (failure)...")
+
+    resultFiles = sorted(glob.glob(os.path.join(settings["results"], "*.csv")))
+    flagged = []
+    timings = {"(1)-(3) reading result files": 0.0, "(1)-(3) checks": 0.0, "(4) leftover csv files": 0.0}
+
+    # checks (1)-(3): count every file once, in parallel; the per-file reading time is summed across workers
+    with multiprocessing.Pool(processes=workers) as pool:
+        counts = pool.map(countResidues, resultFiles, chunksize=max(1, len(resultFiles) // (4 * (workers or os.cpu_count()))))
+
+    start_time = time.time()
+    for name, total, exposed, missing, seconds in counts:
+        timings["(1)-(3) reading result files"] += seconds
+        reason = checkResidues(total, exposed, missing, exposed_threshold, missing_threshold)
+        if reason is not None:
+            flagged.append((name, reason))
+    timings["(1)-(3) checks"] = time.time() - start_time
+
+    ## 4TH CHECK: record the PDB IDs which needed too much memory to finish on the queue (they are left behind after *csv collection)
+    start_time = time.time()
+    for filename in sorted(glob.glob(os.path.join(settings["leftover"], "*.csv"))):
+        flagged.append((jobName(filename), "(4) Memory: job failed to complete on queue [probable job size could be too large]"))
+    timings["(4) leftover csv files"] = time.time() - start_time
+
+    # the number of submitted jobs is the number of Condor log files (or, without a log directory, every result and leftover file)
+    if os.path.isdir(settings["log"]):
+        filecount = len(os.listdir(settings["log"]))
+    else:
+        filecount = len(resultFiles) + len(glob.glob(os.path.join(settings["leftover"], "*.csv")))
+    print("Total number of jobs =", filecount)
+
+    ## Finally, sort the flagged jobs by their error description, and write the eval file with summary statistics at the bottom.
+    flagged.sort(key=lambda entry: (entry[1], entry[0]))
+    est_success = round(100 - len(flagged) / filecount * 100) if filecount else 0
+
+    os.makedirs(settings["outdir"], exist_ok=True)
+    evalname = os.path.join(settings["outdir"], "eval_" + d + ".csv")
+    with open(evalname, "w", newline = '') as file:
+        writer = csv.writer(file, delimiter = ',', lineterminator = '\n')
+        writer.writerow(["Job assessment for job(s) completed after " + d])
+        writer.writerow(["Troubleshooting information compiled by individual PDB ID"])
+        writer.writerow([])
+        writer.writerow(["Job Name", "Reason for Followup"])
+        writer.writerows(flagged)
+        writer.writerow([])
+        writer.writerow(["Original number of queries: " + str(filecount)])
+        writer.writerow(["Number of failed PDB queries: " + str(len(flagged))])
+        writer.writerow(["Estimated success rate is " + str(est_success) + "%"])
+        writer.writerow([])
+        writer.writerow(["Check", "Time (seconds)"])
+        for check, seconds in timings.items():
+            writer.writerow([check, round(seconds, 3)])
+
+    print("\nOriginal number of queries:", filecount, "\nNumber of failed PDB queries:", len(flagged), "\nEst. success rate is " + str(est_success) + "%")
+    print("\nEvaluation file has been stored in the directory '" + settings["outdir"] + "'")
+
+    return evalname
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    workers = int(options.pop("workers")) if "workers" in options else None
+    analyzeResults(options, workers)
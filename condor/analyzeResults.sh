@@ -7,6 +7,7 @@
 # checks for high incidence of buried residues (greater than 20%), for invalid fasta characters, and for unusual residue positions (integers < 1)
 # then writes the PDB ID to a new list, which I can check manually in a pymol session)
 # also gives a bulk job success rate at the top of the file. This script's output is information for troubleshooting edge cases that SASAquatch.py encounters.
+# NOTE analyzeResults.py runs the same checks in python (each file read once, files checked in parallel, thresholds set on the command line).
 
 ## Get datestamp for the summary, alert user the analysis is starting, and begin writing the summary file
 d=$(date +%Y-%m-%d)                                                                                                                                     ## LINE 10																				
@@ -0,0 +1,259 @@
+## Size-aware version of the submit file BulkSubmit.sh writes: every job gets requests sized to its structure, and small structures are packed several to a job.
+
+## NOTE BulkSubmit.sh queues one job per line with the same `request_cpus = 2`, `request_memory = 2GB` and `request_disk = 300MB`, so a small peptide holds a
+## whole slot and a large assembly fails the memory check. This planner:
+##   (1) measures each structure (atoms and chains of the first model) from its local file, or from the structure cache for PDB IDs (see structureCache.py;
+##       `python structureCache.py prewarm <listfile>` fills the cache first). A structure that cannot be measured keeps BulkSubmit.sh's fixed requests.
+##   (2) predicts each job's runtime and peak memory from its atom count, with straight lines fitted to the METRICS lines of earlier runs (`metrics=`, read
+##       like condor/aggregateMetrics.py does). Without enough of them it uses defaults measured with benchmarkSASA.py structures (1,500 - 26,000 atoms).
+##   (3) packs jobs predicted to finish within `small=` seconds (default 60) into bundles of up to `bundle=` predicted seconds (default 1800); a bundle runs its
+##       structures one after another and requests the memory of its largest one. Every other job is queued on its own with requests sized to it:
+##         request_memory   predicted peak memory times `headroom` (default 1.5), rounded up to 256 MB (at least 512 MB)
+##         request_cpus     the 95th percentile of CPU seconds per wall second in the metrics, rounded up (1 without metrics; PyMOL calculates on one core)
+##         request_disk     300 MB (the python installation and scripts) plus twice the job's structure files
+##       Jobs predicted to need more than `lowmem=` MB (default 16384) are run with `memory=low` (see SASAquatch.py).
+## NOTE `dryrun=1` only prints the plan. Otherwise the submit file `SASA<date>_planned.sub`, its executable `querySASAplan.sh` and one list file per bundle
+## (`bundles/bundle_<n>.txt`) are written; `submit=1` also submits them with `condor_submit`.
+
+## USAGE: $ python planSubmit.py <listfile> [metrics=output/*.out,metrics.jsonl] [small=60] [bundle=1800] [headroom=1.5] [lowmem=16384] [dryrun=1] [submit=1]
+
+import gzip               # methods for reading gzipped structure files
+import math               # methods for rounding up the requests
+import os                 # methods for directory handling
+import subprocess         # methods for calling condor_submit
+import sys                # methods for taking command line arguments
+import time               # methods for the date stamp
+import aggregateMetrics   # METRICS line reader and percentiles (condor/aggregateMetrics.py)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import structureCache # local copies of fetched PDB IDs; see structureCache.py
+except ImportError:
+    structureCache = None
+
+# SASAquatch.py and the modules it imports, sent with every job
+script_files = ["SASAquatch.py", "resultStore.py", "structureArchive.py", "shrakeRupley.py", "structureCache.py", "resultCache.py"]
+
+# BulkSubmit.sh's fixed requests, kept for structures that cannot be measured
+default_requests = {"cpus": 2, "memory_mb": 2048, "disk_mb": 300}
+
+# Default runtime and memory model (seconds and MB = intercept + slope * atoms), measured on benchmarkSASA.py structures with the PyMOL engine;
+# the intercepts include PyMOL's start-up and a structure download
+default_model = {"seconds": (10.0, 0.0007), "rss_mb": (100.0, 0.008)}
+
+#########################################################################################################################
+## Helper Method: atoms (ATOM records) and chain IDs of the first model of a PDB or mmCIF file (optionally gzipped)   ##
+#########################################################################################################################
+def structureSize(path):
+
+    atoms, chains = 0, set()
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    with opener(path, "rt", errors = "replace") as file:
+        if ".cif" not in os.path.basename(path).lower():
+            for line in file:
+                if line.startswith("ATOM  "):
+                    atoms += 1
+                    chains.add(line[21])
+                elif line.startswith("ENDMDL"):
+                    break
+            return atoms, len(chains)
+
+        columns = []
+        for line in file:
+            if line.startswith("_atom_site."):
+                columns.append(line.strip()[len("_atom_site."):])
+                continue
+            if not columns:
+                continue
+            if not line.strip() or line.startswith(("#", "loop_", "_")):
+                if atoms:
+                    break
+                continue
+            fields = dict(zip(columns, line.split()))
+            if fields.get("pdbx_PDB_model_num", "1") != "1":
+                break
+            if fields.get("group_PDB") == "ATOM":
+                atoms += 1
+                chains.add(fields.get("auth_asym_id", fields.get("label_asym_id")))
+
+    return atoms, len(chains)
+
+def structurePath(query):
+    # a structure file named in the list, or the cached (or `cmd.fetch()`-downloaded) copy of a PDB ID; None when there is no local copy
+    if "." in query:
+        return query if os.path.exists(query) else None
+    for name in (query.lower() + ".cif", query.upper() + ".cif"):
+        if os.path.exists(name):
+            return name
+    if structureCache is not None:
+        return structureCache.lookup(query)
+    return None
+
+#########################################################################################################################
+## Helper Method: straight-line fit (intercept, slope) of y against x; None with fewer than two distinct x values      ##
+#########################################################################################################################
+def fitLine(xs, ys):
+
+    if len(set(xs)) < 2:
+        return None
+    meanX, meanY = sum(xs) / len(xs), sum(ys) / len(ys)
+    slope = sum((x - meanX) * (y - meanY) for x, y in zip(xs, ys)) / sum((x - meanX) ** 2 for x in xs)
+    return max(0.0, meanY - slope * meanX), max(0.0, slope)
+
+def fitModel(jobs):
+
+    # only jobs that really calculated something (not answered from the result cache) and that report their size
+    measured = [metrics for metrics in jobs if metrics.get("status") != "cached" and metrics.get("atoms") and metrics.get("seconds")]
+    model = dict(default_model)
+    fitted = fitLine([metrics["atoms"] for metrics in measured], [metrics["seconds"] for metrics in measured])
+    if fitted is not None:
+        model["seconds"] = fitted
+    withRSS = [metrics for metrics in measured if metrics.get("peak_rss_mb") is not None]
+    fitted = fitLine([metrics["atoms"] for metrics in withRSS], [metrics["peak_rss_mb"] for metrics in withRSS])
+    if fitted is not None:
+        model["rss_mb"] = fitted
+    cpus = [metrics["cpu_seconds"] / metrics["seconds"] for metrics in measured]
+    model["cpus"] = max(1, math.ceil(aggregateMetrics.percentile(cpus, 0.95))) if cpus else 1
+    model["jobs"] = len(measured)
+
+    return model
+
+def predict(model, key, atoms):
+    intercept, slope = model[key]
+    return intercept + slope * atoms
+
+def roundMemory(mb, headroom):
+    return max(512, 256 * math.ceil(mb * headroom / 256))
+
+#########################################################################################################################################
+## PLAN METHOD: size every job of a list and pack the small ones; returns a List of queue entries, each a Dictionary with "name",     ##
+## "jobs" (list lines), "files" (structure files to transfer), "atoms", "chains", "seconds", "rss_mb" and the requests               ##
+#########################################################################################################################################
+def planJobs(lines, model, small=60.0, bundle=1800.0, headroom=1.5, lowmem=16384):
+
+    sized, singles = [], []
+    for line in lines:
+        query = line.split()[0]
+        path = structurePath(query)
+        if path is None:
+            # not measured: BulkSubmit.sh's fixed requests
+            singles.append({"name": line.replace(" ", "_"), "jobs": [line], "files": [], "atoms": None, "chains": None, "seconds": None, "rss_mb": None,
+                            "cpus": default_requests["cpus"], "memory_mb": default_requests["memory_mb"], "disk_mb": default_requests["disk_mb"]})
+            continue
+        atoms, chains = structureSize(path)
+        sized.append({"line": line, "files": [query] if "." in query else [], "size_mb": os.path.getsize(path) / 1048576.0, "atoms": atoms, "chains": chains,
+                      "seconds": predict(model, "seconds", atoms), "rss_mb": predict(model, "rss_mb", atoms)})
+
+    # first-fit decreasing: the longest small jobs are placed first, each into the first bundle with room for it
+    bundles = []
+    for job in sorted((job for job in sized if job["seconds"] <= small), key=lambda job: job["seconds"], reverse=True):
+        for members in bundles:
+            if sum(member["seconds"] for member in members) + job["seconds"] <= bundle:
+                members.append(job)
+                break
+        else:
+            bundles.append([job])
+
+    entries = []
+    for number, members in enumerate(bundles, 1):
+        entries.append({"name": "bundle_%03d" % number, "jobs": [member["line"] for member in members], "files": [name for member in members for name in member["files"]],
+                        "atoms": sum(member["atoms"] for member in members), "chains": sum(member["chains"] for member in members),
+                        "seconds": sum(member["seconds"] for member in members), "rss_mb": max(member["rss_mb"] for member in members),
+                        "cpus": 1, "memory_mb": roundMemory(max(member["rss_mb"] for member in members), headroom),
+                        "disk_mb": 300 + math.ceil(2 * sum(member["size_mb"] for member in members))})
+
+    for job in (job for job in sized if job["seconds"] > small):
+        line = job["line"]
+        if job["rss_mb"] > lowmem and "memory=" not in line:
+            line += " memory=low"    # too large for any slot at normal memory; calculated one chain window at a time
+        entries.append({"name": job["line"].replace(" ", "_"), "jobs": [line], "files": job["files"], "atoms": job["atoms"], "chains": job["chains"],
+                        "seconds": job["seconds"], "rss_mb": job["rss_mb"], "cpus": model["cpus"], "memory_mb": roundMemory(min(job["rss_mb"], lowmem), headroom),
+                        "disk_mb": 300 + math.ceil(2 * job["size_mb"])})
+
+    return entries + singles
+
+def printPlan(entries, model, total):
+
+    print("Model (" + (str(model["jobs"]) + " measured jobs" if model["jobs"] else "defaults") + "): seconds = %.1f + %.5f * atoms, peak MB = %.1f + %.5f * atoms"
+          % (model["seconds"] + model["rss_mb"]))
+    print("\n%-28s %5s %9s %7s %9s %9s %5s %9s %8s" % ("Job", "Lines", "Atoms", "Chains", "Pred. s", "Pred. MB", "CPUs", "Memory", "Disk"))
+    for entry in entries:
+        print("%-28s %5d %9s %7s %9s %9s %5d %7dMB %6dMB" % (entry["name"][:28], len(entry["jobs"]), entry["atoms"] if entry["atoms"] is not None else "?",
+              entry["chains"] if entry["chains"] is not None else "?", "%.0f" % entry["seconds"] if entry["seconds"] is not None else "?",
+              "%.0f" % entry["rss_mb"] if entry["rss_mb"] is not None else "?", entry["cpus"], entry["memory_mb"], entry["disk_mb"]))
+
+    bundled = sum(len(entry["jobs"]) for entry in entries if entry["name"].startswith("bundle_"))
+    print("\nList lines:", total, "| Condor jobs:", len(entries), "(" + str(bundled), "lines in", sum(1 for entry in entries if entry["name"].startswith("bundle_")), "bundles)",
+          "| memory requested: %.1f GB (BulkSubmit.sh: %.1f GB)" % (sum(entry["memory_mb"] for entry in entries) / 1024.0, total * default_requests["memory_mb"] / 1024.0))
+
+#########################################################################################################################################
+## WRITER METHOD: the submit file, its executable, and one list file per bundle (same layout and names as BulkSubmit.sh's files)     ##
+#########################################################################################################################################
+def writeSubmit(entries, listfile):
+
+    d = time.strftime("%Y-%m-%d")
+    subname = "SASA" + d + "_planned.sub"
+
+    # the executable runs either one job (its arguments) or every line of a bundle's list file, each in its own PyMOL process. The job's arguments follow `--`:
+    # without it, PyMOL takes every argument after the script as a file to load (and aborts on `K` or `engine=numpy`) instead of passing it on in `sys.argv`
+    with open("querySASAplan.sh", "w") as file:
+        file.write("#!/bin/bash\n")
+        file.write("tar -xzf python37.tar.gz\n")
+        file.write("export PATH=$PWD/python/bin:$PATH\nexport PYTHONPATH=$PWD\nexport HOME=$PWD\n")
+        file.write("cd /software/mrblackburn/pymol/\n")
+        file.write('if [[ "$1" == bundle_*.txt ]]; then\n')
+        file.write('\twhile read -r line; do ./pymol -cq $_CONDOR_SCRATCH_DIR/SASAquatch.py -- $line; done < "$_CONDOR_SCRATCH_DIR/$1"\n')
+        file.write("else\n\t./pymol -cq $_CONDOR_SCRATCH_DIR/SASAquatch.py -- \"$@\"\nfi\n")
+    os.chmod("querySASAplan.sh", 0o755)
+
+    os.makedirs("bundles", exist_ok=True)
+    with open(subname, "w") as file:
+        file.write("# Name: " + subname + " | written with list file " + listfile + " by planSubmit.py\n")
+        file.write("# submit file for getting solvent accessible surface areas of the residues of target PDB IDs; requests are sized to each job.\n#\n")
+        file.write("universe = vanilla\nrequirements = (HasCHTCSoftware == true)\nexecutable = querySASAplan.sh\n")
+        file.write("should_transfer_files = YES\nwhen_to_transfer_output = ON_EXIT\n")
+
+        # submit commands hold until they are changed, so each queue statement is preceded by its own inputs and requests
+        for entry in entries:
+            files = script_files + ["http://proxy.chtc.wisc.edu/SQUID/chtc/python37.tar.gz"] + entry["files"]
+            if entry["name"].startswith("bundle_"):
+                bundlename = os.path.join("bundles", entry["name"] + ".txt")
+                with open(bundlename, "w") as bundle:
+                    bundle.write("\n".join(entry["jobs"]) + "\n")
+                files.append(bundlename)
+                arguments = entry["name"] + ".txt"
+            else:
+                arguments = entry["jobs"][0]
+
+            file.write("\ntransfer_input_files = " + ", ".join(files) + "\n")
+            file.write("request_cpus = " + str(entry["cpus"]) + "\nrequest_memory = " + str(entry["memory_mb"]) + "MB\nrequest_disk = " + str(entry["disk_mb"]) + "MB\n")
+            file.write("arguments = " + arguments + "\n")
+            file.write("log = log/SASA_" + entry["name"] + "_$(Cluster).log\n")
+            file.write("error = errors/SASA_" + entry["name"] + "_$(Cluster)_$(Process).err\n")
+            file.write("output = output/SASA_" + entry["name"] + "_$(Cluster)_$(Process).out\n")
+            file.write("queue\n")
+
+    return subname
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python planSubmit.py <listfile> [metrics=output/*.out] [small=60] [bundle=1800] [headroom=1.5] [lowmem=16384] [dryrun=1] [submit=1]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    with open(sys.argv[1]) as file:
+        lines = [" ".join(line.split()) for line in file if line.strip() and not line.startswith("#")]
+
+    model = fitModel(aggregateMetrics.readMetrics(options.get("metrics", "output/*.out").split(",")))
+    entries = planJobs(lines, model, float(options.get("small", 60)), float(options.get("bundle", 1800)), float(options.get("headroom", 1.5)), float(options.get("lowmem", 16384)))
+    printPlan(entries, model, len(lines))
+
+    if options.get("dryrun", "0") == "1":
+        sys.exit(0)
+
+    subname = writeSubmit(entries, sys.argv[1])
+    print("\nSubmit file", subname, "and executable querySASAplan.sh written")
+    if options.get("submit", "0") == "1":
+        subprocess.run(["condor_submit", subname], check=True)
@@ -0,0 +1,178 @@
+## Persistent cache of finished SASAquatch.py output tables, so that rerunning a list only calculates the structures (or settings) that actually changed.
+
+## NOTE A result is keyed by everything that can change its numbers: the content hash of the structure file, the surface settings (dot_density, dot_solvent),
+## the het-removal policy, the requested depth, and the SASA engine and its version. Renaming a file or fetching the same ID again is still a cache hit;
+## a new structure file, a new PyMOL version, or a different setting is a miss.
+## NOTE Layout of the cache directory (default `result_cache/`, or the SASA_RESULTS environment variable):
+##   tables/<key>.csv        one finished output table per key
+##   index.json              Dictionary of key -> {"query", "structure", "settings", "size", "last_used"}; `last_used` is when the table was stored
+##   index.lock              held (flock) by a process while it changes the index (same scheme as structureCache.py)
+## NOTE A cache hit only touches its table file; a table's last use (which drives least-recently-used (LRU) eviction) is the later of `last_used` and the file's
+## modification time.
+
+## USAGE: $ python resultCache.py list [results=DIR]                                   # show cached tables
+##        $ python resultCache.py evict [results=DIR] [max_mb=N]                       # shrink the cache to its size limit
+##        $ python resultCache.py invalidate <PDB ID | file | structure hash | all> [results=DIR]   # forget the tables for one structure (or all of them)
+
+import contextlib         # methods for holding the index lock around a block of code
+import hashlib            # methods for content hashes
+import json               # methods for reading and writing the cache index and keys
+import os                 # methods for directory handling
+import shutil             # methods for copying tables in and out of the cache
+import sys                # methods for taking command line arguments
+import time               # methods for the last-used timestamps
+try:
+    import fcntl          # methods for locking the index between processes; not available on Windows, where the index is not locked
+except ImportError:
+    fcntl = None
+
+# Defaults; each can be overridden with an environment variable so that SASAquatch.py jobs pick them up without extra arguments
+default_result_dir = os.environ.get("SASA_RESULTS", "result_cache")
+default_max_mb = float(os.environ.get("SASA_RESULTS_MB", "512"))
+
+#################################################################################################################
+## Helper Methods: read, write and lock the cache index (same write-then-rename and lock scheme as structureCache.py) ##
+#################################################################################################################
+def readIndex(result_dir=default_result_dir):
+    path = os.path.join(result_dir, "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def writeIndex(index, result_dir=default_result_dir):
+    path = os.path.join(result_dir, "index.json")
+    temp = path + "." + str(os.getpid()) + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(index, file, indent=1, sort_keys=True)
+    os.replace(temp, path)
+
+@contextlib.contextmanager
+def lockIndex(result_dir=default_result_dir):
+    os.makedirs(result_dir, exist_ok=True)
+    with open(os.path.join(result_dir, "index.lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield    # the lock is released when the file is closed
+
+def tablePath(key, result_dir=default_result_dir):
+    return os.path.join(result_dir, "tables", key + ".csv")
+
+def lastUsed(key, entry, result_dir=default_result_dir):
+    path = tablePath(key, result_dir)
+    return max(entry["last_used"], os.path.getmtime(path)) if os.path.exists(path) else entry["last_used"]
+
+###########################################################################################################
+## Helper Method: the content hash of a structure file (the same hash structureCache.py names files by) ##
+###########################################################################################################
+def fileHash(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def contentHash(content):
+    # the same hash for a structure held in memory (ex. a member of an archive; see structureArchive.py)
+    return hashlib.sha256(content).hexdigest()
+
+###########################################################################################################################
+## Helper Method: the cache key of one calculation; `settings` is a Dictionary of every option that changes the results ##
+###########################################################################################################################
+def resultKey(structure_hash, settings):
+    return hashlib.sha256(json.dumps([structure_hash, settings], sort_keys=True).encode()).hexdigest()
+
+###########################################################################################################
+## Helper Method: look up a cached table; returns its path (and marks it as just used), or None         ##
+###########################################################################################################
+def lookup(key, result_dir=default_result_dir):
+    index = readIndex(result_dir)
+    entry = index.get(key)
+    if entry is None or not os.path.exists(tablePath(key, result_dir)):
+        return None
+
+    os.utime(tablePath(key, result_dir))
+    return tablePath(key, result_dir)
+
+###########################################################################################################
+## Helper Method: copy a finished output table into the cache under its key                             ##
+###########################################################################################################
+def store(key, filename, query, structure_hash, settings, result_dir=default_result_dir, max_mb=default_max_mb):
+    path = tablePath(key, result_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + "." + str(os.getpid()) + ".tmp"
+    shutil.copyfile(filename, temp)
+
+    with lockIndex(result_dir):
+        os.replace(temp, path)
+        index = readIndex(result_dir)
+        index[key] = {"query": query, "structure": structure_hash, "settings": settings, "size": os.path.getsize(path), "last_used": time.time()}
+        writeIndex(index, result_dir)
+    evict(result_dir, max_mb)
+    return path
+
+##################################################################################################################################
+## EVICT METHOD: remove least-recently-used tables until the cache fits within its size limit; returns the keys that were removed ##
+##################################################################################################################################
+def evict(result_dir=default_result_dir, max_mb=default_max_mb):
+
+    with lockIndex(result_dir):
+        index = readIndex(result_dir)
+        total = sum(entry["size"] for entry in index.values())
+        removed = []
+
+        for key, entry in sorted(index.items(), key=lambda item: lastUsed(item[0], item[1], result_dir)):
+            if total <= max_mb * 1024 * 1024:
+                break
+            del index[key]
+            removed.append(key)
+            total -= entry["size"]
+            if os.path.exists(tablePath(key, result_dir)):
+                os.remove(tablePath(key, result_dir))
+
+        if removed:
+            writeIndex(index, result_dir)
+    return removed
+
+#############################################################################################################################################
+## INVALIDATE METHOD: forget every table of one structure, matched by query (PDB ID or filename) or structure hash; "all" empties the cache ##
+#############################################################################################################################################
+def invalidate(target, result_dir=default_result_dir):
+
+    with lockIndex(result_dir):
+        index = readIndex(result_dir)
+        removed = [key for key, entry in index.items()
+                   if target.lower() == "all" or entry["query"].upper() == target.upper() or entry["structure"].startswith(target.lower())]
+
+        for key in removed:
+            del index[key]
+            if os.path.exists(tablePath(key, result_dir)):
+                os.remove(tablePath(key, result_dir))
+
+        if removed:
+            writeIndex(index, result_dir)
+    return removed
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("list", "evict", "invalidate") or (sys.argv[1] == "invalidate" and len(sys.argv) < 3):
+        print("Usage: python resultCache.py list | evict | invalidate <PDB ID | file | structure hash | all>   [results=DIR] [max_mb=N]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    result_dir = options.get("results", default_result_dir)
+    max_mb = float(options.get("max_mb", default_max_mb))
+
+    if sys.argv[1] == "evict":
+        removed = evict(result_dir, max_mb)
+        print("Evicted", len(removed), "tables")
+
+    elif sys.argv[1] == "invalidate":
+        removed = invalidate(sys.argv[2], result_dir)
+        print("Invalidated", len(removed), "tables for", sys.argv[2])
+
+    else:
+        for key, entry in sorted(readIndex(result_dir).items(), key=lambda item: item[1]["query"]):
+            settings = " ".join(name + "=" + str(value) for name, value in sorted(entry["settings"].items()))
+            print(entry["query"], entry["structure"][:12], settings, entry["size"], time.strftime("%Y-%m-%d %H:%M", time.localtime(lastUsed(key, entry, result_dir))))
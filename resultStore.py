@@ -0,0 +1,180 @@
+## One SQLite file holding the per-residue results of a whole list, instead of one `SASA_<ID>_<depth>.csv` file per structure.
+
+## NOTE Tables in the store (default `SASA_results.db`):
+##   jobs       one row per output file: job (the output filename without `.csv`), pdb_id, depth, adaptive (1 when the file had a "Dot Density" column)
+##   chains     one row per chain of every job: job, chain, position (order in the file), fasta
+##   residues   one row per residue: job, pdb_id, chain, resi, resv, resn, total_sasa, total_rel, total_burial, side_sasa, side_rel, side_burial, density
+##              (`total_sasa`, `side_sasa` and the relative values are NULL for residues "Not present in structure model"; `density` is NULL unless `density=adaptive`)
+## NOTE Residues are indexed on (pdb_id, chain, resi) and on (resn, side_burial), so a question like "every exposed lysine in the list" is one indexed query:
+##   $ sqlite3 SASA_results.db "SELECT pdb_id, chain, resi FROM residues WHERE resn = 'LYS' AND side_burial = 'Exposed'"
+## NOTE Importing a job again replaces its rows. `export` writes a job back out in exactly the csv layout SASAquatch.py writes.
+
+## USAGE: $ python resultStore.py import <csv files...> [store=FILE]     # add finished output files (ex. a Results/ directory gathered from Condor)
+##        $ python resultStore.py export <job> [store=FILE]              # ex. `export SASA_4H1W_ALL` writes SASA_4H1W_ALL.csv
+##        $ python resultStore.py list [store=FILE]                      # show stored jobs and their residue counts
+
+import csv                # methods for handling csv file i/o
+import os                 # methods for directory handling
+import re                 # methods for string editing
+import sqlite3            # methods for the result store
+import sys                # methods for taking command line arguments
+
+default_store = os.environ.get("SASA_STORE", "SASA_results.db")
+
+# the master header every output file starts with (see `runQuery()` in SASAquatch.py)
+header = ["SOLVENT ACCESSIBLE SURFACE AREAS OF TARGET PROTEOME"]
+
+## Dictionary of single-letter codes -> 3-letter codes; residue rows are labeled with the single-letter code (ex. `K123`)
+letterCode = {'R' : 'ARG', 'H' : 'HIS', 'K' : 'LYS', 'D' : 'ASP', 'E' : 'GLU', 'S' : 'SER', 'T' : 'THR', 'N' : 'ASN', 'Q' : 'GLN', 'C' : 'CYS',
+              'G' : 'GLY', 'P' : 'PRO', 'A' : 'ALA', 'V' : 'VAL', 'I' : 'ILE', 'L' : 'LEU', 'M' : 'MET', 'F' : 'PHE', 'Y' : 'TYR', 'W' : 'TRP'}
+threeLetter = {resn: letter for letter, resn in letterCode.items()}
+
+class StoreFormatError(Exception):
+    pass
+
+#############################################################################################################
+## Helper Method: open (and if needed, create) the store; several processes may write to it one at a time ##
+#############################################################################################################
+def openStore(store=default_store):
+
+    connection = sqlite3.connect(store, timeout=120)
+    connection.executescript("""
+        CREATE TABLE IF NOT EXISTS jobs (job TEXT PRIMARY KEY, pdb_id TEXT, depth TEXT, adaptive INTEGER);
+        CREATE TABLE IF NOT EXISTS chains (job TEXT, chain TEXT, position INTEGER, fasta TEXT, PRIMARY KEY (job, chain));
+        CREATE TABLE IF NOT EXISTS residues (job TEXT, pdb_id TEXT, chain TEXT, resi TEXT, resv INTEGER, resn TEXT,
+                                             total_sasa REAL, total_rel REAL, total_burial TEXT, side_sasa REAL, side_rel REAL, side_burial TEXT, density INTEGER);
+        CREATE INDEX IF NOT EXISTS residues_position ON residues (pdb_id, chain, resi);
+        CREATE INDEX IF NOT EXISTS residues_type ON residues (resn, side_burial);
+        CREATE INDEX IF NOT EXISTS residues_job ON residues (job);
+    """)
+    return connection
+
+##############################################################################################################################
+## Helper Method: read one output csv into (pdb_id, adaptive, chains, rows); chains are (chain, fasta) and rows are tuples ##
+## in the column order of the `residues` table (without `job` and `pdb_id`)                                               ##
+##############################################################################################################################
+def readOutputCSV(filename):
+
+    with open(filename, newline = '') as file:
+        lines = list(csv.reader(file))
+
+    pdb_id, adaptive, chains, rows, chain = None, False, [], [], None
+    for line in lines[1:]:
+        if not line:
+            continue
+
+        # chain subheader: the columns are followed by "PDB ID: <query>", "Chain <ID> FASTA:" and the chain's sequence
+        if line[0] == "Residue":
+            if line[1] != "Total SASA":
+                raise StoreFormatError(filename + " is not a standard SASA table (interface tables cannot be stored)")
+            adaptive = line[7] == "Dot Density"
+            pdb_id = line[-3][len("PDB ID: "):]
+            chain = line[-2][len("Chain "):-len(" FASTA:")]
+            chains.append((chain, line[-1]))
+            continue
+
+        resi = line[0][1:]
+        resv = int(re.match(r"-?\d+", resi).group())
+        density = int(line[7]) if adaptive else None
+        if line[1] == "Not present in structure model":
+            rows.append((chain, resi, resv, letterCode[line[0][0]], None, None, line[3], None, None, line[6], density))
+        else:
+            rows.append((chain, resi, resv, letterCode[line[0][0]], float(line[1]), float(line[2]), line[3], float(line[4]), float(line[5]), line[6], density))
+
+    return pdb_id, adaptive, chains, rows
+
+###################################################################################################################
+## IMPORT METHOD: add one finished output csv to the store (replacing an earlier import of the same job)        ##
+###################################################################################################################
+def importCSV(filename, store=default_store):
+
+    job = os.path.basename(filename)[:-len(".csv")]
+    pdb_id, adaptive, chains, rows = readOutputCSV(filename)
+    depth = job[len("SASA_" + pdb_id + "_"):] if pdb_id is not None else ""
+
+    connection = openStore(store)
+    with connection:    # one transaction: a job is either stored completely or not at all
+        connection.execute("DELETE FROM residues WHERE job = ?", (job,))
+        connection.execute("DELETE FROM chains WHERE job = ?", (job,))
+        connection.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)", (job, pdb_id, depth, int(adaptive)))
+        connection.executemany("INSERT INTO chains VALUES (?, ?, ?, ?)", [(job, chain, position, fasta) for position, (chain, fasta) in enumerate(chains)])
+        connection.executemany("INSERT INTO residues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [(job, pdb_id) + row for row in rows])
+    connection.close()
+
+    return job, len(rows)
+
+def hasJob(job, store=default_store):
+    if not os.path.exists(store):
+        return False
+    connection = openStore(store)
+    found = connection.execute("SELECT 1 FROM jobs WHERE job = ?", (job,)).fetchone() is not None
+    connection.close()
+    return found
+
+###################################################################################################################
+## EXPORT METHOD: write a stored job back out in the csv layout SASAquatch.py writes; returns the filename       ##
+###################################################################################################################
+def exportCSV(job, store=default_store, outname=None):
+
+    connection = openStore(store)
+    found = connection.execute("SELECT pdb_id, adaptive FROM jobs WHERE job = ?", (job,)).fetchone()
+    if found is None:
+        connection.close()
+        raise KeyError(job + " is not in " + store)
+    pdb_id, adaptive = found
+    outname = outname or job + ".csv"
+
+    with open(outname + '.part', 'w', newline = '') as file:
+        writer = csv.writer(file, delimiter = ',')
+        writer.writerow(header)
+        for chain, fasta in connection.execute("SELECT chain, fasta FROM chains WHERE job = ? ORDER BY position", (job,)).fetchall():
+            writer.writerow("")
+            subheader = ["Residue", "Total SASA", "Total Relative SASA", "Total: Exposed or Buried?", "Sidechain SASA", "Sidechain Relative SASA", "Sidechain: Exposed or Buried?",
+                         "PDB ID: " + pdb_id, "Chain " + chain + " FASTA:", fasta]
+            if adaptive:
+                subheader.insert(7, "Dot Density")
+            writer.writerow(subheader)
+
+            # rows come back in the order they were stored, which is the order of the original file
+            for resi, resn, tot, totrel, totburial, side, siderel, sideburial, density in connection.execute(
+                    "SELECT resi, resn, total_sasa, total_rel, total_burial, side_sasa, side_rel, side_burial, density FROM residues WHERE job = ? AND chain = ? ORDER BY rowid", (job, chain)):
+                if tot is None:
+                    row = [threeLetter[resn] + resi, "Not present in structure model", "N/A", "N/A", "Not present in structure model", "N/A", "N/A"]
+                else:
+                    row = [threeLetter[resn] + resi, str(tot), str(totrel), totburial, str(side), str(siderel), sideburial]
+                if adaptive:
+                    row.append(str(density))
+                writer.writerow(row)
+
+    connection.close()
+    os.replace(outname + '.part', outname)
+    return outname
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export", "list"):
+        print("Usage: python resultStore.py import <csv files...> | export <job> | list   [store=FILE]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    store = options.get("store", default_store)
+    args = [arg for arg in sys.argv[2:] if "=" not in arg]
+
+    if sys.argv[1] == "import":
+        for filename in args:
+            try:
+                job, count = importCSV(filename, store)
+                print("Stored", job, "(" + str(count) + " residues)")
+            except (StoreFormatError, ValueError, KeyError, IndexError) as err:
+                print("Skipped", filename + ":", err)
+
+    elif sys.argv[1] == "export":
+        for job in args:
+            print("Exported", exportCSV(job[:-len(".csv")] if job.endswith(".csv") else job, store))
+
+    else:
+        connection = openStore(store)
+        for job, count in connection.execute("SELECT jobs.job, COUNT(residues.job) FROM jobs LEFT JOIN residues ON residues.job = jobs.job GROUP BY jobs.job ORDER BY jobs.job"):
+            print(job, count)
+        connection.close()
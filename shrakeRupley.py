@@ -0,0 +1,479 @@
+## Calculate per-atom and per-residue Solvent-Accessible Surface Areas (SASA) with NumPy alone, using the Shrake-Rupley "dot surface" algorithm.
+
+## NOTE This is the PyMOL-independent SASA engine used by `SASAquatch.py engine=numpy`. It reproduces PyMOL's `get_area` with `dot_solvent=1`: every atom gets a sphere
+## of test dots at (vdW radius + probe radius), a dot counts as accessible when it is not inside any neighboring atom's (vdW + probe) sphere, and the atom's area is the
+## accessible fraction of its sphere's surface. The dot spheres are the same geodesic spheres PyMOL uses (12, 42, 162, 642 or 2562 dots for `dot_density` 0-4).
+
+## NOTE Neighbors are found with a uniform cell grid: each atom is binned into a cube as wide as the largest possible atom-atom contact distance, so an atom's neighbors
+## can only be in its own cell or the 26 cells around it. Dot tests are then done for a whole cell of atoms at once with NumPy broadcasting.
+
+## NOTE Usage from a shell (prints per-residue SASA for every chain in the file):
+## shell> python shrakeRupley.py 5KSDon4H1W.pdb [dot_density] [probe_radius]
+
+import gzip               # methods for reading gzipped structure files
+import os                 # methods for file path handling
+import sys                # methods for taking command line arguments
+import numpy as np        # vectorized math for the dot surface calculation
+
+## Dictionary of van der Waals radii (Angstroms) by element; these are the values PyMOL assigns when it loads a structure, so areas are directly comparable.
+vdW_radii = {'H' : 1.2, 'C' : 1.7, 'N' : 1.55, 'O' : 1.52, 'S' : 1.8, 'P' : 1.8, 'F' : 1.47, 'CL' : 1.75, 'BR' : 1.85, 'I' : 1.98, 'SE' : 1.9,
+             'NA' : 2.27, 'MG' : 1.73, 'K' : 2.75, 'CA' : 2.31, 'MN' : 1.73, 'FE' : 1.7, 'CO' : 1.7, 'NI' : 1.63, 'CU' : 1.4, 'ZN' : 1.39}
+default_radius = 1.8      # used for any element not in the Dictionary above
+
+# Atom names that PyMOL treats as backbone; every other atom of a residue is part of the sidechain (this matches PyMOL's `sidechain` selection for proteins)
+backbone_names = {'N', 'CA', 'C', 'O', 'OXT', 'H', 'H1', 'H2', 'H3', 'HA', 'HA2', 'HA3', 'HXT'}
+
+# Default calculation settings, matching `cmd.set('dot_solvent', 1)` and `cmd.set('dot_density', 4)` in SASAquatch.py
+probe_radius = 1.4
+dot_density = 4
+
+# Version of this engine's numerics; anything that caches results (ex. result memoization) should include it in its key.
+engine_version = "shrakeRupley-1"
+
+##########################################################################################################################
+## Helper Method: build the geodesic dot sphere for a dot density (0-4) and the surface area each dot represents        ##
+##########################################################################################################################
+_sphere_cache = {}
+
+def getDotSphere(density=dot_density):
+
+    if density in _sphere_cache:
+        return _sphere_cache[density]
+
+    # start from PyMOL's icosahedron (poles on the z-axis, two rings of 5 vertices), then split every triangle into 4 and push the new vertices onto the sphere
+    ring_z = 1.0 / np.sqrt(5.0)
+    ring_r = 2.0 / np.sqrt(5.0)
+    points = [(0.0, 0.0, 1.0)]
+    points += [(ring_r * np.cos(k * 2 * np.pi / 5), ring_r * np.sin(k * 2 * np.pi / 5), ring_z) for k in range(5)]
+    points += [(ring_r * np.cos((k + 0.5) * 2 * np.pi / 5), ring_r * np.sin((k + 0.5) * 2 * np.pi / 5), -ring_z) for k in range(5)]
+    points += [(0.0, 0.0, -1.0)]
+    points = [np.array(p) for p in points]
+
+    faces = []
+    for k in range(5):
+        upper, upper_next = 1 + k, 1 + (k + 1) % 5
+        lower, lower_next = 6 + k, 6 + (k + 1) % 5
+        faces += [(0, upper, upper_next), (upper, lower, upper_next), (upper_next, lower, lower_next), (lower, 11, lower_next)]
+
+    for level in range(max(0, min(density, 4))):
+        midpoints = {}       # shared edges get one midpoint: key = sorted vertex pair, value = index of the new vertex
+        split = []
+        for a, b, c in faces:
+            abc = []
+            for v1, v2 in ((a, b), (b, c), (c, a)):
+                edge = (min(v1, v2), max(v1, v2))
+                if edge not in midpoints:
+                    mid = points[v1] + points[v2]
+                    points.append(mid / np.linalg.norm(mid))
+                    midpoints[edge] = len(points) - 1
+                abc.append(midpoints[edge])
+            ab, bc, ca = abc
+            split += [(a, ab, ca), (ab, b, bc), (ca, bc, c), (ab, bc, ca)]
+        faces = split
+
+    points = np.array(points)
+    faces = np.array(faces)
+
+    # each dot represents 1/3 of the area of every triangle it belongs to; weights are normalized so a fully exposed unit sphere has area 4*pi
+    tri = points[faces]
+    tri_area = 0.5 * np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1)
+    weights = np.zeros(len(points))
+    for corner in range(3):
+        np.add.at(weights, faces[:, corner], tri_area / 3.0)
+    weights *= 4.0 * np.pi / weights.sum()
+
+    _sphere_cache[density] = (points, weights)
+    return points, weights
+
+##########################################################################################################################
+## Helper Method: read a PDB or mmCIF file (optionally gzipped) or its text into a Dictionary of per-atom NumPy arrays   ##
+##########################################################################################################################
+def readStructure(source, fmt=None, model=1):
+    """
+    source is a file path, or the text of a structure file (fmt must then be 'pdb' or 'cif').
+    Only the requested model is kept (the first model by default). Returns a Dictionary of equal-length arrays:
+    'name', 'resn', 'chain', 'resi' (position + insertion code), 'resv', 'elem', 'het', 'q', 'coords'.
+    """
+    if fmt is None:
+        fmt = "cif" if ".cif" in os.path.basename(source).lower() else "pdb"
+        opener = gzip.open if source.lower().endswith(".gz") else open
+        with opener(source, "rt") as handle:
+            text = handle.read()
+    else:
+        text = source
+
+    if fmt == "cif":
+        return _readCIF(text, model)
+    return _readPDB(text, model)
+
+def _readPDB(text, model):
+
+    atoms = []
+    currModel = 1
+    seenModel = False
+    for line in text.splitlines():
+        record = line[:6]
+        if record == "MODEL ":
+            currModel = int(line[10:14]) if line[10:14].strip() else currModel + seenModel
+            seenModel = True
+        elif record == "ENDMDL" and currModel == model:
+            break
+        elif (record == "ATOM  " or record == "HETATM") and currModel == model:
+            altloc = line[16]
+            if altloc not in (" ", "A"):     # keep only the first alternate location, as PyMOL does for SASA
+                continue
+            name = line[12:16].strip()
+            elem = line[76:78].strip().upper() or name.lstrip("0123456789")[:1].upper()
+            occupancy = float(line[54:60]) if line[54:60].strip() else 1.0
+            resv = int(line[22:26])
+            atoms.append((name, line[17:20].strip(), line[21].strip(), str(resv) + line[26].strip(), resv, elem, record == "HETATM", occupancy,
+                          float(line[30:38]), float(line[38:46]), float(line[46:54])))
+
+    return _toArrays(atoms)
+
+def _readCIF(text, model):
+
+    # collect the column names of the `_atom_site` loop, then split each of its rows into fields (mmCIF atom rows never contain quoted spaces)
+    columns = []
+    atoms = []
+    inLoop = False
+    for line in text.splitlines():
+        if line.startswith("_atom_site."):
+            columns.append(line.split(".", 1)[1].strip())
+            inLoop = True
+            continue
+        if not inLoop:
+            continue
+        if not line or line.startswith("#") or line.startswith("loop_") or line.startswith("_"):
+            if atoms:
+                break
+            continue
+
+        fields = dict(zip(columns, line.split()))
+        if int(fields.get("pdbx_PDB_model_num", model)) != model or fields.get("label_alt_id", ".") not in (".", "?", "A"):
+            continue
+        ins = fields.get("pdbx_PDB_ins_code", "?")
+        ins = "" if ins in ("?", ".") else ins
+        resv = int(fields.get("auth_seq_id", fields.get("label_seq_id")))
+        atoms.append((fields.get("auth_atom_id", fields.get("label_atom_id")).strip('"'), fields.get("auth_comp_id", fields.get("label_comp_id")),
+                      fields.get("auth_asym_id", fields.get("label_asym_id")), str(resv) + ins, resv, fields["type_symbol"].upper(),
+                      fields["group_PDB"] == "HETATM", float(fields.get("occupancy", 1.0)),
+                      float(fields["Cartn_x"]), float(fields["Cartn_y"]), float(fields["Cartn_z"])))
+
+    return _toArrays(atoms)
+
+def _toArrays(atoms):
+
+    # string columns stay as object arrays so that chain IDs and `resi` values of any length compare cleanly
+    columns = list(zip(*atoms)) if atoms else [()] * 11
+    structure = {"name": np.array(columns[0], dtype=object), "resn": np.array(columns[1], dtype=object), "chain": np.array(columns[2], dtype=object),
+                 "resi": np.array(columns[3], dtype=object), "resv": np.array(columns[4], dtype=int), "elem": np.array(columns[5], dtype=object),
+                 "het": np.array(columns[6], dtype=bool), "q": np.array(columns[7], dtype=float)}
+    structure["coords"] = np.array(list(zip(*columns[8:11])), dtype=float).reshape(-1, 3)
+    return structure
+
+##########################################################################################################################
+## Helper Method: keep only the atoms where `mask` is True (ex. removing het atoms, or selecting a single chain)         ##
+##########################################################################################################################
+def subset(structure, mask):
+    return {key: values[mask] for key, values in structure.items()}
+
+def ligandMask(structure, ligands):
+    # het atoms whose residue name is one of the 3-letter het codes in `ligands` (ex. ANP for AMPPNP)
+    return structure["het"] & np.isin(structure["resn"].astype(str), list(ligands or []))
+
+def chainMask(structure, chains):
+    # atoms of the chains whose IDs are in `chains`
+    return np.isin(structure["chain"].astype(str), [str(chain) for chain in chains])
+
+def getRadii(structure):
+    return np.array([vdW_radii.get(elem, default_radius) for elem in structure["elem"]])
+
+##########################################################################################################################
+## Helper Method: uniform cell grid; returns the cell of every atom and a Dictionary of cell -> atom indices            ##
+##########################################################################################################################
+def buildCellGrid(coords, cell_size):
+
+    cells = np.floor(coords / cell_size).astype(np.int64)
+    grid = {}
+    order = np.lexsort(cells.T[::-1])
+    if len(order):
+        sortedCells = cells[order]
+        breaks = np.flatnonzero(np.any(np.diff(sortedCells, axis=0) != 0, axis=1)) + 1
+        for group in np.split(order, breaks):
+            grid[tuple(cells[group[0]])] = group
+    return cells, grid
+
+_offsets = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+##########################################################################################################################
+## SASA METHOD: per-atom SASA (square Angstroms) of every atom in `coords` in the context of all the other atoms        ##
+##########################################################################################################################
+def getGrid(coords, radii, probe=probe_radius):
+    # the neighbor index `atomSASA()` uses, built once so that several calculations on the same coordinates can share it
+    cell_size = 2.0 * (radii + probe).max() if len(coords) else 1.0
+    cells, cellGrid = buildCellGrid(coords, cell_size)
+    return cell_size, cells, cellGrid
+
+def atomSASA(coords, radii, probe=probe_radius, density=dot_density, targets=None, grid=None, occluders=None):
+    """
+    coords is an (N, 3) array and radii an (N,) array of vdW radii. Returns an (N,) array of per-atom SASA.
+    targets (optional) is a boolean mask of the atoms whose area is needed; all atoms still occlude. Untargeted atoms get 0.0.
+    grid (optional) is a (cell_size, cells, grid) tuple from `getGrid()` on the same coords, so the neighbor index is reused.
+    occluders (optional) is a boolean mask of the atoms that can bury dots (ex. one chain only, for its isolated surface); by default every atom does.
+    """
+    points, weights = getDotSphere(density)
+    expanded = radii + probe
+    areas = np.zeros(len(coords))
+    if len(coords) == 0:
+        return areas
+
+    if grid is None:
+        grid = getGrid(coords, radii, probe)
+    cell_size, cells, cellGrid = grid
+
+    for cell, members in cellGrid.items():
+        if targets is not None:
+            members = members[targets[members]]
+            if len(members) == 0:
+                continue
+
+        # candidate occluders: every atom in this cell and the 26 cells around it
+        candidates = np.concatenate([cellGrid[key] for key in ((cell[0] + dx, cell[1] + dy, cell[2] + dz) for dx, dy, dz in _offsets) if key in cellGrid])
+        if occluders is not None:
+            candidates = candidates[occluders[candidates]]
+            if len(candidates) == 0:
+                areas[members] = expanded[members] ** 2 * weights.sum()
+                continue
+
+        # true neighbors overlap the atom's expanded sphere; pad each atom's neighbor list to the same length with a dummy neighbor that never buries a dot
+        delta = coords[candidates][None, :, :] - coords[members][:, None, :]
+        dist2 = np.einsum('ijk,ijk->ij', delta, delta)
+        contact = (dist2 < (expanded[members][:, None] + expanded[candidates][None, :]) ** 2) & (candidates[None, :] != members[:, None])
+        counts = contact.sum(axis=1)
+        width = max(1, counts.max())
+        vectors = np.zeros((len(members), width, 3))
+        cutoffs = np.full((len(members), width), np.inf)
+        rows, cols = np.nonzero(contact)
+        slots = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        vectors[rows, slots] = delta[rows, cols]
+        radius = expanded[members][rows]
+        cutoffs[rows, slots] = (radius ** 2 + dist2[rows, cols] - expanded[candidates[cols]] ** 2) / (2.0 * radius)
+
+        # a dot at (center + R_i * u) lies inside neighbor j exactly when u . (x_j - x_i) > (R_i^2 + d_ij^2 - R_j^2) / (2 * R_i), so every dot of every atom in the
+        # cell is tested against all of that atom's neighbors with one matrix product instead of explicit dot coordinates
+        buried = (np.matmul(vectors, points.T) > cutoffs[:, :, None]).any(axis=1)
+
+        areas[members] = (~buried * weights[None, :]).sum(axis=1) * expanded[members] ** 2
+
+    return areas
+
+##########################################################################################################################
+## Helper Method: mark every atom that touches an atom of another chain (the only atoms whose surface changes when a     ##
+## chain is taken out of its complex); `labels` groups the atoms some other way (ex. ligand vs. protein) instead        ##
+##########################################################################################################################
+def interfaceMask(structure, radii, probe=probe_radius, grid=None, labels=None):
+
+    coords = structure["coords"]
+    chains = structure["chain"] if labels is None else labels
+    expanded = radii + probe
+    mask = np.zeros(len(coords), dtype=bool)
+    if grid is None:
+        grid = getGrid(coords, radii, probe)
+    cell_size, cells, cellGrid = grid
+
+    for cell, members in cellGrid.items():
+        candidates = np.concatenate([cellGrid[key] for key in ((cell[0] + dx, cell[1] + dy, cell[2] + dz) for dx, dy, dz in _offsets) if key in cellGrid])
+        delta = coords[candidates][None, :, :] - coords[members][:, None, :]
+        dist2 = np.einsum('ijk,ijk->ij', delta, delta)
+        contact = (dist2 < (expanded[members][:, None] + expanded[candidates][None, :]) ** 2) & (chains[candidates][None, :] != chains[members][:, None])
+        mask[members] = contact.any(axis=1)
+
+    return mask
+
+##########################################################################################################################
+## Helper Method: the atoms of `selected` plus every atom within `cutoff` Angstroms of one of them (the same atoms as    ##
+## PyMOL's `selected or (all within cutoff of selected)`); `grid` is `buildCellGrid(coords, cutoff)`, built once       ##
+##########################################################################################################################
+def windowMask(coords, selected, cutoff, grid=None):
+
+    window = selected.copy()
+    if grid is None:
+        grid = buildCellGrid(coords, cutoff)
+    cells, cellGrid = grid
+
+    for cell in set(map(tuple, cells[selected])):
+        members = cellGrid[cell][selected[cellGrid[cell]]]
+        candidates = np.concatenate([cellGrid[key] for key in ((cell[0] + dx, cell[1] + dy, cell[2] + dz) for dx, dy, dz in _offsets) if key in cellGrid])
+        candidates = candidates[~window[candidates]]
+        if len(candidates) == 0:
+            continue
+        delta = coords[candidates][:, None, :] - coords[members][None, :, :]
+        window[candidates[(np.einsum('ijk,ijk->ij', delta, delta) <= cutoff ** 2).any(axis=1)]] = True
+
+    return window
+
+##########################################################################################################################
+## SASA METHOD: per-atom SASA of every atom with its chain taken out of the complex (each chain alone), reusing the      ##
+## complex's per-atom areas and neighbor index                                                                          ##
+##########################################################################################################################
+def isolatedSASA(structure, areas, radii, probe=probe_radius, density=dot_density, grid=None):
+    """
+    areas is the (N,) array of per-atom SASA in the complex, from `atomSASA()` on the same structure. Returns an (N,) array of per-atom SASA with each chain on its own.
+    Only interface atoms are recalculated (every other atom's surface cannot change), one chain at a time, so memory stays at one structure plus one chain's dot tests.
+    """
+    if grid is None:
+        grid = getGrid(structure["coords"], radii, probe)
+    interface = interfaceMask(structure, radii, probe, grid)
+    isolated = areas.copy()
+
+    for chain in getChains(structure):
+        inChain = structure["chain"] == chain
+        targets = interface & inChain
+        if targets.any():
+            isolated[targets] = atomSASA(structure["coords"], radii, probe, density, targets, grid, inChain)[targets]
+
+    return isolated
+
+##########################################################################################################################
+## SASA METHOD: per-atom SASA of every atom with the ligand atoms taken out (apo), reusing the per-atom areas with the    ##
+## ligands present (holo) and their neighbor index                                                                      ##
+##########################################################################################################################
+def apoSASA(structure, areas, radii, ligand, probe=probe_radius, density=dot_density, grid=None):
+    """
+    areas is the (N,) array of per-atom SASA with the ligands present; ligand is a boolean mask of the ligand atoms (see `ligandMask()`). Returns an (N,) array of
+    per-atom SASA without them: only atoms that touch a ligand atom are recalculated, with every other atom still occluding. Ligand atoms get 0.0.
+    """
+    if grid is None:
+        grid = getGrid(structure["coords"], radii, probe)
+    targets = interfaceMask(structure, radii, probe, grid, ligand) & ~ligand
+    apo = areas.copy()
+    apo[ligand] = 0.0
+    if targets.any():
+        apo[targets] = atomSASA(structure["coords"], radii, probe, density, targets, grid, ~ligand)[targets]
+
+    return apo
+
+##########################################################################################################################
+## SASA METHOD: recalculate the atoms of selected residues at another dot density (ex. refining a fast low-density pass) ##
+##########################################################################################################################
+def refineSASA(structure, areas, radii, selected, probe=probe_radius, density=dot_density, grid=None):
+    """
+    selected is a collection of (chain, resi) pairs. Returns a copy of areas in which every atom of those residues was recalculated at `density`;
+    the rest of the structure still occludes, so the refined values are the same as a full calculation at that density.
+    """
+    targets = np.array([(chain, resi) in selected for chain, resi in zip(structure["chain"], structure["resi"])], dtype=bool)
+    refined = areas.copy()
+    if targets.any():
+        refined[targets] = atomSASA(structure["coords"], radii, probe, density, targets, grid)[targets]
+
+    return refined
+
+##########################################################################################################################
+## Helper Method: sum per-atom areas into a residue table for one chain, in the same layout as `buildResidueTable()`     ##
+##########################################################################################################################
+def residueTable(structure, areas, chain, resn_filter=None):
+    """
+    Returns a Dictionary keyed by `resi` (in file order) whose values hold 'resv', 'ins', 'resn', 'atoms', 'sideAtoms', 'occupancy', 'area' and 'sideArea'.
+    resn_filter (optional) is a collection of 3-letter codes; other residues are left out.
+    """
+    residues = {}
+    for i in np.flatnonzero(structure["chain"] == chain):
+        resi = structure["resi"][i]
+        resn = structure["resn"][i]
+        if resn_filter is not None and resn not in resn_filter:
+            continue
+        if resi not in residues:
+            resv = int(structure["resv"][i])
+            residues[resi] = {"resv": resv, "ins": resi[len(str(resv)):], "resn": resn, "atoms": 0, "sideAtoms": 0, "occupancy": structure["q"][i], "area": 0.0, "sideArea": 0.0}
+
+        residue = residues[resi]
+        residue["atoms"] += 1
+        residue["occupancy"] = min(residue["occupancy"], structure["q"][i])
+        residue["area"] += areas[i]
+        if structure["name"][i] not in backbone_names:
+            residue["sideAtoms"] += 1
+            residue["sideArea"] += areas[i]
+
+    return residues
+
+##########################################################################################################################
+## Helper Methods: (context=ensemble) per-residue SASA statistics over many models of one structure. The residue index  ##
+## is built once from the first model; each later model is reduced through it and folded into running statistics, so   ##
+## memory does not grow with the number of models.                                                                      ##
+##########################################################################################################################
+def ensembleIndex(chains, resis, resns, side):
+    """
+    chains, resis and resns are per-atom sequences of the first model, side is True for its sidechain atoms (any atom order, ex. PyMOL's).
+    Returns the running statistics Dictionary that `addModel()` updates: 'keys' ((chain, resi) in atom order), 'resn', 'atoms' and, per residue,
+    'mean', 'm2' (sum of squared deviations), 'min', 'max' and 'exposed' (models above the burial threshold); row 0 is the whole residue, row 1 the sidechain.
+    """
+    positions = {}
+    resn = []
+    index = np.empty(len(chains), dtype=int)
+    for i, key in enumerate(zip(chains, resis)):
+        if key not in positions:
+            positions[key] = len(positions)
+            resn.append(resns[i])
+        index[i] = positions[key]
+
+    count = len(positions)
+    return {"keys": list(positions), "resn": resn, "index": index, "side": np.asarray(side, dtype=bool), "atoms": np.bincount(index, minlength=count),
+            "models": 0, "mean": np.zeros((2, count)), "m2": np.zeros((2, count)), "min": np.full((2, count), np.inf), "max": np.full((2, count), -np.inf),
+            "exposed": np.zeros((2, count), dtype=int)}
+
+def addModel(stats, areas, maxima, threshold):
+
+    # per-residue totals of this model in one pass (whole residue, sidechain), then Welford's update of the running mean and squared deviations
+    count = len(stats["keys"])
+    values = np.vstack([np.bincount(stats["index"], weights=areas, minlength=count),
+                        np.bincount(stats["index"], weights=np.where(stats["side"], areas, 0.0), minlength=count)])
+    stats["models"] += 1
+    delta = values - stats["mean"]
+    stats["mean"] += delta / stats["models"]
+    stats["m2"] += delta * (values - stats["mean"])
+    stats["min"] = np.minimum(stats["min"], values)
+    stats["max"] = np.maximum(stats["max"], values)
+    with np.errstate(invalid="ignore"):
+        stats["exposed"] += values / maxima > threshold   # `maxima` is the (2, residues) array of maximum SASA values; NaN for unknown residue types
+
+def ensembleTable(stats, chain, resn_filter=None):
+    """
+    Residue table of one chain from the running statistics, keyed by `resi` in atom order; values hold 'resn', 'atoms', 'models', and per statistic
+    ('mean', 'sd', 'min', 'max', 'exposed' as a fraction of the models) a (whole residue, sidechain) pair. 'sd' is the population standard deviation.
+    """
+    residues = {}
+    sd = np.sqrt(stats["m2"] / stats["models"])
+    for position, (currChain, resi) in enumerate(stats["keys"]):
+        if currChain != chain or (resn_filter is not None and stats["resn"][position] not in resn_filter):
+            continue
+        residues[resi] = {"resn": stats["resn"][position], "atoms": int(stats["atoms"][position]), "models": stats["models"],
+                          "mean": tuple(stats["mean"][:, position]), "sd": tuple(sd[:, position]), "min": tuple(stats["min"][:, position]),
+                          "max": tuple(stats["max"][:, position]), "exposed": tuple(stats["exposed"][:, position] / stats["models"])}
+
+    return residues
+
+def getChains(structure):
+    # chain IDs in file order
+    chains = []
+    for chain in structure["chain"]:
+        if chain not in chains:
+            chains.append(chain)
+    return chains
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python shrakeRupley.py <structure file> [dot_density] [probe_radius]")
+        sys.exit(1)
+
+    structure = readStructure(sys.argv[1])
+    structure = subset(structure, ~structure["het"])
+    density = int(sys.argv[2]) if len(sys.argv) > 2 else dot_density
+    probe = float(sys.argv[3]) if len(sys.argv) > 3 else probe_radius
+
+    areas = atomSASA(structure["coords"], getRadii(structure), probe, density)
+    for chain in getChains(structure):
+        for resi, residue in residueTable(structure, areas, chain).items():
+            print(chain, residue["resn"], resi, residue["area"], residue["sideArea"])
@@ -0,0 +1,143 @@
+## Read the structure files inside an archive (ex. an AlphaFold proteome bundle) one at a time, in memory, without extracting anything to disk.
+
+## NOTE Accepted sources:
+##   <file>.tar, <file>.tar.gz, <file>.tgz    read as a stream (the archive is never seeked or unpacked), one member at a time
+##   <directory>                              every structure file in the directory, in name order
+## Members may themselves be gzipped (AlphaFold bundles hold `AF-*-model_v*.cif.gz` and `AF-*-model_v*.pdb.gz`); they are decompressed in memory.
+## A member's name is its path inside the source without `.gz`, with "/" written as "_" (ex. `AF-P19456-F1-model_v2.pdb`, or `human_AF-P19456-F1-model_v2.pdb` for
+## `human/AF-P19456-F1-model_v2.pdb.gz`), which is the query name SASAquatch.py writes its output under. Two members with the same name (ex. `1abc.pdb` next to
+## `1abc.pdb.gz`) would write the same output file, so the second one stops the source with an error instead of being skipped as already finished.
+## NOTE AlphaFold bundles hold every model twice (mmCIF and PDB format); `members=*.pdb.gz` (or `*.cif.gz`) keeps one copy of each.
+
+## USAGE: $ python structureArchive.py list <source> [members=GLOB]          # list the structure files of a source without reading them into SASAquatch.py
+##        $ pymol -c SASAquatch.py <source> [depth] [members=GLOB] [options]  # run every member of a source (see `runArchive()` in SASAquatch.py)
+
+import fnmatch            # methods for the `members=` filter
+import gzip               # methods for decompressing gzipped members
+import os                 # methods for directory handling
+import sys                # methods for taking command line arguments
+import tarfile            # methods for streaming tar archives
+
+# file names that hold a structure, with or without a trailing `.gz`
+structure_extensions = (".pdb", ".cif", ".ent", ".mmcif")
+archive_extensions = (".tar", ".tar.gz", ".tgz")
+
+def isArchive(source):
+    return os.path.isdir(source) or source.lower().endswith(archive_extensions)
+
+def memberName(name):
+    # the query name of a member: its path in the source (without a leading "./"), without the `.gz` it was stored with
+    name = os.path.normpath(name).lstrip("/").replace("/", "_")
+    return name[:-len(".gz")] if name.lower().endswith(".gz") else name
+
+def isStructure(name, pattern=None):
+    return memberName(name).lower().endswith(structure_extensions) and (pattern is None or fnmatch.fnmatch(os.path.basename(name), pattern))
+
+def memberFormat(name):
+    # the file format of a member, by its name: "cif" (mmCIF) or "pdb"
+    return "cif" if ".cif" in name.lower() else "pdb"
+
+def decompress(name, content):
+    return gzip.decompress(content) if name.lower().endswith(".gz") else content
+
+#####################################################################################################################################
+## ITERATE METHOD: yield (member name, contents as bytes) for every structure file of a source, one at a time; only the current   ##
+## member is ever held in memory                                                                                                   ##
+#####################################################################################################################################
+def iterMembers(source, pattern=None):
+
+    seen = set()      # member names already yielded; see NOTE above
+    for name, content in _iterFiles(source, pattern):
+        if memberName(name) in seen:
+            raise ValueError("two structure files of " + source + " are both named " + memberName(name) + " (the second is " + name + "); rename one, or select one with `members=`")
+        seen.add(memberName(name))
+        yield memberName(name), content
+
+def _iterFiles(source, pattern):
+
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path) and isStructure(name, pattern):
+                with open(path, "rb") as file:
+                    yield name, decompress(name, file.read())
+        return
+
+    # "r|*" reads the archive strictly front to back (plain or compressed), so even a very large bundle is never seeked or buffered as a whole
+    with tarfile.open(source, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and isStructure(member.name, pattern):
+                yield member.name, decompress(member.name, archive.extractfile(member).read())
+
+#####################################################################################################################################
+## ITERATE METHOD: yield (model number, text of that model alone) for every model (NMR model, MD frame) of a structure, one at a   ##
+## time; `content` (bytes) is read instead of the file when given. Each text is a complete file of the same format with one model. ##
+#####################################################################################################################################
+def iterModels(source, content=None):
+
+    parse = _iterCIFModels if memberFormat(source) == "cif" else _iterPDBModels
+    if content is not None:
+        yield from parse(content.decode().splitlines())
+        return
+
+    # the file is read line by line, so only the current model is ever held in memory
+    opener = gzip.open if source.lower().endswith(".gz") else open
+    with opener(source, "rt") as file:
+        yield from parse(line.rstrip("\n") for line in file)
+
+def _iterPDBModels(lines):
+
+    # atom records between MODEL and ENDMDL are one model (written out with its own MODEL record, so it keeps its number); a file without MODEL records is a single model
+    model, block = 1, []
+    for line in lines:
+        record = line[:6]
+        if record == "MODEL ":
+            model = int(line[10:14]) if line[10:14].strip() else model
+            block = [line]
+        elif record == "ENDMDL":
+            yield model, "\n".join(block) + "\nENDMDL\nEND\n"
+            model, block = model + 1, []
+        elif record in ("ATOM  ", "HETATM", "TER   ", "TER"):
+            block.append(line)
+    if any(line.startswith(("ATOM  ", "HETATM")) for line in block):
+        yield model, "\n".join(block) + "\nEND\n"
+
+def _iterCIFModels(lines):
+
+    # the rows of the `_atom_site` loop are grouped by `pdbx_PDB_model_num`; each group is written out under the loop's own column names
+    columns, block, model = [], [], None
+    for line in lines:
+        if line.startswith("_atom_site."):
+            columns.append(line.strip())
+            continue
+        if not columns:
+            continue
+        if not line or line.startswith("#") or line.startswith("loop_") or line.startswith("_"):
+            if block:
+                break
+            continue
+
+        fields = line.split()
+        number = int(fields[columns.index("_atom_site.pdbx_PDB_model_num")]) if "_atom_site.pdbx_PDB_model_num" in columns else 1
+        if number != model and block:
+            yield model, "data_model\nloop_\n" + "\n".join(columns) + "\n" + "\n".join(block) + "\n#\n"
+            block = []
+        model = number
+        block.append(line)
+
+    if block:
+        yield model, "data_model\nloop_\n" + "\n".join(columns) + "\n" + "\n".join(block) + "\n#\n"
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "list":
+        print("Usage: python structureArchive.py list <tar, tar.gz or directory> [members=GLOB]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[3:] if "=" in arg)
+    count = 0
+    for name, content in iterMembers(sys.argv[2], options.get("members")):
+        print(name, len(content))
+        count += 1
+    print(count, "structure files")
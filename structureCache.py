@@ -0,0 +1,219 @@
+## Local, content-addressed cache of downloaded structure files, so that reruns of the same PDB ID list never download a structure twice.
+
+## NOTE Layout of the cache directory (default `structure_cache/`, or the SASA_CACHE environment variable):
+##   objects/<sha256>.cif    one copy of every structure file, named by the hash of its contents (identical files are stored once; `.pdb` for PDB-format files)
+##   index.json              Dictionary of PDB ID -> {"hash", "size", "format", "last_used"}; `last_used` is when the entry was stored
+##   index.lock              held (flock) by a process while it changes the index, so concurrent workers never overwrite each other's entries
+## NOTE A cache hit does not rewrite the index; it only touches its object file. An entry's last use (which drives least-recently-used (LRU) eviction) is the later
+## of `last_used` and its object file's modification time.
+## NOTE Offline mode never touches the network: IDs are resolved only from the cache or from a local mirror directory (files named like `4h1w.cif`, `4H1W.cif.gz`,
+## `4h1w.pdb`, or the PDB archive's `pdb4h1w.ent.gz`). Set SASA_OFFLINE=1 (and SASA_MIRROR=<dir>) to use it from SASAquatch.py.
+
+## USAGE: $ python structureCache.py prewarm <listfile> [cache=DIR] [mirror=DIR] [offline=1] [max_mb=N]   # download (or copy from the mirror) every ID in a list file
+##        $ python structureCache.py evict [cache=DIR] [max_mb=N]                                        # shrink the cache to its size limit
+##        $ python structureCache.py list [cache=DIR]                                                    # show cached IDs, sizes and last use
+
+import contextlib         # methods for holding the index lock around a block of code
+import gzip               # methods for reading gzipped mirror files
+import hashlib            # methods for content hashes
+import json               # methods for reading and writing the cache index
+import os                 # methods for directory handling
+import sys                # methods for taking command line arguments
+import time               # methods for the last-used timestamps
+import urllib.request     # methods for downloading structure files
+try:
+    import fcntl          # methods for locking the index between processes; not available on Windows, where the index is not locked
+except ImportError:
+    fcntl = None
+
+# Defaults; each can be overridden with an environment variable so that SASAquatch.py jobs pick them up without extra arguments
+default_cache_dir = os.environ.get("SASA_CACHE", "structure_cache")
+default_mirror_dir = os.environ.get("SASA_MIRROR")
+default_offline = os.environ.get("SASA_OFFLINE", "0") == "1"
+default_max_mb = float(os.environ.get("SASA_CACHE_MB", "2048"))
+
+download_url = "https://files.rcsb.org/download/{}.cif"
+
+class StructureNotFound(Exception):
+    pass
+
+#################################################################################################################
+## Helper Methods: read and write the cache index. Every change re-reads the index while holding its lock     ##
+## (see `lockIndex()`), so several worker processes (ex. batchSASA.py) can share one cache directory.         ##
+#################################################################################################################
+def readIndex(cache_dir=default_cache_dir):
+    path = os.path.join(cache_dir, "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def writeIndex(index, cache_dir=default_cache_dir):
+    # write-then-rename, so a reader never sees a half-written index
+    path = os.path.join(cache_dir, "index.json")
+    temp = path + "." + str(os.getpid()) + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(index, file, indent=1, sort_keys=True)
+    os.replace(temp, path)
+
+@contextlib.contextmanager
+def lockIndex(cache_dir=default_cache_dir):
+    # an exclusive lock on `index.lock` for a whole read-modify-write of the index; readers need no lock, since the index is always replaced whole
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, "index.lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield    # the lock is released when the file is closed
+
+def objectPath(entry, cache_dir=default_cache_dir):
+    return os.path.join(cache_dir, "objects", entry["hash"] + "." + entry.get("format", "cif"))
+
+def lastUsed(entry, cache_dir=default_cache_dir):
+    # cache hits touch the object file instead of rewriting the index (see NOTE above)
+    path = objectPath(entry, cache_dir)
+    return max(entry["last_used"], os.path.getmtime(path)) if os.path.exists(path) else entry["last_used"]
+
+###########################################################################################################
+## Helper Method: look up a cached structure; returns its path (and marks it as just used), or None     ##
+###########################################################################################################
+def lookup(pdb_id, cache_dir=default_cache_dir):
+    index = readIndex(cache_dir)
+    entry = index.get(pdb_id.upper())
+    if entry is None or not os.path.exists(objectPath(entry, cache_dir)):
+        return None
+
+    os.utime(objectPath(entry, cache_dir))
+    return objectPath(entry, cache_dir)
+
+###################################################################################################################################
+## Helper Method: store a structure file's contents under its content hash and record it in the index; returns the cached path ##
+###################################################################################################################################
+def store(pdb_id, content, cache_dir=default_cache_dir, max_mb=default_max_mb):
+    # the file extension always matches the contents (mirrors may hold PDB-format files)
+    entry = {"hash": hashlib.sha256(content).hexdigest(), "size": len(content), "last_used": time.time(),
+             "format": "cif" if content.lstrip().startswith(b"data_") else "pdb"}
+    path = objectPath(entry, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # the object is written under the lock too, so an eviction in another process cannot remove it before its entry is in the index
+    with lockIndex(cache_dir):
+        if not os.path.exists(path):
+            temp = path + "." + str(os.getpid()) + ".tmp"
+            with open(temp, "wb") as file:
+                file.write(content)
+            os.replace(temp, path)
+
+        index = readIndex(cache_dir)
+        index[pdb_id.upper()] = entry
+        writeIndex(index, cache_dir)
+    evict(cache_dir, max_mb)
+    return path
+
+###############################################################################################
+## Helper Method: find a structure in the mirror directory; returns its contents, or None   ##
+###############################################################################################
+def readMirror(pdb_id, mirror_dir=default_mirror_dir):
+    if not mirror_dir:
+        return None
+
+    lower = pdb_id.lower()
+    candidates = [lower + ".cif", pdb_id.upper() + ".cif", lower + ".cif.gz", pdb_id.upper() + ".cif.gz",
+                  lower + ".pdb", pdb_id.upper() + ".pdb", "pdb" + lower + ".ent", "pdb" + lower + ".ent.gz",
+                  os.path.join(lower[1:3], lower + ".cif.gz"), os.path.join(lower[1:3], "pdb" + lower + ".ent.gz")]   # the PDB archive's divided layout
+    for name in candidates:
+        path = os.path.join(mirror_dir, name)
+        if os.path.exists(path):
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rb") as file:
+                return file.read()
+    return None
+
+#######################################################################################################################################################
+## RESOLVE METHOD: the path of a local structure file for a PDB ID, from the cache first, then the mirror directory, then (unless offline) a download ##
+#######################################################################################################################################################
+def resolve(pdb_id, cache_dir=default_cache_dir, mirror_dir=default_mirror_dir, offline=default_offline, max_mb=default_max_mb):
+
+    path = lookup(pdb_id, cache_dir)
+    if path is not None:
+        return path
+
+    content = readMirror(pdb_id, mirror_dir)
+    if content is None:
+        if offline:
+            raise StructureNotFound(pdb_id + " is not in the structure cache (" + cache_dir + ") or the mirror directory (" + str(mirror_dir) + ")")
+        with urllib.request.urlopen(download_url.format(pdb_id.upper())) as response:
+            content = response.read()
+
+    return store(pdb_id, content, cache_dir, max_mb)
+
+#################################################################################################################################
+## EVICT METHOD: remove least-recently-used entries until the cache fits within its size limit; returns the IDs that were removed ##
+#################################################################################################################################
+def evict(cache_dir=default_cache_dir, max_mb=default_max_mb):
+
+    with lockIndex(cache_dir):
+        index = readIndex(cache_dir)
+        # identical files are stored once, so the size of the cache is the size of its unique hashes
+        total = sum({entry["hash"]: entry["size"] for entry in index.values()}.values())
+        removed = []
+
+        for pdb_id, entry in sorted(index.items(), key=lambda item: lastUsed(item[1], cache_dir)):
+            if total <= max_mb * 1024 * 1024:
+                break
+            del index[pdb_id]
+            removed.append(pdb_id)
+            if all(other["hash"] != entry["hash"] for other in index.values()):
+                total -= entry["size"]
+                if os.path.exists(objectPath(entry, cache_dir)):
+                    os.remove(objectPath(entry, cache_dir))
+
+        if removed:
+            writeIndex(index, cache_dir)
+    return removed
+
+##########################################################################################################################
+## PREWARM METHOD: resolve every PDB ID in a list file (the same list files BulkSubmit.sh reads); filenames are skipped ##
+##########################################################################################################################
+def prewarm(listfile, cache_dir=default_cache_dir, mirror_dir=default_mirror_dir, offline=default_offline, max_mb=default_max_mb):
+
+    resolved, failed = [], []
+    with open(listfile) as file:
+        for line in file:
+            tokens = line.split()
+            if not tokens or "." in tokens[0] or tokens[0].startswith("#"):
+                continue
+            try:
+                resolve(tokens[0], cache_dir, mirror_dir, offline, max_mb)
+                resolved.append(tokens[0].upper())
+            except Exception as err:
+                failed.append((tokens[0].upper(), str(err)))
+
+    return resolved, failed
+
+#######################################################################################################################################################
+##~~~~~~~~~~~~~~~~ ___DRIVER CODE___~~~~~~~~~~~~~~~~##
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("prewarm", "evict", "list"):
+        print("Usage: python structureCache.py prewarm <listfile> | evict | list   [cache=DIR] [mirror=DIR] [offline=1] [max_mb=N]")
+        sys.exit(1)
+
+    options = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+    cache_dir = options.get("cache", default_cache_dir)
+    mirror_dir = options.get("mirror", default_mirror_dir)
+    offline = options.get("offline", "1" if default_offline else "0") == "1"
+    max_mb = float(options.get("max_mb", default_max_mb))
+
+    if sys.argv[1] == "prewarm":
+        start_time = time.time()
+        resolved, failed = prewarm(sys.argv[2], cache_dir, mirror_dir, offline, max_mb)
+        print("Cached", len(resolved), "structures in", round(time.time() - start_time, 1), "seconds;", len(failed), "could not be resolved:")
+        for pdb_id, err in failed:
+            print("  ", pdb_id, err)
+
+    elif sys.argv[1] == "evict":
+        removed = evict(cache_dir, max_mb)
+        print("Evicted", len(removed), "structures:", " ".join(removed))
+
+    else:
+        for pdb_id, entry in sorted(readIndex(cache_dir).items()):
+            print(pdb_id, entry["hash"][:12], entry.get("format", "cif"), entry["size"], time.strftime("%Y-%m-%d %H:%M", time.localtime(lastUsed(entry, cache_dir))))
@@ -0,0 +1,89 @@
+## Checks of SASAquatch.py job options on the bundled 5KSDon4H1W.pdb structure.
+
+## USAGE: $ python -m pytest test/test_SASAquatch.py
+
+import os                 # methods for directory handling
+import shutil             # methods for copying the structure into each test's scratch directory
+import sys                # methods for finding the scripts in the repository root
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import SASAquatch         # the script under test
+import benchmarkSASA      # synthetic multi-chain assemblies
+import resultStore        # SQLite store of `store=` jobs
+
+structure = "5KSDon4H1W.pdb"
+
+def copyStructure(tmp_path, monkeypatch):
+    # jobs write their output into the working directory, and queries are local file names
+    shutil.copyfile(os.path.join(repo_dir, structure), tmp_path / structure)
+    monkeypatch.chdir(tmp_path)
+
+def test_split_single_code(tmp_path, monkeypatch):
+    # `split=1` with one residue type keeps the job's only output file
+    copyStructure(tmp_path, monkeypatch)
+    options = {"split": "1", "results": "0", "log": "quiet"}
+
+    assert SASAquatch.runQuery(structure, "K", options) == "SASA_" + structure + "_LYS.csv"
+    assert os.path.exists("SASA_" + structure + "_LYS.csv")
+    assert SASAquatch.jobFinished(structure, "K", options)
+
+def test_split_single_code_store(tmp_path, monkeypatch):
+    copyStructure(tmp_path, monkeypatch)
+    options = {"split": "1", "results": "0", "log": "quiet", "store": "s.db"}
+
+    assert SASAquatch.runQuery(structure, "K", options) == "s.db"
+    assert resultStore.hasJob("SASA_" + structure + "_LYS", "s.db")
+    assert SASAquatch.jobFinished(structure, "K", options)
+
+def test_split_codes(tmp_path, monkeypatch):
+    # several residue types are split into one file each, and the combined file is removed
+    copyStructure(tmp_path, monkeypatch)
+    options = {"split": "1", "results": "0", "log": "quiet"}
+
+    SASAquatch.runQuery(structure, "K,D", options)
+    assert os.path.exists("SASA_" + structure + "_LYS.csv") and os.path.exists("SASA_" + structure + "_ASP.csv")
+    assert not os.path.exists("SASA_" + structure + "_LYS-ASP.csv")
+
+def test_result_key_pass(tmp_path, monkeypatch):
+    # `pass=structure` and `pass=residue` tables are cached under different keys
+    copyStructure(tmp_path, monkeypatch)
+
+    structureKey = SASAquatch.getResultKey(structure, "load", "ALL", "structure", "pymol")[0]
+    residueKey = SASAquatch.getResultKey(structure, "load", "ALL", "residue", "pymol")[0]
+    assert structureKey != residueKey
+    assert structureKey == SASAquatch.getResultKey(structure, "load", "ALL", "structure", "pymol")[0]
+
+def test_low_memory_matches_normal(tmp_path, monkeypatch):
+    # `memory=low` reads one chain window at a time from the file, and writes the same table as the whole-structure calculation; the benchmark's
+    # two-chain assembly makes each chain's window reach into the other chain
+    monkeypatch.chdir(tmp_path)
+    benchmarkSASA.writeAssembly(2, "asm2.pdb")
+    options = {"results": "0", "log": "quiet"}
+
+    outname = SASAquatch.runQuery("asm2.pdb", "K", options)
+    os.replace(outname, "normal.csv")
+    assert SASAquatch.runQuery("asm2.pdb", "K", dict(options, memory="low")) == outname
+    with open(outname) as low, open("normal.csv") as normal:
+        assert low.read() == normal.read()
+
+def readAreas(outname):
+    # {residue: (total SASA, sidechain SASA)} of every calculated residue of an output file
+    with open(outname) as file:
+        rows = [line.rstrip("\n").split(",") for line in file]
+    return {row[0]: (float(row[1]), float(row[4])) for row in rows if len(row) >= 7 and row[0] != "Residue" and row[2] != "N/A"}
+
+def test_numpy_engine_matches_pymol(tmp_path, monkeypatch):
+    # the NumPy engine reproduces PyMOL's dot_solvent=1, dot_density=4 areas to within 1.5 square Angstroms per residue (1.35 at most on 4H1W)
+    copyStructure(tmp_path, monkeypatch)
+    options = {"results": "0", "log": "quiet"}
+
+    outname = SASAquatch.runQuery(structure, "ALL", dict(options, engine="pymol"))
+    os.replace(outname, "pymol.csv")
+    SASAquatch.runQuery(structure, "ALL", dict(options, engine="numpy"))
+    pymolAreas, numpyAreas = readAreas("pymol.csv"), readAreas(outname)
+
+    assert pymolAreas.keys() == numpyAreas.keys() and len(pymolAreas) > 700
+    for residue, (total, side) in pymolAreas.items():
+        assert abs(numpyAreas[residue][0] - total) <= 1.5 and abs(numpyAreas[residue][1] - side) <= 1.5, residue
@@ -0,0 +1,27 @@
+## Checks of batchSASA.py's worker processes: a structure that overruns `timeout=` is stopped from the parent process, and the next job still runs.
+
+## USAGE: $ python -m pytest test/test_batchSASA.py
+
+import os                 # methods for directory handling
+import shutil             # methods for copying the structure into each test's scratch directory
+import sys                # methods for finding the scripts in the repository root
+import time               # methods for timing the batch
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import batchSASA          # the batch runner under test
+
+structure = "5KSDon4H1W.pdb"
+
+def test_timeout_kills_worker(tmp_path, monkeypatch):
+    # `pass=residue` takes minutes on this structure, most of it inside `cmd.get_area()`; its worker is killed and replaced for the second job
+    shutil.copyfile(os.path.join(repo_dir, structure), tmp_path / structure)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "list.txt").write_text(structure + " pass=residue\n" + structure + " K\n")
+
+    start_time = time.time()
+    results = batchSASA.runBatch("list.txt", {"results": "0", "log": "quiet"}, workers=1, timeout=15)
+    assert [result[:3] for result in results] == [(structure, "ALL", "timeout"), (structure, "LYS", "done")]
+    assert time.time() - start_time < 60
+    assert os.path.exists("SASA_" + structure + "_LYS.csv") and not os.path.exists("SASA_" + structure + "_ALL.csv")
@@ -0,0 +1,71 @@
+## Checks of the chain-level reuse chainDedup.py plans for a list, run through batchSASA.py.
+
+## USAGE: $ python -m pytest test/test_chainDedup.py
+
+import csv                # methods for reading the dedup report
+import os                 # methods for directory handling
+import shutil             # methods for copying the structure into each test's scratch directory
+import sys                # methods for finding the scripts in the repository root
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import batchSASA          # the batch runner under test
+import chainDedup         # the dedup plan under test
+
+structure = "5KSDon4H1W.pdb"
+
+def writeEntries(tmp_path):
+    # `dimer.pdb` holds the structure's chain A as it is, plus a shorter copy far away as chain B (a new chain that does not touch chain A)
+    shutil.copyfile(os.path.join(repo_dir, structure), tmp_path / structure)
+    with open(tmp_path / structure) as file:
+        atoms = [line for line in file if line.startswith("ATOM  ")]
+    first = atoms[0][22:27]
+    copy = [line[:21] + "B" + line[22:30] + "%8.3f" % (float(line[30:38]) + 200.0) + line[38:] for line in atoms if line[22:27] != first]
+    (tmp_path / "dimer.pdb").write_text("".join(atoms + copy) + "END\n")
+    (tmp_path / "list.txt").write_text(structure + " K\ndimer.pdb K\n")
+
+def test_new_chains_only(tmp_path, monkeypatch):
+    # the dimer's chain A is reused from the first entry, so only its chain B is calculated; the merged file matches a run without dedup
+    writeEntries(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    options = {"engine": "numpy", "results": "0", "log": "quiet"}
+
+    plan = chainDedup.planDedup(batchSASA.readJobs("list.txt", options))
+    assert [job[2].get("skip") for job in plan["run"]] == [None, "A"]
+    assert [entry["partial"] for entry in plan["fanout"]] == [True]
+
+    results = batchSASA.runBatch("list.txt", options, workers=1, dedup=True)
+    assert [result[2] for result in results] == ["done", "done"]
+    with open(chainDedup.default_report) as file:
+        assert [row[5] for row in csv.reader(file)][1:] == ["calculated", "reused", "calculated"]
+    os.replace("SASA_dimer.pdb_LYS.csv", "dedup.csv")
+
+    batchSASA.runBatch("list.txt", options, workers=1)
+    with open("SASA_dimer.pdb_LYS.csv") as normal, open("dedup.csv") as dedup:
+        assert dedup.read() == normal.read()
+
+def test_pymol_sequences(tmp_path, monkeypatch):
+    # PyMOL reads a chain's sequence from its CA atoms: a copy of chain A lacking one CA is a new sequence to a PyMOL job (and is written), while the NumPy reader
+    # sees chain A's sequence again. With engine=pymol the plan calculates the copy, and the merged file matches a run without dedup
+    shutil.copyfile(os.path.join(repo_dir, structure), tmp_path / structure)
+    with open(tmp_path / structure) as file:
+        atoms = [line for line in file if line.startswith("ATOM  ")]
+    tenth = list(dict.fromkeys(line[22:27] for line in atoms))[9]
+    copy = [line[:21] + "B" + line[22:30] + "%8.3f" % (float(line[30:38]) + 200.0) + line[38:] for line in atoms if not (line[22:27] == tenth and line[12:16] == " CA ")]
+    (tmp_path / "dimer.pdb").write_text("".join(atoms + copy) + "END\n")
+    (tmp_path / "list.txt").write_text(structure + " K\ndimer.pdb K\n")
+    monkeypatch.chdir(tmp_path)
+    options = {"engine": "pymol", "results": "0", "log": "quiet"}
+
+    plan = chainDedup.planDedup(batchSASA.readJobs("list.txt", options))
+    assert [job[2].get("skip") for job in plan["run"]] == [None, "A"]
+    assert [row[2] for row in plan["report"]] == ["A", "A", "B"]
+
+    results = batchSASA.runBatch("list.txt", options, workers=1, dedup=True)
+    assert [result[2] for result in results] == ["done", "done"]
+    os.replace("SASA_dimer.pdb_LYS.csv", "dedup.csv")
+
+    batchSASA.runBatch("list.txt", options, workers=1)
+    with open("SASA_dimer.pdb_LYS.csv") as normal, open("dedup.csv") as dedup:
+        assert dedup.read() == normal.read()
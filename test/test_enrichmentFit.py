@@ -0,0 +1,77 @@
+## Checks of the MS1 peak search (peakMatcher.py) and the enrichment fit (enrichmentFit.py) on synthetic spectra built from isotopeEnvelope.py.
+
+## USAGE: $ python -m pytest test/test_enrichmentFit.py
+
+import os                 # methods for directory handling
+import sys                # methods for finding the scripts in the accessory scripts directory
+
+import numpy              # methods for building the synthetic spectra
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_dir, "Accessory Scripts"))
+
+import enrichmentFit      # the enrichment fit under test
+import isotopeEnvelope    # envelopes of the synthetic spectra
+import peakMatcher        # the peak search under test
+
+# an asymmetric dipeptide of mixedPeaks_CSMs.txt: LH, HL and HH have different numbers of labeled nitrogens
+seqA, seqB, charge = "TLHGLQP[K]EAVNIFPEK", "EVHFLPFNPVD[K]R", 5
+
+def writeMGF(path, scans):
+    # one spectrum per (RT in minutes, [(m/z, intensity), ...])
+    with open(path, "w") as file:
+        for rt, peaks in scans:
+            file.write("BEGIN IONS\nRTINSECONDS=%f\n" % (rt * 60))
+            for mz, intensity in sorted(peaks):
+                file.write("%.6f %.1f\n" % (mz, intensity))
+            file.write("END IONS\n")
+    return peakMatcher.loadSpectra(str(path))
+
+def test_match_peaks(tmp_path):
+    # the most intense peak within `ppm` in the scans of the RT window; nothing outside `ppm`; every scan for a target without a RT
+    spectra = writeMGF(tmp_path / "run.mgf", [(1.0, [(500.0, 10.0), (600.0, 5.0)]), (2.0, [(500.002, 30.0), (700.0, 7.0)])])
+    targets = numpy.array([500.0, 500.0, 600.0, 600.0, 700.0])
+    rts = numpy.array([1.0, 1.5, 1.0, 1.0, numpy.nan])
+    observed, error, intensity, scanTimes = peakMatcher.matchPeaks(spectra, targets, rts, ppm=10.0, window=0.2)
+
+    assert observed[0] == 500.0 and intensity[0] == 10.0 and scanTimes[0] == 1.0
+    assert numpy.isnan(observed[1])                                     # no scan within 0.2 min of 1.5
+    assert observed[2] == 600.0 and abs(error[2]) < 1e-9
+    assert intensity[4] == 7.0 and scanTimes[4] == 2.0
+
+    observed, error, intensity, scanTimes = peakMatcher.matchPeaks(spectra, targets[:1], [1.5], ppm=10.0, window=1.0)
+    assert observed[0] == 500.002 and intensity[0] == 30.0 and round(error[0], 1) == 4.0
+    observed, error, intensity, scanTimes = peakMatcher.matchPeaks(spectra, [500.004], [1.0], ppm=3.0, window=1.0)
+    assert numpy.isnan(observed[0])                                     # 4 ppm from 500.002, 8 ppm from 500.0
+
+def test_fit_enrichment():
+    # a cluster drawn from one grid level (scaled) is fit at that level with R^2 = 1; an empty cluster has no fit
+    levels = enrichmentFit.grid
+    compositions = [isotopeEnvelope.speciesCompositions(seqA, seqB)[label] for label in ("LH", "HH")]
+    offsets, probabilities, masses = enrichmentFit.candidateEnvelopes(compositions, levels, 12)
+    observed = numpy.stack([250.0 * probabilities[0, 30], numpy.zeros(probabilities.shape[2])])
+    enrichment, rSquared, found = enrichmentFit.fitEnrichment(probabilities, observed, ~numpy.isnan(masses), levels)
+
+    assert enrichment[0] == levels[30] and abs(rSquared[0] - 1) < 1e-9 and found[0] == (observed[0] > 0).sum()
+    assert numpy.isnan(enrichment[1]) and found[1] == 0
+
+def test_absent_form(tmp_path):
+    # LL, LH and HH at 95% enrichment, and no HL: HL's window reaches into LH's cluster, but none of those peaks is fit as HL
+    species = isotopeEnvelope.speciesCompositions(seqA, seqB)
+    assert len(set(species[label][5] for label in enrichmentFit.labels)) == 3
+    peaks = []
+    for label in ("LL", "LH", "HH"):
+        offsets, masses, probabilities = isotopeEnvelope.envelopes([species[label]], 0.95)[0]
+        keep = probabilities > 1e-3 * probabilities.max()
+        peaks += list(zip((masses[keep] + charge * isotopeEnvelope.proton) / charge, 1e6 * probabilities[keep] / probabilities.max()))
+    spectra = writeMGF(tmp_path / "run.mgf", [(10.0, peaks)])
+
+    precursor = (isotopeEnvelope.monoisotopicMass(species["LL"]) + charge * isotopeEnvelope.proton) / charge
+    chunk = {"seqA": [seqA], "seqB": [seqB], "mz": [round(precursor, 4)], "charge": [charge], "rt": [10.0]}
+    fits = {fit[1]: fit for fit in enrichmentFit.fitChunk(spectra, chunk)}
+
+    for label in ("LH", "HH"):
+        row, label, anchor, enrichment, rSquared, found, shared, apex = fits[label]
+        assert anchor == 0 and enrichment == 0.95 and rSquared > 0.99 and found >= 5 and apex == 10.0
+    row, label, anchor, enrichment, rSquared, found, shared, apex = fits["HL"]
+    assert numpy.isnan(enrichment) and found == 0 and shared > 0
@@ -0,0 +1,48 @@
+## Checks of the Condor job executable condor/planSubmit.py writes: the command line each job runs must hand the job's arguments to SASAquatch.py.
+
+## USAGE: $ python -m pytest test/test_planSubmit.py
+
+import json               # methods for reading the arguments the stand-in script received
+import os                 # methods for directory handling
+import shutil             # methods for finding PyMOL and copying structures and bundle files
+import subprocess         # methods for running the generated executable
+import sys                # methods for finding the scripts in the repository root
+
+import pytest             # skips the check where PyMOL is not installed
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_dir, "condor"))
+
+import planSubmit         # the planner under test
+
+lines = ["5KSDon4H1W.pdb K engine=numpy", "5KSDon3BA6.pdb ALL context=interface results=0"]
+
+def test_executable_passes_arguments(tmp_path, monkeypatch):
+    # a dry run of querySASAplan.sh: the bundle branch and the single-job branch run PyMOL on a stand-in for SASAquatch.py that prints its `sys.argv`,
+    # which must be exactly the job's list line (PyMOL itself must not try to load `K` or `engine=numpy` as files)
+    pymol = shutil.which("pymol")
+    if pymol is None:
+        pytest.skip("PyMOL is not installed")
+    for line in lines:
+        shutil.copyfile(os.path.join(repo_dir, line.split()[0]), tmp_path / line.split()[0])
+    monkeypatch.chdir(tmp_path)
+
+    model = planSubmit.fitModel([])
+    entries = planSubmit.planJobs(lines, model) + planSubmit.planJobs(lines[:1], model, small=0)
+    assert [entry["name"] for entry in entries] == ["bundle_001", "5KSDon4H1W.pdb_K_engine=numpy"]
+    planSubmit.writeSubmit(entries, "list.txt")
+
+    # the executable as a job would run it, minus the python unpacking and the PyMOL installation directory of the execute node
+    with open("querySASAplan.sh") as file:
+        script = [line.replace("./pymol", pymol) for line in file if not line.startswith(("tar ", "cd "))]
+    (tmp_path / "dryrun.sh").write_text("".join(script))
+    (tmp_path / "SASAquatch.py").write_text("import json, sys\nprint('ARGV ' + json.dumps(sys.argv[1:]))\n")
+    shutil.copyfile(os.path.join("bundles", "bundle_001.txt"), "bundle_001.txt")
+
+    def received(*arguments):
+        child = subprocess.run(["bash", "dryrun.sh"] + list(arguments), env=dict(os.environ, _CONDOR_SCRATCH_DIR=str(tmp_path)), capture_output=True, text=True, timeout=120)
+        return [json.loads(line[len("ARGV "):]) for line in child.stdout.splitlines() if line.startswith("ARGV ")]
+
+    assert sorted(entries[0]["jobs"]) == sorted(lines)
+    assert received("bundle_001.txt") == [line.split() for line in entries[0]["jobs"]]
+    assert received(*lines[0].split()) == [lines[0].split()]
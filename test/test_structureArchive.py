@@ -0,0 +1,37 @@
+## Checks of the member names structureArchive.py gives the structure files of an archive.
+
+## USAGE: $ python -m pytest test/test_structureArchive.py
+
+import gzip               # methods for writing gzipped members
+import io                 # methods for building archive members in memory
+import os                 # methods for directory handling
+import sys                # methods for finding the scripts in the repository root
+import tarfile            # methods for writing test archives
+
+import pytest             # methods for checking raised errors
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import structureArchive   # the module under test
+
+def writeArchive(filename, members):
+    with tarfile.open(filename, "w:gz") as archive:
+        for name, content in members.items():
+            member = tarfile.TarInfo(name)
+            member.size = len(content)
+            archive.addfile(member, io.BytesIO(content))
+
+def test_nested_members_keep_their_path(tmp_path):
+    # the same file name in two directories of an archive is two different members
+    writeArchive(tmp_path / "t.tgz", {"./a/1abc.pdb": b"END\n", "./b/1abc.pdb.gz": gzip.compress(b"END\n"), "./2xyz.cif": b"data_2xyz\n"})
+
+    names = [name for name, content in structureArchive.iterMembers(str(tmp_path / "t.tgz"))]
+    assert names == ["a_1abc.pdb", "b_1abc.pdb", "2xyz.cif"]
+
+def test_duplicate_members_fail(tmp_path):
+    # `1abc.pdb` and `1abc.pdb.gz` would write the same output file
+    (tmp_path / "1abc.pdb").write_bytes(b"END\n")
+    (tmp_path / "1abc.pdb.gz").write_bytes(gzip.compress(b"END\n"))
+
+    with pytest.raises(ValueError):
+        list(structureArchive.iterMembers(str(tmp_path)))